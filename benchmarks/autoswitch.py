@@ -0,0 +1,98 @@
+#!/usr/bin/env python2
+"""
+SC-Controller - Autoswitcher benchmark
+
+Generates few thousands of synthetic autoswitcher conditions, similar to
+what user with per-game profiles has, and compares time needed to find
+matching condition for windows by trying conditions one by one and by
+using ConditionIndex. Also checks that both find same condition.
+
+Needs libX11, as scc.x11.autoswitcher does.
+Run as 'python2 benchmarks/autoswitch.py' from repository root.
+"""
+from __future__ import unicode_literals
+import os, sys, time, random
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from scc.x11.autoswitcher import Condition, ConditionIndex
+from collections import OrderedDict
+
+RULES = 3000
+WINDOWS = 1000
+ROUNDS = 5
+
+
+def make_conditions(rnd):
+	conds = OrderedDict()
+	for i in xrange(RULES):
+		kind = i % 6
+		if kind in (0, 1):
+			c = Condition(wm_class="game%s.x86_64" % (i,))
+		elif kind == 2:
+			c = Condition(title="Game %s" % (i,))
+		elif kind == 3:
+			c = Condition(regexp=r"Game %s( - .*)?$" % (i,))
+		elif kind == 4:
+			c = Condition(title="Episode", wm_class="steam_app_%s" % (i,))
+		else:
+			c = Condition(regexp=r"(?i)launcher %s" % (i,))
+		conds[c] = "Profile %s" % (i,)
+	return conds
+
+
+def make_windows(rnd):
+	windows = []
+	for i in xrange(WINDOWS):
+		n = rnd.randint(0, RULES * 2)
+		kind = rnd.randint(0, 3)
+		if kind == 0:
+			windows.append(( "Terminal %s" % (n,), ("xterm", "XTerm") ))
+		elif kind == 1:
+			windows.append(( "Window", ("game%s.x86_64" % (n,), "Game") ))
+		elif kind == 2:
+			windows.append(( "Game %s - Episode 1" % (n,), ("steam_app_%s" % (n,), "Steam") ))
+		else:
+			windows.append(( "LAUNCHER %s" % (n,), ("launcher", "Launcher") ))
+	return windows
+
+
+def linear(conds, title, wm_class):
+	for c in conds:
+		if c.matches(title, wm_class):
+			return c
+	return None
+
+
+def measure(fn, windows):
+	""" Returns time needed to check every window, in ms """
+	start = time.time()
+	for i in xrange(ROUNDS):
+		for title, wm_class in windows:
+			fn(title, wm_class)
+	return (time.time() - start) * 1000.0 / ROUNDS
+
+
+def main():
+	rnd = random.Random(0)
+	conds, windows = make_conditions(rnd), make_windows(rnd)
+	start = time.time()
+	index = ConditionIndex(conds)
+	build = (time.time() - start) * 1000.0
+	
+	mismatch = [ w for w in windows if linear(conds, *w) is not index.find(*w) ]
+	matched = len([ w for w in windows if index.find(*w) is not None ])
+	
+	old = measure(lambda *w: linear(conds, *w), windows)
+	new = measure(index.find, windows)
+	print "%s conditions, %s windows, %s matched" % (len(conds), len(windows), matched)
+	print "index built in %.2f ms" % (build,)
+	print "linear: %8.2f ms" % (old,)
+	print "index:  %8.2f ms (%.1fx faster)" % (new, old / new)
+	for title, wm_class in mismatch:
+		print "MISMATCH: %s %s" % (repr(title), wm_class)
+	if mismatch:
+		sys.exit(1)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python2
+"""
+SC-Controller - Controller state benchmark
+
+Compares time needed to decode received packets into pair of reused
+ControllerState objects, as SCController does, with creating new
+ControllerInput namedtuple for every packet.
+
+Run as 'python2 benchmarks/controller_state.py' from repository root.
+"""
+from __future__ import unicode_literals
+import os, sys, time, random
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from scc.constants import ControllerInput, ControllerState, CI_STRUCT
+
+PACKETS = 1000
+ROUNDS = 100
+
+
+def make_packets(rnd):
+	return [ CI_STRUCT.pack(1, 1, i & 0xFFFF, rnd.randint(0, 0x1FFFFFFF),
+		rnd.randint(0, 255), rnd.randint(0, 255),
+		*[ rnd.randint(-32768, 32767) for x in xrange(11) ]
+	) for i in xrange(PACKETS) ]
+
+
+def measure(fn, packets):
+	""" Returns time needed to decode one packet, in us """
+	start = time.time()
+	for r in xrange(ROUNDS):
+		for i in xrange(len(packets)):
+			s = fn(i, packets[i])
+			s.buttons, s.lpad_x, s.lpad_y, s.ltrig, s.rtrig
+	return (time.time() - start) * 1000000.0 / ROUNDS / len(packets)
+
+
+def main():
+	packets = make_packets(random.Random(0))
+	states = ControllerState(), ControllerState()
+	old = measure(lambda i, data: ControllerInput._make(CI_STRUCT.unpack(data)), packets)
+	new = measure(lambda i, data: states[i & 1].decode(data), packets)
+	print "ControllerInput: %6.3f us/packet" % (old,)
+	print "ControllerState: %6.3f us/packet (%.1fx faster)" % (new, old / new)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python2
+"""
+SC-Controller - Mapper benchmark
+
+Feeds synthetic controller input into Mapper for every profile from
+default_profiles/ and profile_examples/ and reports how long it takes
+to process one frame and how many events are generated.
+
+Virtual devices are replaced by counters, so nothing is sent anywhere
+and benchmark can run without uinput or controller connected. Profiles
+using area actions are skipped unless X display is available.
+
+Run as 'python2 benchmarks/mapper.py' from repository root. Use --json to
+save results and --compare to show difference against saved results,
+for example when comparing two commits.
+"""
+from __future__ import unicode_literals
+import os, sys, re, time, json, math, random, shutil, logging, argparse, tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from scc.lib import xwrappers as X
+from scc.constants import SCButtons, SCI_NULL
+from scc.parser import TalkingActionParser
+from scc.uinput import Dummy
+from scc.mapper import Mapper
+from scc.profile import Profile
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+PROFILE_DIRS = ( "default_profiles", "profile_examples" )
+FRAMES = 2000
+RE_NEEDS_X = re.compile(r"\b(rel)?(win)?area\(")
+
+
+class CountingDevice(Dummy):
+	""" Dummy device that counts generated events """
+	def __init__(self):
+		self.events = 0
+
+	def keyEvent(self, *a, **b):
+		self.events += 1
+
+	axisEvent = keyEvent
+	relEvent = keyEvent
+	scanEvent = keyEvent
+	synEvent = keyEvent
+	moveEvent = keyEvent
+	scrollEvent = keyEvent
+	pressEvent = keyEvent
+	releaseEvent = keyEvent
+
+
+class FakeController(object):
+	""" Provides methods that Mapper needs from SCController """
+	def __init__(self, gyro):
+		self.gyro = gyro
+
+	def getGyroEnabled(self):
+		return self.gyro
+
+	def addFeedback(self, *a):
+		pass
+
+	def wakeup(self):
+		pass
+
+
+def stick_circle(i, r):
+	a = i * 2.0 * math.pi / 200
+	return SCI_NULL._replace(seq=i,
+		lpad_x=int(math.cos(a) * 30000), lpad_y=int(math.sin(a) * 30000))
+
+
+def pad_swipes(i, r):
+	x = (i % 100) * 600 - 30000
+	touch = SCButtons.LPADTOUCH | SCButtons.RPADTOUCH if i % 100 else 0
+	return SCI_NULL._replace(seq=i, buttons=touch,
+		lpad_x=x, lpad_y=-x, rpad_x=-x, rpad_y=x)
+
+
+def trigger_ramp(i, r):
+	t = abs((i % 510) - 255)
+	return SCI_NULL._replace(seq=i, ltrig=t, rtrig=255 - t)
+
+
+def gyro_noise(i, r):
+	return SCI_NULL._replace(seq=i,
+		gpitch=r.randint(-500, 500), groll=r.randint(-500, 500),
+		gyaw=r.randint(-500, 500), q1=r.randint(-32768, 32767),
+		q2=r.randint(-32768, 32767), q3=r.randint(-32768, 32767),
+		q4=r.randint(-32768, 32767))
+
+
+BUTTONS = [ x for x in SCButtons
+	if x not in (SCButtons.STICK, SCButtons.LPADTOUCH, SCButtons.RPADTOUCH) ]
+def button_mash(i, r):
+	buttons = 0
+	for b in r.sample(BUTTONS, r.randint(0, 3)):
+		buttons |= b
+	return SCI_NULL._replace(seq=i, buttons=buttons)
+
+
+SCENARIOS = ( stick_circle, pad_swipes, trigger_ramp, gyro_noise, button_mash )
+
+
+def find_profiles():
+	for d in PROFILE_DIRS:
+		path = os.path.join(ROOT, d)
+		for name in sorted(os.listdir(path)):
+			if name.endswith(".sccprofile"):
+				yield os.path.join(path, name)
+
+
+def run(filename, scenario, frames, xdisplay):
+	"""
+	Returns (mean, p99, events) for one profile and scenario.
+	Times are in microseconds, events are per frame.
+	"""
+	# Some actions are still printing debug stuff to stdout
+	stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+	try:
+		return _run(filename, scenario, frames, xdisplay)
+	finally:
+		sys.stdout = stdout
+
+
+def _run(filename, scenario, frames, xdisplay):
+	profile = Profile(TalkingActionParser())
+	profile.load(filename)
+	profile.compress()
+	mapper = Mapper(profile, keyboard=None, mouse=None, gamepad=None)
+	mapper.keyboard, mapper.mouse, mapper.gamepad = (CountingDevice(),
+		CountingDevice(), CountingDevice())
+	controller = FakeController(bool(profile.gyro))
+	mapper.set_controller(controller)
+	if xdisplay:
+		mapper.set_xdisplay(xdisplay)
+
+	# Same seed for every run, so results are comparable
+	r = random.Random(1)
+	inputs = [ scenario(i, r) for i in xrange(frames) ]
+	times = []
+	for sci in inputs:
+		start = time.time()
+		mapper.callback(controller, start, sci)
+		times.append(time.time() - start)
+	# Release everything, so no scheduled task stays around
+	mapper.callback(controller, time.time(), SCI_NULL)
+	mapper.release_virtual_buttons()
+
+	times.sort()
+	mean = sum(times) * 1000000.0 / len(times)
+	p99 = times[int(len(times) * 0.99)] * 1000000.0
+	events = sum([ d.events for d in (mapper.keyboard, mapper.mouse,
+			mapper.gamepad) ])
+	return mean, p99, float(events) / frames
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[2])
+	parser.add_argument('--frames', type=int, default=FRAMES,
+		help="number of frames generated for every scenario")
+	parser.add_argument('--json', metavar="FILE",
+		help="save results to FILE")
+	parser.add_argument('--compare', metavar="FILE",
+		help="compare results with ones saved in FILE")
+	parser.add_argument('profiles', nargs='*',
+		help="profiles to test (default: all bundled profiles)")
+	args = parser.parse_args()
+
+	# Actions are expected to fail here and there without daemon around
+	logging.basicConfig(level=logging.CRITICAL)
+	# Profiles loaded here shouldn't end in user's cache
+	os.environ["XDG_CACHE_HOME"] = tempfile.mkdtemp()
+
+	xdisplay = None
+	if "DISPLAY" in os.environ:
+		xdisplay = X.open_display(os.environ["DISPLAY"])
+
+	old = json.loads(open(args.compare, "r").read()) if args.compare else {}
+	results = {}
+	print "%-45s %-13s %9s %9s %9s" % ("profile", "scenario",
+		"mean [us]", "p99 [us]", "events")
+	for filename in args.profiles or find_profiles():
+		name = os.path.basename(filename)
+		if not xdisplay and RE_NEEDS_X.search(open(filename, "r").read()):
+			print "%-45s skipped, needs X display" % (name[0:45],)
+			continue
+		for scenario in SCENARIOS:
+			key = "%s/%s" % (name, scenario.__name__)
+			mean, p99, events = results[key] = run(filename, scenario,
+					args.frames, xdisplay)
+			line = "%-45s %-13s %9.2f %9.2f %9.2f" % (name[0:45],
+				scenario.__name__, mean, p99, events)
+			if key in old:
+				line += "  (mean %+.1f%%)" % ((mean / old[key][0] - 1.0) * 100.0,)
+			print line
+
+	if args.json:
+		open(args.json, "w").write(json.dumps(results, indent=4, sort_keys=True))
+	shutil.rmtree(os.environ["XDG_CACHE_HOME"])
+
+
+if __name__ == "__main__":
+	main()
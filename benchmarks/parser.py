@@ -0,0 +1,139 @@
+#!/usr/bin/env python2
+"""
+SC-Controller - Parser benchmark
+
+Collects every action string from default_profiles/, default_menus/ and
+profile_examples/, along with every string literal from tests/, and
+compares how long it takes to split them into tokens using tokenize
+module and using ActionParser's own lexer. Also checks that both produce
+exactly same tokens and reports strings handled by tokenize fallback.
+
+Then compares how long it takes to decode every cacheable action stored
+in those files using from_json_data with empty parse cache and with
+every action already cached.
+
+Run as 'python2 benchmarks/parser.py' from repository root.
+"""
+from __future__ import unicode_literals
+import os, sys, time, json, ast, tokenize
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from scc.parser import ActionParser, ParseError
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+JSON_DIRS = ( "default_profiles", "default_menus", "profile_examples" )
+ROUNDS = 20
+
+
+def json_actions(data):
+	""" Yields every value stored under 'action' key, recursively """
+	if isinstance(data, dict):
+		for key in data:
+			if key == "action" and isinstance(data[key], basestring):
+				yield data[key]
+			else:
+				for x in json_actions(data[key]):
+					yield x
+	elif isinstance(data, list):
+		for i in data:
+			for x in json_actions(i):
+				yield x
+
+
+def json_cacheable(data):
+	""" Yields every dict with action that can be cached, recursively """
+	if isinstance(data, dict):
+		if "action" in data and ActionParser._cache_key(data) is not None:
+			yield data
+		for key in data:
+			for x in json_cacheable(data[key]):
+				yield x
+	elif isinstance(data, list):
+		for i in data:
+			for x in json_cacheable(i):
+				yield x
+
+
+def test_strings(filename):
+	""" Yields every string literal from python source file """
+	with open(filename, "r") as f:
+		for t in tokenize.generate_tokens(f.readline):
+			if t[0] == tokenize.STRING:
+				value = ast.literal_eval(t[1])
+				if isinstance(value, str):
+					value = value.decode("utf-8")
+				yield value
+
+
+def collect():
+	strings, datas = [], []
+	for d in JSON_DIRS:
+		path = os.path.join(ROOT, d)
+		for name in sorted(os.listdir(path)):
+			if not name.endswith((".sccprofile", ".menu")):
+				continue
+			data = json.loads(open(os.path.join(path, name), "r").read())
+			strings += list(json_actions(data))
+			datas += list(json_cacheable(data))
+	for path, dirs, files in os.walk(os.path.join(ROOT, "tests")):
+		for name in sorted(files):
+			if name.endswith(".py"):
+				strings += list(test_strings(os.path.join(path, name)))
+	return strings, datas
+
+
+def decodable(parser, datas):
+	""" Returns only data that parser can decode without OSD around """
+	rv = []
+	for data in datas:
+		try:
+			parser.from_json_data(data)
+			rv.append(data)
+		except ParseError:
+			pass
+	return rv
+
+
+def measure(fn, strings):
+	""" Returns time needed to process every string (or data), in ms """
+	start = time.time()
+	for i in xrange(ROUNDS):
+		for s in strings:
+			fn(s)
+	return (time.time() - start) * 1000.0 / ROUNDS
+
+
+def main():
+	strings, datas = collect()
+	fallback = [ s for s in strings if ActionParser._fast_tokenize(s) is None ]
+	mismatch = [ s for s in strings if s not in fallback
+		and ActionParser._fast_tokenize(s) != ActionParser._tokenize(s) ]
+	
+	print "%s strings, %s handled by tokenize fallback" % (len(strings), len(fallback))
+	handled = [ s for s in strings if s not in fallback ]
+	for label, lst in ( ("all strings", strings), ("without fallback", handled) ):
+		old = measure(ActionParser._tokenize, lst)
+		new = measure(ActionParser().restart, lst)
+		print "%s:" % (label,)
+		print "  tokenize: %8.2f ms" % (old,)
+		print "  lexer:    %8.2f ms (%.1fx faster)" % (new, old / new)
+	
+	parser = ActionParser()
+	datas = decodable(parser, datas)
+	ActionParser.CACHE.size = len(datas)
+	def uncached(data):
+		ActionParser.CACHE.clear()
+		parser.from_json_data(data)
+	old = measure(uncached, datas)
+	new = measure(parser.from_json_data, datas)
+	print "%s cacheable actions:" % (len(datas),)
+	print "  parsed:   %8.2f ms" % (old,)
+	print "  cached:   %8.2f ms (%.1fx faster)" % (new, old / new)
+	for s in mismatch:
+		print "MISMATCH: %s" % (repr(s),)
+	if mismatch:
+		sys.exit(1)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python2
+"""
+SC-Controller - Startup benchmark
+
+Measures how long it takes to import everything scc-daemon, sc-controller
+and scc-osd-* scripts import before doing anything else. Every import is
+done in new python process, so nothing is cached between runs.
+
+Entry points that need GTK are reported as unavailable if it cannot be
+imported. Run as 'python2 benchmarks/startup.py' from repository root.
+"""
+from __future__ import unicode_literals
+import os, sys, subprocess
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+RUNS = 5
+GI = ("import gi; gi.require_version('Gtk', '3.0'); "
+	"gi.require_version('GdkX11', '3.0'); gi.require_version('Rsvg', '2.0'); ")
+ENTRY_POINTS = (
+	# name, import statement, needs gi
+	( "scc.config", "import scc.config", False ),
+	( "scc.uinput", "import scc.uinput", False ),
+	( "scc-daemon", "from scc.sccdaemon import SCCDaemon", False ),
+	( "sc-controller", "from scc.gui.app import App", True ),
+	( "scc-osd-keyboard", "from scc.osd.keyboard import Keyboard", True ),
+	( "scc-osd-menu", "from scc.osd.menu import Menu", True ),
+	( "scc-osd-message", "from scc.osd.message import Message", True ),
+	( "scc-osd-radial-menu", "from scc.osd.radial_menu import RadialMenu", True ),
+)
+# Time is measured by child process itself, so interpreter startup is not
+# counted
+CODE = ("import time; t = time.time(); %s%s; "
+	"print((time.time() - t) * 1000.0)")
+
+
+def measure(statement, gi):
+	"""
+	Returns list of measured times in ms or error message if import fails
+	"""
+	code = CODE % (GI if gi else "", statement)
+	times = []
+	for i in xrange(RUNS):
+		p = subprocess.Popen([ sys.executable, "-c", code ], cwd=ROOT,
+			stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+		out, err = p.communicate()
+		if p.returncode != 0:
+			return err.strip().split("\n")[-1]
+		times.append(float(out.strip().split("\n")[-1]))
+	return sorted(times)
+
+
+def main():
+	for name, statement, gi in ENTRY_POINTS:
+		times = measure(statement, gi)
+		if not isinstance(times, list):
+			print "%-20s not available: %s" % (name, times)
+		else:
+			print "%-20s median %7.1f ms, min %7.1f ms" % (name,
+				times[len(times) / 2], times[0])
+
+
+if __name__ == "__main__":
+	main()
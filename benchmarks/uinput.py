@@ -0,0 +1,113 @@
+#!/usr/bin/env python2
+"""
+SC-Controller - uinput benchmark
+
+Compares number of write syscalls and time needed to emit one frame
+of gamepad events (both sticks moved, button pressed, triggers pulled)
+when every event is written separately and when events are queued
+and written together by synEvent.
+
+Needs write access to /dev/uinput. Per-event writes are done using
+compiled libuinput, as UInput used to do it.
+Run as 'python2 benchmarks/uinput.py' from repository root.
+"""
+from __future__ import unicode_literals
+import os, sys, time, ctypes
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from scc.uinput import Gamepad, Keys, Axes, LibUInputBackend
+
+FRAMES = 10000
+WRITES = ("uinput_key", "uinput_abs", "uinput_rel", "uinput_scan",
+	"uinput_syn")
+
+
+class CountingLib(object):
+	"""
+	Wraps libuinput and counts calls to functions that end up in one
+	write() syscall each.
+	"""
+	def __init__(self, lib):
+		self.lib = lib
+		self.writes = 0
+	
+	def __getattr__(self, name):
+		fn = getattr(self.lib, name)
+		if name not in WRITES:
+			return fn
+		def wrapper(*a):
+			self.writes += 1
+			return fn(*a)
+		return wrapper
+
+
+class CountingWrite(object):
+	""" Replaces os.write and counts its calls """
+	def __init__(self):
+		self.write = os.write
+		self.writes = 0
+	
+	def __call__(self, fd, data):
+		self.writes += 1
+		return self.write(fd, data)
+
+
+def frame_values(i):
+	v = (i * 37) % 65536 - 32768
+	return v, -v, (i % 256), 255 - (i % 256), i & 1
+
+
+def unbatched(dev, lib, i):
+	""" Emits frame as UInput did before events were queued """
+	x, y, lt, rt, a = frame_values(i)
+	fd = dev._fd
+	lib.uinput_abs(fd, ctypes.c_uint16(Axes.ABS_X), ctypes.c_int32(x))
+	lib.uinput_abs(fd, ctypes.c_uint16(Axes.ABS_Y), ctypes.c_int32(y))
+	lib.uinput_abs(fd, ctypes.c_uint16(Axes.ABS_RX), ctypes.c_int32(y))
+	lib.uinput_abs(fd, ctypes.c_uint16(Axes.ABS_RY), ctypes.c_int32(x))
+	lib.uinput_abs(fd, ctypes.c_uint16(Axes.ABS_Z), ctypes.c_int32(lt))
+	lib.uinput_abs(fd, ctypes.c_uint16(Axes.ABS_RZ), ctypes.c_int32(rt))
+	lib.uinput_key(fd, ctypes.c_uint16(Keys.BTN_A), ctypes.c_int32(a))
+	lib.uinput_syn(fd)
+
+
+def batched(dev, lib, i):
+	""" Emits frame using queue """
+	x, y, lt, rt, a = frame_values(i)
+	dev.axisEvent(Axes.ABS_X, x)
+	dev.axisEvent(Axes.ABS_Y, y)
+	dev.axisEvent(Axes.ABS_RX, y)
+	dev.axisEvent(Axes.ABS_RY, x)
+	dev.axisEvent(Axes.ABS_Z, lt)
+	dev.axisEvent(Axes.ABS_RZ, rt)
+	dev.keyEvent(Keys.BTN_A, a)
+	dev.synEvent()
+
+
+def measure(dev, fn):
+	lib = CountingLib(LibUInputBackend()._lib)
+	write = os.write = CountingWrite()
+	try:
+		start = time.time()
+		for i in xrange(FRAMES):
+			fn(dev, lib, i)
+		t = time.time() - start
+	finally:
+		os.write = write.write
+	writes = lib.writes + write.writes
+	return float(writes) / FRAMES, t * 1000000.0 / FRAMES
+
+
+def main():
+	dev = Gamepad(name=b"SCC Benchmark Gamepad")
+	if dev._fd < 0:
+		print >>sys.stderr, "Failed to create uinput device"
+		return 1
+	for name, fn in (("unbatched", unbatched), ("batched", batched)):
+		syscalls, us = measure(dev, fn)
+		print "%-10s %5.2f syscalls/frame %8.2f us/frame" % (name, syscalls, us)
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -586,6 +586,7 @@ class MouseAction(HapticEnabledAction, Action):
 		print self._mouse_axis, dx
 		if self._mouse_axis is None:
 			mapper.mouse.moveEvent(dx, dy)
+			mapper.syn_list.add(mapper.mouse)
 		elif self._mouse_axis == Rels.REL_X:
 			mapper.mouse_move(dx, 0)
 		elif self._mouse_axis == Rels.REL_Y:
@@ -695,6 +696,7 @@ class CircularAction(HapticEnabledAction, Action):
 				mapper.mouse.scrollEvent(1, angle * self.speed)
 			else:
 				log.warning("Invalid axis for circular: %s", self._mouse_axis)
+			mapper.syn_list.add(mapper.mouse)
 			mapper.force_event.add(FE_PAD)
 
 
@@ -1469,6 +1471,19 @@ class XYAction(HapticEnabledAction, Action):
 			self.change = self._change
 	
 	
+	def __getstate__(self):
+		# Bound method cannot be pickled, it's recreated by __setstate__
+		state = dict(self.__dict__)
+		state.pop("change", None)
+		return state
+	
+	
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		if hasattr(self.x, "change") or hasattr(self.y, "change"):
+			self.change = self._change
+	
+	
 	@staticmethod
 	def decode(data, action, parser, *a):
 		""" Called when decoding profile from json """
@@ -186,8 +186,36 @@ def defines(base, include):
 	return out
 
 
+# Incremented when format of module generated by generate_module changes
+MODULE_VERSION = 1
+
+def generate_module(base, include):
+
+	""" Returns source of python module with all #defines from base/include """
+
+	lines = [
+		'"""',
+		'Generated from %s by \'python2 -m scc.cheader --module %s %s\'.' % (
+			include, base, include),
+		'Do not edit, regenerate when header changes.',
+		'"""',
+		'from collections import OrderedDict',
+		'',
+		'VERSION = %s' % (MODULE_VERSION,),
+		'SOURCE = %r' % (str(include),),
+		'CHEAD = OrderedDict([',
+	]
+	for k, v in defines(base, include).items():
+		lines.append('\t(%r, %r),' % (str(k), v))
+	lines.append('])')
+	return "\n".join(lines) + "\n"
+
+
 if __name__ == '__main__':
 	import sys
+	if sys.argv[1] == '--module':
+		sys.stdout.write(generate_module(sys.argv[2], sys.argv[3]))
+		sys.exit(0)
 	definesDict = defines(sys.argv[1], sys.argv[2])
 	for k, v in definesDict.items():
 		print("{}:\t{}".format(k, v))
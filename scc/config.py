@@ -7,9 +7,8 @@ Handles loading, storing and querying confir file
 from __future__ import unicode_literals
 
 from scc.paths import get_config_path
-from scc.profile import Encoder
 
-import os, json, logging
+import os, json, tempfile, threading, logging
 log = logging.getLogger("Config")
 
 
@@ -30,6 +29,13 @@ class Config(object):
 		# (or only some) inputs.
 		# This enables GUI to display which physical button was pressed to user.
 		"enable_sniffing" : False,
+		# Limits for events sent to clients that are observing or locking
+		# inputs. Events over queue size are dropped, analog events (stick,
+		# pad and trigger positions) waiting in queue are replaced by newer
+		# ones, so client lagging behind always gets only latest position.
+		"client_event_rate" : 200,		# events per second, 0 for no limit
+		"client_queue_size" : 256,		# number of events
+		"profile_cache_size" : 8,		# Number of parsed profiles kept by daemon
 		"osd_colors": {
 			"background": "160c00",
 			"border": "00FF00",
@@ -51,11 +57,62 @@ class Config(object):
 		}
 	}
 	
+	# Delay before configuration changed using save_later is written, in s
+	SAVE_DELAY = 1.0
+	
+	_shared = None
+	_shared_lock = threading.Lock()
+	
 	def __init__(self):
 		self.filename = os.path.join(get_config_path(), "config.json")
+		self._stat = None
+		self._save_timer = None
+		self._lock = threading.Lock()
 		self.reload()
 	
 	
+	@staticmethod
+	def shared():
+		"""
+		Returns instance shared by whole process.
+		
+		Configuration file is loaded only on first call and then again only
+		if it was changed since, so this can be called whenever any value
+		is needed, instead of keeping and reloading Config instance.
+		
+		File is not reloaded while change scheduled by save_later is
+		waiting to be written, so such change is not lost.
+		"""
+		with Config._shared_lock:
+			if Config._shared is None:
+				Config._shared = Config()
+			elif Config._shared.is_changed() and not Config._shared.is_save_pending():
+				log.debug("Configuration file changed, reloading")
+				Config._shared.reload()
+			return Config._shared
+	
+	
+	def _get_stat(self):
+		""" Returns values used to recognize that file was changed """
+		try:
+			st = os.stat(self.filename)
+		except OSError:
+			return None
+		# Inode is changed by every save, as file is replaced by rename
+		return st.st_ino, st.st_mtime, st.st_size
+	
+	
+	def is_changed(self):
+		""" Returns True if file was changed since it was loaded or saved """
+		return self._get_stat() != self._stat
+	
+	
+	def is_save_pending(self):
+		""" Returns True if save_later was called and file is not saved yet """
+		with self._lock:
+			return self._save_timer is not None
+	
+	
 	def reload(self):
 		""" (Re)loads configuration. Works as load(), but handles exceptions """
 		try:
@@ -89,7 +146,9 @@ class Config(object):
 	
 	
 	def load(self):
+		stat = self._get_stat()
 		self.values = json.loads(open(self.filename, "r").read())
+		self._stat = stat
 	
 	
 	def create(self):
@@ -105,12 +164,51 @@ class Config(object):
 		if not os.path.exists(get_config_path()):
 			os.makedirs(get_config_path())
 		# Save
-		data = { k:self.values[k] for k in self.values }
-		jstr = Encoder(sort_keys=True, indent=4).encode(data)
-		file(self.filename, "w").write(jstr)
+		# Imported only here, as scc.profile imports parser and all actions
+		# and many short-lived tools only read configuration
+		from scc.profile import Encoder
+		with self._lock:
+			if self._save_timer:
+				self._save_timer.cancel()
+				self._save_timer = None
+			data = { k:self.values[k] for k in self.values }
+			jstr = Encoder(sort_keys=True, indent=4).encode(data)
+			# Written to temporary file first, so other process never reads
+			# half-written configuration
+			f = tempfile.NamedTemporaryFile(dir=get_config_path(),
+				prefix=".config.json.", delete=False)
+			try:
+				f.write(jstr)
+				f.close()
+				os.rename(f.name, self.filename)
+			except:
+				f.close()
+				os.unlink(f.name)
+				raise
+			self._stat = self._get_stat()
 		log.debug("Configuration saved")
 	
 	
+	def save_later(self):
+		"""
+		Saves configuration file after SAVE_DELAY. Calling this again
+		before that restarts delay, so many changes done in quick
+		succession are written only once.
+		"""
+		with self._lock:
+			if self._save_timer:
+				self._save_timer.cancel()
+			self._save_timer = threading.Timer(self.SAVE_DELAY, self._delayed_save)
+			self._save_timer.start()
+	
+	
+	def _delayed_save(self):
+		try:
+			self.save()
+		except Exception, e:
+			log.error("Failed to save configuration: %s", e)
+	
+	
 	def __iter__(self):
 		for k in self.values:
 			yield k
@@ -41,6 +41,10 @@ HPERIOD  = 0.02
 LPERIOD  = 0.5
 DURATION = 1.0
 
+# Number of interrupt transfers kept submitted at once, so there is always
+# one pending while previously received packet is being processed
+TRANSFERS = 4
+
 CONTROLER_FORMAT = [
 	('b',   'type'),
 	('x',   'ukn_01'),
@@ -91,7 +95,37 @@ CI_NAMES = [ x for x in NAMES if not x.startswith('ukn_') ]
 
 ControllerInput = namedtuple('ControllerInput', ' '.join(CI_NAMES))
 
-SCI_NULL = ControllerInput._make(struct.unpack('<' + ''.join(FORMATS), b'\x00' * 64))
+CI_STRUCT = struct.Struct('<' + ''.join(FORMATS))
+
+SCI_NULL = ControllerInput._make(CI_STRUCT.unpack(b'\x00' * 64))
+
+
+class ControllerState(object):
+	"""
+	Mutable counterpart of ControllerInput, with same attributes.
+	
+	Used by SCController to decode incoming packets without allocating new
+	object for each one of them.
+	"""
+	__slots__ = tuple(CI_NAMES)
+	
+	def __init__(self):
+		self.decode(b'\x00' * 64)
+	
+	
+	def decode(self, data):
+		""" Decodes 64b packet into this object. Returns self. """
+		(self.type, self.status, self.seq, self.buttons,
+			self.ltrig, self.rtrig,
+			self.lpad_x, self.lpad_y, self.rpad_x, self.rpad_y,
+			self.gpitch, self.groll, self.gyaw,
+			self.q1, self.q2, self.q3, self.q4) = CI_STRUCT.unpack(data)
+		return self
+	
+	
+	def __repr__(self):
+		return "<ControllerState %s>" % (", ".join([
+			"%s=%s" % (x, getattr(self, x)) for x in CI_NAMES ]),)
 
 class SCStatus(IntEnum):
 	IDLE = 0x04
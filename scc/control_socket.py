@@ -0,0 +1,360 @@
+#!/usr/bin/env python2
+"""
+SC-Controller - Control Socket
+
+Unix socket server used by daemon to talk with GUI, OSD, autoswitcher and
+scripts. All clients are served by single thread using poll, so number of
+connected clients doesn't affect number of threads fighting with
+controller input for daemon lock.
+
+Protocol itself is handled by SCCDaemon, this only splits received data
+into lines and sends out whatever is queued for every client.
+"""
+from __future__ import unicode_literals
+
+from scc.scheduler import Waker
+from collections import deque
+import socket, select, errno, threading, traceback, time, logging
+log = logging.getLogger("CSocket")
+
+
+class ClientQueue(object):
+	"""
+	Outbound queue of one client. Stands in place of client's wfile, so
+	anything can be written into it from any thread without blocking;
+	data is then taken out by ControlServer.
+	
+	Events (put using put_event) are limited to 'max_size' waiting at once
+	and to 'max_rate' sent per second. Events that doesn't fit are dropped,
+	analog events with 'key' set are coalesced, so only latest value of
+	stick, pad or trigger waits in queue.
+	Responses and other messages (put using write) are never dropped and
+	are not slowed down by event rate limit.
+	
+	While queue is held (see hold), ControlServer doesn't pass any more
+	messages from client to on_message, so responses to them can't get
+	ahead of response that is not known yet.
+	"""
+	
+	def __init__(self, max_size=256, max_rate=0):
+		self.max_size = max_size
+		self.max_rate = max_rate
+		self.dropped = 0
+		self.coalesced = 0
+		self.waker = None		# Set by ControlServer
+		self.closed = False
+		self.held = False
+		self._lock = threading.Lock()
+		self._items = deque()	# of [ data, key, is_event ]
+		self._pending = {}		# key -> item waiting in _items
+		self._events = 0		# number of events in _items
+		self._next_send = 0
+	
+	
+	def write(self, data):
+		""" Queues message that is never dropped """
+		with self._lock:
+			self._items.append([ data, None, False ])
+		if self.waker:
+			self.waker.wake()
+	
+	
+	def flush(self):
+		""" Does nothing, provided so queue can be used as file """
+		pass
+	
+	
+	def put_event(self, data, key=None):
+		"""
+		Queues event. If 'key' is set and event with same key is still
+		waiting in queue, it is replaced by new one.
+		"""
+		with self._lock:
+			if key is not None and key in self._pending:
+				self._pending[key][0] = data
+				self.coalesced += 1
+				return
+			if self._events >= self.max_size:
+				self.dropped += 1
+				return
+			item = [ data, key, True ]
+			self._items.append(item)
+			self._events += 1
+			if key is not None:
+				self._pending[key] = item
+		if self.waker:
+			self.waker.wake()
+	
+	
+	def hold(self):
+		"""
+		Stops handling of messages received from client until release()
+		is called. Can be called from any thread.
+		"""
+		self.held = True
+	
+	
+	def release(self):
+		"""
+		Resumes handling of messages received from client.
+		Can be called from any thread.
+		"""
+		self.held = False
+		if self.waker:
+			self.waker.wake()
+	
+	
+	def next_send(self):
+		"""
+		Returns time when queued data can be sent or None if there is
+		nothing queued.
+		"""
+		if not self._items:
+			return None
+		if self._events < len(self._items):
+			# There is something that is not event
+			return 0
+		return self._next_send
+	
+	
+	def pop(self, now):
+		"""
+		Returns everything that can be sent at time 'now' as one string.
+		Returns empty string if there is nothing queued.
+		
+		If event rate doesn't allow sending events yet, only other
+		messages are returned, possibly ahead of events queued before
+		them. Events keep coalescing while waiting.
+		"""
+		with self._lock:
+			if not self._items:
+				return b""
+			if now < self._next_send:
+				if self._events == len(self._items):
+					return b""
+				items = [ item for item in self._items if not item[2] ]
+				self._items = deque([ item for item in self._items if item[2] ])
+				return b"".join([ item[0] for item in items ])
+			items, self._items = self._items, deque()
+			events, self._events = self._events, 0
+			self._pending = {}
+		if self.max_rate > 0:
+			self._next_send = now + float(events) / self.max_rate
+		return b"".join([ item[0] for item in items ])
+	
+	
+	def close(self):
+		"""
+		Throws away everything queued. ControlServer closes connection
+		after this is called.
+		"""
+		with self._lock:
+			self.closed = True
+			self._items.clear()
+			self._pending = {}
+		if self.waker:
+			self.waker.wake()
+
+
+class Connection(object):
+	""" State of one connection kept by ControlServer """
+	def __init__(self, sock, client):
+		self.sock = sock
+		self.fd = sock.fileno()
+		self.client = client
+		self.closed = False
+		self.inbuf = b""
+		self.outbuf = b""
+		self.mask = 0
+
+
+class ControlServer(object):
+	"""
+	Listens on unix socket and serves all clients from one thread.
+	
+	on_connect(sock) is called for every new connection and has to return
+	client object with 'wfile' attribute set to ClientQueue. Everything
+	written to that queue is sent to client. on_message(client, line) is
+	called for every received line (without trailing newline) and
+	on_disconnect(client) when connection is closed.
+	
+	When client stops reading and more than MAX_OUTBUF bytes are waiting
+	to be sent, server stops taking data from its queue (so events are
+	coalesced or dropped there) and stops reading its requests, until
+	client catches up. Requests are not read while client's queue
+	is held as well.
+	"""
+	MAX_LINE = 65536
+	MAX_OUTBUF = 65536
+	READ_SIZE = 4096
+	
+	def __init__(self, socket_file, on_connect, on_message, on_disconnect):
+		self.socket_file = socket_file
+		self._on_connect = on_connect
+		self._on_message = on_message
+		self._on_disconnect = on_disconnect
+		self._connections = {}	# fileno -> Connection
+		self._waker = Waker()
+		self._shutdown = False
+		self._poll = select.poll()
+		self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self.sock.bind(socket_file)
+		self.sock.listen(8)
+		self.sock.setblocking(False)
+		self._poll.register(self.sock.fileno(), select.POLLIN)
+		self._poll.register(self._waker.fileno(), select.POLLIN)
+	
+	
+	def serve_forever(self):
+		""" Runs until shutdown() is called """
+		sfd, wfd = self.sock.fileno(), self._waker.fileno()
+		try:
+			while not self._shutdown:
+				for fd, event in self._poll.poll(self._get_timeout()):
+					if fd == sfd:
+						self._accept()
+					elif fd == wfd:
+						self._waker.clear()
+					elif fd in self._connections:
+						c = self._connections[fd]
+						if event & select.POLLOUT:
+							self._send(c)
+						if not c.closed and event & (select.POLLIN | select.POLLHUP | select.POLLERR):
+							self._receive(c)
+				now = time.time()
+				for c in self._connections.values():
+					self._update(c, now)
+		finally:
+			for c in self._connections.values():
+				self._close(c)
+			self.sock.close()
+			self._waker.close()
+	
+	
+	def shutdown(self):
+		""" Stops serve_forever loop. Can be called from any thread """
+		self._shutdown = True
+		self._waker.wake()
+	
+	
+	def _get_timeout(self):
+		"""
+		Returns timeout for poll, in ms. None (wait forever) unless some
+		client has data that cannot be sent yet because of event rate limit.
+		"""
+		when = None
+		for c in self._connections.itervalues():
+			if len(c.outbuf) < self.MAX_OUTBUF:
+				n = c.client.wfile.next_send()
+				if n is not None and (when is None or n < when):
+					when = n
+		if when is None:
+			return None
+		return max(0, int((when - time.time()) * 1000) + 1)
+	
+	
+	def _accept(self):
+		try:
+			sock, trash = self.sock.accept()
+		except socket.error:
+			return
+		sock.setblocking(False)
+		client = self._on_connect(sock)
+		client.wfile.waker = self._waker
+		c = Connection(sock, client)
+		self._connections[c.fd] = c
+		self._update(c, time.time())
+	
+	
+	def _receive(self, c):
+		try:
+			data = c.sock.recv(self.READ_SIZE)
+		except socket.error, e:
+			if e.errno in (errno.EAGAIN, errno.EINTR):
+				return
+			data = b""
+		if not data:
+			# Connection closed by other side
+			self._close(c)
+			return
+		c.inbuf += data
+		self._dispatch(c)
+		if not c.closed and len(c.inbuf) > self.MAX_LINE:
+			log.warning("Client sent too long message, closing connection")
+			self._close(c)
+	
+	
+	def _dispatch(self, c):
+		""" Passes complete lines from inbuf to on_message, unless held """
+		queue = c.client.wfile
+		while not c.closed and not queue.held and b"\n" in c.inbuf:
+			line, c.inbuf = c.inbuf.split(b"\n", 1)
+			if len(line.strip(b"\t\r ")) > 0:
+				self._message(c, line)
+	
+	
+	def _message(self, c, line):
+		"""
+		Passes received line to on_message. Exception raised there is only
+		reported to client that sent the line, so one bad message can't
+		kill thread that serves everyone.
+		"""
+		try:
+			self._on_message(c.client, line)
+		except Exception, e:
+			log.exception(e)
+			tb = traceback.format_exc().encode('string_escape')
+			c.client.wfile.write(b"Fail: " + tb + b"\n")
+	
+	
+	def _send(self, c):
+		try:
+			sent = c.sock.send(c.outbuf)
+		except socket.error, e:
+			if e.errno in (errno.EAGAIN, errno.EINTR):
+				return
+			self._close(c)
+			return
+		c.outbuf = c.outbuf[sent:]
+	
+	
+	def _update(self, c, now):
+		"""
+		Moves data from client's queue to connection buffer, tries to
+		send it and sets what should be polled for.
+		"""
+		if c.closed:
+			return
+		queue = c.client.wfile
+		if queue.closed:
+			self._close(c)
+			return
+		if not queue.held and b"\n" in c.inbuf:
+			# Lines received while queue was held
+			self._dispatch(c)
+			if c.closed:
+				return
+		if len(c.outbuf) < self.MAX_OUTBUF:
+			c.outbuf += queue.pop(now)
+		if c.outbuf:
+			self._send(c)
+			if c.closed:
+				return
+		mask = select.POLLOUT if c.outbuf else 0
+		if len(c.outbuf) < self.MAX_OUTBUF and not queue.held:
+			mask |= select.POLLIN
+		if mask != c.mask:
+			self._poll.register(c.fd, mask)
+			c.mask = mask
+	
+	
+	def _close(self, c):
+		if not c.closed:
+			c.closed = True
+			del self._connections[c.fd]
+			self._poll.unregister(c.fd)
+			try:
+				self._on_disconnect(c.client)
+			finally:
+				c.client.wfile.close()
+				c.sock.close()
@@ -19,35 +19,36 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-from threading import Timer
-import struct, time, logging
+import struct, select, time, thread, logging
 
 from scc.lib import usb1
+from scc.scheduler import Waker
 from scc.constants import VENDOR_ID, PRODUCT_ID, HPERIOD, LPERIOD, DURATION
-from scc.constants import ENDPOINT, CONTROLIDX, FORMATS, ControllerInput
+from scc.constants import TRANSFERS
+from scc.constants import ENDPOINT, CONTROLIDX, ControllerState
 from scc.constants import SCStatus, SCButtons, HapticPos, SCPacketType
 
 log = logging.getLogger("SCController")
 
+HOTPLUG_STRUCT = struct.Struct('<xxxxB59x')
+
 class SCController(object):
 
-	def __init__(self, callback):
+	def __init__(self, callback, transfers=TRANSFERS):
 		"""
 		Constructor
 		
 		callback:
 			function called on usb message 
-			takes (SCController, current_time, ControllerInput) as arguments
+			takes (SCController, current_time, ControllerState) as arguments.
+			ControllerState passed to callback is reused, so it stays
+			valid only until callback is called with next one.
+		transfers:
+			number of interrupt transfers kept submitted at once
 		"""
-		self._handle = None
-		self._cb = callback
-		self._cscallback = None		# Controller State Callback
-		self._cmsg = []
+		self._init_state(callback)
 		self._claimed = []
 		self._ctx = usb1.USBContext()
-		self._controller_connected = False
-		self._idle_timeout = 600
-		self._enable_gyros = False
 		
 		for i in range(len(PRODUCT_ID)):
 			pid = PRODUCT_ID[i]
@@ -79,24 +80,52 @@ class SCController(object):
 					self._handle.claimInterface(number)
 					self._claimed.append(number)
 		
+		# Buffers are allocated only once here and reused every time
+		# when transfer is resubmitted
 		self._transfer_list = []
-		transfer = self._handle.getTransfer()
-		transfer.setInterrupt(
-			usb1.ENDPOINT_IN | endpoint,
-			64,
-			callback=self._processReceivedData,
-		)
-		transfer.submit()
-		self._transfer_list.append(transfer)
-
+		for i in xrange(max(1, transfers)):
+			transfer = self._handle.getTransfer()
+			transfer.setInterrupt(
+				usb1.ENDPOINT_IN | endpoint,
+				64,
+				callback=self._processReceivedData,
+			)
+			transfer.submit()
+			self._transfer_list.append(transfer)
+	
+	
+	def _init_state(self, callback):
+		"""
+		Sets everything that doesn't depend on USB device.
+		Shared with ReplayController.
+		"""
+		self._handle = None
+		# Used by other threads to wake run() loop up
+		self._waker = Waker()
+		self._loop_thread = None
+		self._cb = callback
+		self._cscallback = None		# Controller State Callback
+		self._cmsg = []
+		self._controller_connected = False
+		self._idle_timeout = 600
+		self._enable_gyros = False
+		self._last_seq = None
+		self._dropped = 0
+		self._capture = None
+		self._stats = None
+		
+		# Timer is driven from run() loop, so no thread is needed for it
 		self._period = LPERIOD
-
-		if pid == 0x1102:
-			self._timer = Timer(LPERIOD, self._callbackTimer)
-			self._timer.start()
-		else:
-			self._timer = None
-
+		self._next_tick = time.time() + LPERIOD
+		self._scheduler = None
+		self._last_run = 0
+		
+		# Packets are decoded into one of these two, so Mapper can still
+		# compare current and previous state without anything being
+		# allocated for new packet
+		self._states = ( ControllerState(), ControllerState() )
+		self._next_state = 0
+		
 		self._tup = None
 		self._lastusb = time.time()
 	
@@ -121,9 +150,50 @@ class SCController(object):
 		self._cscallback = callback
 	
 	
+	def setScheduler(self, scheduler):
+		"""
+		Sets object whose scheduled tasks should be executed from run() loop
+		even when there is no input to process.
+		scheduler:
+			has to provide next_scheduled() method that returns time when
+			next task should be executed (or None) and run_scheduled(now)
+			method that executes tasks that are due. Usually Mapper.
+		"""
+		self._scheduler = scheduler
+	
+	
+	def setCapture(self, capture):
+		"""
+		Sets object into which every received packet is written.
+		capture:
+			has to provide write(data) method, usually
+			scc.replay.CaptureWriter. None disables capturing.
+		"""
+		self._capture = capture
+	
+	
+	def setStats(self, stats):
+		"""
+		Sets scc.stats.LatencyStats instance that receives time when
+		every packet arrived. None disables measuring.
+		"""
+		self._stats = stats
+	
+	
+	def wakeup(self):
+		"""
+		Makes run() loop to execute scheduled tasks that are due as soon
+		as possible. Should be called when task is scheduled from thread
+		other than one executing run(); does nothing when called from it.
+		"""
+		if thread.get_ident() != self._loop_thread:
+			self._waker.wake()
+	
+	
 	def __del__(self):
 		if self._handle:
 			self._handle.close()
+		self._waker.close()
 
 	def _sendControl(self, data, timeout=0):
 
@@ -151,58 +221,140 @@ class SCController(object):
 	
 	def _processReceivedData(self, transfer):
 		"""Private USB async Rx function"""
-		
-		if (transfer.getStatus() != usb1.TRANSFER_COMPLETED or
-			transfer.getActualLength() != 64):
+		status = transfer.getStatus()
+		if status != usb1.TRANSFER_COMPLETED or transfer.getActualLength() != 64:
+			if status in (usb1.TRANSFER_COMPLETED, usb1.TRANSFER_TIMED_OUT,
+					usb1.TRANSFER_OVERFLOW):
+				# Nothing usable received, but transfer can be reused
+				transfer.submit()
+			elif status != usb1.TRANSFER_CANCELLED:
+				# Dongle is stuck or gone. Rest of the ring is cancelled,
+				# so run() loop ends and dongle is reset
+				log.error("USB transfer failed with status %s", status)
+				self._cancel_transfers()
 			return
 		
+		# Copied, as stats can be disabled from another thread
+		stats = self._stats
+		if stats:
+			stats.mark(stats.PACKET)
 		data = transfer.getBuffer()
-		tup = ControllerInput._make(struct.unpack('<' + ''.join(FORMATS), data))
+		# Data are already copied out, so transfer can be returned to ring
+		# before (possibly slow) mapper callback is executed
+		transfer.submit()
+		if self._capture:
+			self._capture.write(data)
+		self._processPacket(data)
+		if stats:
+			# Packet that didn't reach mapper shouldn't be counted
+			# into next frame
+			stats.clear_frame()
+	
+	
+	def _cancel_transfers(self):
+		""" Cancels every transfer that is still submitted """
+		for transfer in self._transfer_list:
+			if transfer.isSubmitted():
+				try:
+					transfer.cancel()
+				except usb1.USBError:
+					# Already finished
+					pass
+	
+	
+	def _processPacket(self, data):
+		""" Decodes 64b packet and handles it """
+		tup = self._states[self._next_state].decode(data)
 		if tup.status == SCStatus.HOTPLUG:
-			transfer.submit()
-			state, = struct.unpack('<xxxxB59x', data)
+			state, = HOTPLUG_STRUCT.unpack(data)
 			self._controller_connected = (state == 2)
+			self._last_seq = None
 			if self._cscallback:
 				self._cscallback(self, self._controller_connected)
 				self.configure_controller()
-		elif tup.status == SCStatus.INPUT:
+			return
+		
+		self._check_seq(tup.seq)
+		if tup.status == SCStatus.INPUT:
 			self._tup = tup
+			self._next_state ^= 1
 			self._callback()
-			transfer.submit()
 			if not self._controller_connected:
 				self._controller_connected = True
 				if self._cscallback:
 					self._cscallback(self, self._controller_connected)
 					self.configure_controller()
-		else:
-			transfer.submit()
+	
+	
+	def _check_seq(self, seq):
+		"""
+		Counts packets missing between last and currently received one.
+		'seq' is 16bit number increased by controller with every packet.
+		"""
+		if self._last_seq is not None:
+			gap = (seq - self._last_seq - 1) & 0xFFFF
+			if gap < 0x8000:
+				# Larger difference means either duplicate or reordered
+				# packet, and those are not interesting here
+				self._dropped += gap
+		self._last_seq = seq
+	
+	
+	def getDroppedPackets(self):
+		"""
+		Returns number of packets that were detected as lost, based on
+		gaps in 'seq' field.
+		"""
+		return self._dropped
 	
 	
 	def _callback(self):
-		self._lastusb = time.time()
+		self._lastusb = self._last_run = time.time()
 		
 		self._cb(self, self._lastusb, self._tup)
 		self._period = HPERIOD
+		self._next_tick = self._lastusb + HPERIOD
 	
 	
-	def _callbackTimer(self):
-		t = time.time()
-		d = t - self._lastusb
-		self._timer.cancel()
-		
-		if d > DURATION:
-			self._period = LPERIOD
-		
-		self._timer = Timer(self._period, self._callbackTimer)
-		self._timer.start()
-		
-		if self._tup is None:
-			return
-		
-		if d < HPERIOD:
-			return
+	def _get_timeout(self, now):
+		"""
+		Returns for how long can run() loop wait for USB events before
+		_callbackTimer has to be called.
+		"""
+		deadline = self._next_tick
+		if self._scheduler:
+			when = self._scheduler.next_scheduled()
+			if when is not None:
+				# Tasks are not executed more often than once per HPERIOD,
+				# so actions that are rescheduling themselves all the time
+				# don't keep CPU busy
+				deadline = min(deadline, max(when, self._last_run + HPERIOD))
+		return max(0.0, deadline - now)
+	
+	
+	def _callbackTimer(self, t, woken=False):
+		"""
+		Called from run() loop every time when poll wakes up.
+		'woken' is True if wakeup() was called from another thread.
+		"""
+		if t >= self._next_tick:
+			d = t - self._lastusb
+			if d > DURATION:
+				self._period = LPERIOD
+			self._next_tick = t + self._period
+			
+			if self._tup is not None and d >= HPERIOD:
+				# Repeats last known state, so actions like mouse
+				# movement continue while nothing is being sent by controller
+				self._last_run = t
+				self._cb(self, t, self._tup)
+				return
 		
-		self._cb(self, t, self._tup)
+		if self._scheduler and (woken or t >= self._last_run + HPERIOD):
+			when = self._scheduler.next_scheduled()
+			if when is not None and when <= t:
+				self._last_run = t
+				self._scheduler.run_scheduled(t)
 	
 	
 	def disable_auto_haptic(self):
@@ -287,8 +439,17 @@ class SCController(object):
 		"""Fucntion to run in order to process usb events"""
 		if self._handle:
 			try:
+				poller = usb1.USBPoller(self._ctx, Poll())
+				wfd = self._waker.fileno()
+				poller.register(wfd, select.POLLIN)
+				self._loop_thread = thread.get_ident()
 				while any(x.isSubmitted() for x in self._transfer_list):
-					self._ctx.handleEvents()
+					woken = False
+					for fd, events in poller.poll(self._get_timeout(time.time())):
+						if fd == wfd:
+							self._waker.clear()
+							woken = True
+					self._callbackTimer(time.time(), woken)
 					if len(self._cmsg) > 0:
 						cmsg = self._cmsg.pop()
 						self._sendControl(cmsg)
@@ -305,6 +466,9 @@ class SCController(object):
 				log.error(e)
 				pass
 			finally:
+				self._loop_thread = None
+				if self._dropped:
+					log.debug("%s packets were lost", self._dropped)
 				self.unclaim()
 
 
@@ -314,6 +478,24 @@ class SCController(object):
 			self._ctx.handleEvents()
 
 
+class Poll(object):
+	"""
+	Wraps select.poll so it can be used by usb1.USBPoller, which expects
+	timeout in seconds instead of milliseconds.
+	"""
+	def __init__(self):
+		self._poll = select.poll()
+		self.register = self._poll.register
+		self.unregister = self._poll.unregister
+	
+	
+	def poll(self, timeout=None):
+		if timeout is None or timeout < 0:
+			return self._poll.poll()
+		# Rounded up, so poll doesn't wake up just before deadline
+		return self._poll.poll(int(timeout * 1000.0 + 0.999))
+
+
 class HapticData(object):
 	""" Simple container to hold haptic feedback settings """
 	
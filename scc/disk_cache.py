@@ -0,0 +1,88 @@
+#!/usr/bin/env python2
+"""
+SC-Controller - Disk Cache
+
+Stores already parsed profiles and menus in ~/.cache/scc, so they don't
+have to be decoded from JSON and parsed again every time they are loaded.
+
+Every cached file starts with header that identifies source file by path,
+modification time and size, along with version of cache format and of
+SC-Controller itself. Cached data are used only if everything matches.
+
+Modification time of newest module in scc package, including its
+subpackages, is part of header as well, so cache is not used after parser
+or actions are changed without version being changed, what happens all
+the time when running from source.
+"""
+from __future__ import unicode_literals
+
+from scc.constants import DAEMON_VERSION
+from scc.paths import get_cache_path
+
+import os, cPickle, hashlib, tempfile, logging
+log = logging.getLogger("DCache")
+
+CACHE_VERSION = 1
+_code_mtime = None
+
+
+def _get_code_mtime():
+	global _code_mtime
+	if _code_mtime is None:
+		# Subpackages are included, as they define pickled objects as well
+		_code_mtime = max([ os.path.getmtime(os.path.join(path, x))
+			for path, dirs, files in os.walk(os.path.dirname(__file__))
+			for x in files if x.endswith(".py") ])
+	return _code_mtime
+
+
+def _cache_file(kind, path, parser):
+	key = "%s\0%s\0%s" % (kind, parser.__class__.__name__, path)
+	return os.path.join(get_cache_path(),
+		hashlib.sha1(key.encode("utf-8")).hexdigest() + ".pickle")
+
+
+def _header(kind, path, st):
+	return ( CACHE_VERSION, DAEMON_VERSION, _get_code_mtime(), kind, path,
+		st.st_mtime, st.st_size )
+
+
+def cached(kind, filename, parser, build):
+	"""
+	Returns object loaded from cache or, if there is nothing valid cached,
+	result of build(), which is then stored in cache.
+	
+	'kind' and class of 'parser' are part of key, so same file can be
+	cached in different forms. Exceptions raised by build() are not caught.
+	"""
+	path = os.path.realpath(filename)
+	st = os.stat(path)
+	header = _header(kind, path, st)
+	cache_file = _cache_file(kind, path, parser)
+	try:
+		with open(cache_file, "rb") as f:
+			if cPickle.load(f) == header:
+				return cPickle.load(f)
+	except Exception:
+		# Not cached, outdated or broken
+		pass
+	
+	obj = build()
+	try:
+		if not os.path.exists(get_cache_path()):
+			os.makedirs(get_cache_path())
+		# Written to temporary file first, so other process never reads
+		# half-written cache
+		f = tempfile.NamedTemporaryFile(dir=get_cache_path(), delete=False)
+		try:
+			cPickle.dump(header, f, cPickle.HIGHEST_PROTOCOL)
+			cPickle.dump(obj, f, cPickle.HIGHEST_PROTOCOL)
+			f.close()
+			os.rename(f.name, cache_file)
+		except:
+			f.close()
+			os.unlink(f.name)
+			raise
+	except Exception, e:
+		log.debug("Failed to cache '%s': %s", filename, e)
+	return obj
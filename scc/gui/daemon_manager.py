@@ -11,6 +11,7 @@ probably too crazy even for me.
 from __future__ import unicode_literals
 
 from scc.paths import get_daemon_socket
+from scc.protocol import decode_messages
 from scc.tools import find_binary
 from gi.repository import GObject, Gio, GLib
 
@@ -68,7 +69,7 @@ class DaemonManager(GObject.GObject):
 		self.alive = None
 		self.connection = None
 		self.connecting = False
-		self.buffer = ""
+		self.buffer = b""
 		self._profile = None
 		self._connect()
 		self._requests = []
@@ -110,7 +111,7 @@ class DaemonManager(GObject.GObject):
 		except Exception, e:
 			self._on_daemon_died()
 			return
-		self.buffer = ""
+		self.buffer = b""
 		self.connection.get_input_stream().read_bytes_async(102400,
 			1, None, self._on_read_data)
 	
@@ -125,15 +126,17 @@ class DaemonManager(GObject.GObject):
 			# Broken sonnection, daemon was probbaly terminated
 			self._on_daemon_died()
 			return
-		data = response.get_data().decode("utf-8")
+		data = response.get_data()
 		if len(data) == 0:
 			# Connection terminated
 			self._on_daemon_died()
 			return
-		self.buffer += data
-		while "\n" in self.buffer:
-			line, self.buffer = self.buffer.split("\n", 1)
-			if line.startswith("Version:"):
+		messages, self.buffer = decode_messages(self.buffer + data)
+		for line in messages:
+			if type(line) == tuple:
+				# Binary event
+				self.emit('event', *line)
+			elif line.startswith("Version:"):
 				version = line.split(":", 1)[-1].strip()
 				log.debug("Connected to daemon, version %s", version)
 				self.emit('version', version)
@@ -268,6 +271,17 @@ class DaemonManager(GObject.GObject):
 		self.request("Observe: %s" % (what,), success_cb, error_cb)
 	
 	
+	def set_binary_events(self, success_cb, error_cb):
+		"""
+		Asks daemon to send events as binary records instead of text,
+		what is faster to decode. 'event' signal is emitted same way in
+		both cases.
+		
+		Calls success_cb() on success or error_cb(error) on failure.
+		"""
+		self.request("Protocol: binary", success_cb, error_cb)
+	
+	
 	def unlock_all(self):
 		if self.alive:
 			self.request("Unlock.", lambda *a: False, lambda *a: False)
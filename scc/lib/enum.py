@@ -268,10 +268,20 @@ class EnumMeta(type):
             enum_member.__init__(*args)
             # If another member with the same value was already defined, the
             # new member becomes an alias to the existing one.
-            for name, canonical_member in enum_class._member_map_.items():
-                if canonical_member.value == enum_member._value_:
-                    enum_member = canonical_member
-                    break
+            try:
+                # Fast path for hashable values, avoids scanning every
+                # already defined member
+                canonical_member = enum_class._value2member_map_[value]
+            except KeyError:
+                canonical_member = None
+            except TypeError:
+                canonical_member = None
+                for name, member in enum_class._member_map_.items():
+                    if member.value == enum_member._value_:
+                        canonical_member = member
+                        break
+            if canonical_member is not None:
+                enum_member = canonical_member
             else:
                 # Aliases don't appear in member names (only in __members__).
                 enum_class._member_names_.append(member_name)
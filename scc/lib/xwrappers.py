@@ -7,6 +7,7 @@ Python wrapper for some X-related stuff.
 from ctypes import CDLL, POINTER, c_void_p, Structure, byref, cast
 from ctypes import c_long, c_ulong, c_int, c_uint, c_short, c_char_p
 from ctypes import c_ushort, c_ubyte, c_char_p, c_bool
+from ctypes import Union, CFUNCTYPE
 
 
 def _load_lib(*names):
@@ -94,6 +95,27 @@ class XWindowAttributes(Structure):
 		('screen', c_void_p)
 	]
 
+class XPropertyEvent(Structure):
+	_fields_ = [
+		('type', c_int),
+		('serial', c_ulong),
+		('send_event', c_int),
+		('display', c_void_p),
+		('window', XID),
+		('atom', Atom),
+		('time', c_ulong),
+		('state', c_int),
+	]
+
+class XEvent(Union):
+	_fields_ = [
+		('type', c_int),
+		('xproperty', XPropertyEvent),
+		('pad', c_long * 24),
+	]
+
+XErrorHandler = CFUNCTYPE(c_int, c_void_p, c_void_p)
+
 
 # Consants
 SHAPE_BOUNDING	= 0
@@ -107,6 +129,10 @@ SUCCESS			= 0
 
 ISVIEWABLE		= 2
 
+PROPERTYNOTIFY		= 28
+NOEVENTMASK			= 0L
+PROPERTYCHANGEMASK	= 1L << 22
+
 
 # Functions
 open_display = libX11.XOpenDisplay
@@ -240,6 +266,29 @@ shape_combine_mask.__doc__ = "Sets 1-bit transparency mask for window"
 shape_combine_mask.argtypes = [ c_void_p, XID, c_int, c_int, c_int, Pixmap, c_int ]
 
 
+select_input = libX11.XSelectInput
+select_input.__doc__ = "Sets which events should be reported for window"
+select_input.argtypes = [ c_void_p, XID, c_long ]
+
+pending = libX11.XPending
+pending.__doc__ = "Flushes output buffer and returns number of events waiting to be read"
+pending.argtypes = [ c_void_p ]
+pending.restype = c_int
+
+next_event = libX11.XNextEvent
+next_event.__doc__ = "Reads next event, blocks if there is none"
+next_event.argtypes = [ c_void_p, POINTER(XEvent) ]
+
+connection_number = libX11.XConnectionNumber
+connection_number.__doc__ = "Returns file descriptor of connection to XServer"
+connection_number.argtypes = [ c_void_p ]
+connection_number.restype = c_int
+
+set_error_handler = libX11.XSetErrorHandler
+set_error_handler.__doc__ = "Sets function called on X errors. Default one exits process"
+set_error_handler.argtypes = [ XErrorHandler ]
+set_error_handler.restype = c_void_p
+
 
 # Wrapped functions
 _xkb_get_state = libX11.XkbGetState
@@ -379,6 +428,17 @@ def get_window_title(dpy, window):
 	return None
 
 
+# Reference has to be kept, otherwise handler is garbage-collected
+_ignore_errors_handler = XErrorHandler(lambda dpy, error: 0)
+
+def ignore_errors():
+	"""
+	Sets error handler that ignores all errors, so process is not killed
+	when, for example, window it's working with is destroyed.
+	"""
+	set_error_handler(_ignore_errors_handler)
+
+
 def get_window_class(dpy, window):
 	"""
 	Returns window class or None, None if class cannot be obtained.
@@ -8,6 +8,7 @@ from scc.constants import SCStatus, SCButtons, SCI_NULL, LEFT, RIGHT, STICK
 from scc.constants import FE_STICK, FE_TRIGGER, FE_PAD, GYRO
 from scc.constants import CI_NAMES, ControllerInput, HapticPos
 from scc.actions import ButtonAction
+from scc.scheduler import Scheduler
 from scc.profile import Profile
 
 
@@ -48,17 +49,24 @@ class Mapper(object):
 		self.feedbacks = [ None, None ]			# left, right
 		self.pressed = {}						# for ButtonAction, holds number of times virtual button was pressed without releasing it first
 		self.syn_list = set()
-		self.scheduled_tasks = []
+		self.scheduler = Scheduler()
 		self.buttons, self.old_buttons = 0, 0
 		self.state, self.old_state = SCI_NULL, SCI_NULL
 		self.force_event = set()
+		# scc.stats.LatencyStats instance, set only while measuring is enabled
+		self.stats = None
 	
 	
 	def sync(self):
 		""" Syncs generated events """
 		if len(self.syn_list):
-			for dev in self.syn_list:
-				dev.synEvent()
+			# Copied, as stats can be disabled from another thread
+			stats = self.stats
+			if stats:
+				stats.sync(self.syn_list)
+			else:
+				for dev in self.syn_list:
+					dev.synEvent()
 			self.syn_list = set()
 	
 	
@@ -102,17 +110,53 @@ class Mapper(object):
 		Schedules callback to be ran no sooner than after delay.
 		Delay is float number in seconds.
 		Callback is called with mapper as only argument.
+		
+		Returns task handle that can be passed to cancel_scheduled().
+		
+		Can be called from any thread; If called from other thread than one
+		that handles controller input, controller is woken up, so task
+		doesn't have to wait for next input to be executed.
 		"""
-		when = time.time() + delay
-		self.scheduled_tasks.append( (when, cb) )
-		self.scheduled_tasks.sort(key=lambda a: a[0])
+		task = self.scheduler.schedule(time.time() + delay, cb)
+		if self.controller:
+			self.controller.wakeup()
+		return task
+	
+	
+	def cancel_scheduled(self, task):
+		""" Cancels task using handle returned by schedule() """
+		self.scheduler.cancel(task)
 	
 	
 	def remove_scheduled(self, cb):
-		""" Removes scheduled task by callback. """
-		self.scheduled_tasks = [
-			(w, c) for (w, c) in self.scheduled_tasks if cb != c
-		]
+		"""
+		Removes scheduled task by callback.
+		Prefer cancel_scheduled(), this has to search for the task.
+		"""
+		self.scheduler.remove(cb)
+	
+	
+	def next_scheduled(self):
+		"""
+		Returns time when next scheduled task should be executed or None
+		if there is no task scheduled.
+		"""
+		return self.scheduler.next()
+	
+	
+	def run_scheduled(self, now=None):
+		"""
+		Executes all scheduled tasks that are due and generates resulting
+		events.
+		
+		Called from callback, but also by controller when there is no input
+		to process. SlaveMapper, which doesn't communicate with controller
+		device, needs this to be called periodically to keep timers going.
+		"""
+		if now is None:
+			now = time.time()
+		self.scheduler.run(now, self)
+		self.generate_events()
 	
 	
 	def mouse_move(self, dx, dy):
@@ -212,6 +256,9 @@ class Mapper(object):
 	
 	
 	def callback(self, controller, now, sci):
+		stats = self.stats
+		if stats:
+			stats.mark(stats.CALLBACK)
 		# Store state
 		self.old_state = self.state
 		self.old_buttons = self.buttons
@@ -230,61 +277,75 @@ class Mapper(object):
 		btn_rem = xor & self.old_buttons
 		btn_add = xor & self.buttons
 		
+		profile = self.profile
 		try:
 			if btn_add or btn_rem:
-				# At least one button was pressed
-				for x in self.profile.buttons:
-					if x & btn_add:
-						self.profile.buttons[x].button_press(self)
-					elif x & btn_rem:
-						self.profile.buttons[x].button_release(self)
-			
+				# At least one button was pressed or released.
+				# Only set bits are checked, lowest one first
+				actions = profile.button_actions
+				b = btn_add
+				while b:
+					bit = b & -b
+					b ^= bit
+					if bit in actions:
+						actions[bit].button_press(self)
+				b = btn_rem
+				while b:
+					bit = b & -b
+					b ^= bit
+					if bit in actions:
+						actions[bit].button_release(self)
 			
 			# Check stick
-			if not self.buttons & SCButtons.LPADTOUCH:
+			if profile.has_stick and not self.buttons & SCButtons.LPADTOUCH:
 				if FE_STICK in fe or self.old_state.lpad_x != sci.lpad_x or self.old_state.lpad_y != sci.lpad_y:
-					self.profile.stick.whole(self, sci.lpad_x, sci.lpad_y, STICK)
+					profile.stick.whole(self, sci.lpad_x, sci.lpad_y, STICK)
 			
 			# Check gyro
-			if controller.getGyroEnabled():
-				self.profile.gyro.gyro(self, sci.gpitch, sci.gyaw, sci.groll, sci.q1, sci.q2, sci.q3, sci.q4)
+			if profile.has_gyro and controller.getGyroEnabled():
+				profile.gyro.gyro(self, sci.gpitch, sci.gyaw, sci.groll, sci.q1, sci.q2, sci.q3, sci.q4)
 			
 			# Check triggers
-			if FE_TRIGGER in fe or sci.ltrig != self.old_state.ltrig:
-				if LEFT in self.profile.triggers:
-					self.profile.triggers[LEFT].trigger(self, sci.ltrig, self.old_state.ltrig)
-			if FE_TRIGGER in fe or sci.rtrig != self.old_state.rtrig:
-				if RIGHT in self.profile.triggers:
-					self.profile.triggers[RIGHT].trigger(self, sci.rtrig, self.old_state.rtrig)
+			if profile.has_triggers:
+				if FE_TRIGGER in fe or sci.ltrig != self.old_state.ltrig:
+					if LEFT in profile.triggers:
+						profile.triggers[LEFT].trigger(self, sci.ltrig, self.old_state.ltrig)
+				if FE_TRIGGER in fe or sci.rtrig != self.old_state.rtrig:
+					if RIGHT in profile.triggers:
+						profile.triggers[RIGHT].trigger(self, sci.rtrig, self.old_state.rtrig)
 			
 			# Check pads
-			if FE_PAD in fe or self.buttons & SCButtons.RPADTOUCH or SCButtons.RPADTOUCH & btn_rem:
-				# RPAD
-				self.profile.pads[RIGHT].whole(self, sci.rpad_x, sci.rpad_y, RIGHT)
-			
-			if (FE_PAD in fe and self.buttons & SCButtons.LPADTOUCH) or self.buttons & SCButtons.LPADTOUCH or SCButtons.LPADTOUCH & btn_rem:
-				# LPAD
-				self.profile.pads[LEFT].whole(self, sci.lpad_x, sci.lpad_y, LEFT)
+			if profile.has_pads:
+				if FE_PAD in fe or self.buttons & SCButtons.RPADTOUCH or SCButtons.RPADTOUCH & btn_rem:
+					# RPAD
+					profile.pads[RIGHT].whole(self, sci.rpad_x, sci.rpad_y, RIGHT)
+				
+				if (FE_PAD in fe and self.buttons & SCButtons.LPADTOUCH) or self.buttons & SCButtons.LPADTOUCH or SCButtons.LPADTOUCH & btn_rem:
+					# LPAD
+					profile.pads[LEFT].whole(self, sci.lpad_x, sci.lpad_y, LEFT)
 		except Exception, e:
 			# Log error but don't crash here, it breaks too many things at once
 			log.error("Error while processing controller event")
 			log.error(traceback.format_exc())
 		
-		if len(self.scheduled_tasks) > 0 and self.scheduled_tasks[0][0] <= now:
-			cb = self.scheduled_tasks[0][1]
-			self.scheduled_tasks = self.scheduled_tasks[1:]
-			cb(self)
-		self.generate_events()
+		if stats:
+			stats.mark(stats.CALLBACK_END)
+		self.run_scheduled(now)
 	
 	
 	def generate_events(self):
+		stats = self.stats
+		if stats:
+			stats.mark(stats.EVENTS)
 		# Generate events - keys
 		if len(self.keypress_list):
 			self.keyboard.pressEvent(self.keypress_list)
 			self.keypress_list = []
+			self.syn_list.add(self.keyboard)
 		if len(self.keyrelease_list):
 			self.keyboard.releaseEvent(self.keyrelease_list)
 			self.keyrelease_list = []
+			self.syn_list.add(self.keyboard)
 		# Generate events - mouse
 		mx, my, wx, wy = self.mouse_movements
 		if mx != 0 or my != 0:
@@ -301,3 +362,5 @@ class Mapper(object):
 					self.controller.addFeedback(*self.feedbacks[x].data)
 					self.feedbacks[x] = None
 		self.sync()
+		if stats:
+			stats.end_frame()
@@ -7,6 +7,7 @@ Container for list of menu items + required parsers
 from __future__ import unicode_literals
 from scc.tools import _, set_logging_level
 from scc.actions import Action
+from scc import disk_cache
 
 import json, os
 
@@ -142,7 +143,17 @@ class MenuData(object):
 		Menus are stored as list under <root>/menus/<menuname>.
 		Throws ValueError if specified file cannot be parsed or
 		specified menu cannot be found.
+		
+		Parsed menu is cached on disk, so loading same menu next time
+		doesn't require parsing it again.
 		"""
+		return disk_cache.cached("menu:" + menuname, filename, action_parser,
+			lambda : MenuData._from_profile(filename, menuname, action_parser))
+	
+	
+	@staticmethod
+	def _from_profile(filename, menuname, action_parser):
+		""" Does actual loading for from_profile """
 		data = json.loads(open(filename, "r").read())
 		if "menus" not in data:
 			raise ValueError("Menu not found")
@@ -688,6 +688,7 @@ class DoubleclickModifier(Modifier):
 		self.waiting = False
 		self.pressed = False
 		self.active = None
+		self.timeout_task = None
 	
 	
 	def encode(self):
@@ -771,21 +772,21 @@ class DoubleclickModifier(Modifier):
 		self.pressed = True
 		if self.waiting:
 			# Double-click happened
-			mapper.remove_scheduled(self.on_timeout)
+			mapper.cancel_scheduled(self.timeout_task)
 			self.waiting = False
 			self.active = self.action
 			self.active.button_press(mapper)
 		else:
 			# First click, start the timer
 			self.waiting = True
-			mapper.schedule(self.timeout, self.on_timeout)
+			self.timeout_task = mapper.schedule(self.timeout, self.on_timeout)
 	
 	
 	def button_release(self, mapper):
 		self.pressed = False
 		if self.waiting and self.active is None and not self.action:
 			# In HoldModifier, button released before timeout
-			mapper.remove_scheduled(self.on_timeout)
+			mapper.cancel_scheduled(self.timeout_task)
 			self.waiting = False
 			if self.normalaction:
 				self.normalaction.button_press(mapper)
@@ -79,7 +79,7 @@ class OSDWindow(Gtk.Window):
 	
 	def __init__(self, wmclass):
 		Gtk.Window.__init__(self)
-		OSDWindow._apply_css(Config())
+		OSDWindow._apply_css(Config.shared())
 		
 		self.argparser = argparse.ArgumentParser(description=__doc__,
 			formatter_class=argparse.RawDescriptionHelpFormatter,
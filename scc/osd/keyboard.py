@@ -61,7 +61,7 @@ class Keyboard(OSDWindow, TimerManager):
 		self.keymap.connect('state-changed', self.on_state_changed)
 		Action.register_all(sys.modules['scc.osd.osk_actions'], prefix="OSK")
 		self.profile = Profile(TalkingActionParser())
-		self.config = config or Config()
+		self.config = config or Config.shared()
 		
 		self.kbimage = os.path.join(get_config_path(), 'keyboard.svg')
 		if not os.path.exists(self.kbimage):
@@ -214,6 +214,10 @@ class Keyboard(OSDWindow, TimerManager):
 			log.info("Sucessfully locked input")
 			pass
 		
+		# Every stick and pad movement is sent, so binary protocol
+		# is used if daemon supports it
+		self.daemon.set_binary_events(DaemonManager.nocallback,
+				DaemonManager.nocallback)
 		# Lock everything
 		locks = [ LEFT, RIGHT, STICK ] + [ b.name for b in SCButtons ]
 		self.daemon.lock(success, self.on_failed_to_lock, *locks)
@@ -300,6 +304,7 @@ class Keyboard(OSDWindow, TimerManager):
 					self._hovers[cursor] = a
 					if self._pressed[cursor] is not None:
 						self.mapper.keyboard.releaseEvent([ self._pressed[cursor] ])
+						self.mapper.keyboard.synEvent()
 						self.key_from_cursor(cursor, True)
 					if not self.timer_active('redraw'):
 						self.timer('redraw', 0.01, self.redraw_background)
@@ -350,11 +355,13 @@ class Keyboard(OSDWindow, TimerManager):
 						if self._pressed[cursor] is not None:
 							self.mapper.keyboard.releaseEvent([ self._pressed[cursor] ])
 						self.mapper.keyboard.pressEvent([ key ])
+						self.mapper.keyboard.synEvent()
 						self._pressed[cursor] = key
 						self._pressed_areas[cursor] = a
 					break
 		elif self._pressed[cursor] is not None:
 			self.mapper.keyboard.releaseEvent([ self._pressed[cursor] ])
+			self.mapper.keyboard.synEvent()
 			self._pressed[cursor] = None
 			del self._pressed_areas[cursor]
 		if not self.timer_active('redraw'):
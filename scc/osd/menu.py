@@ -151,7 +151,7 @@ class Menu(OSDWindow):
 		if not OSDWindow.parse_argumets(self, argv):
 			return False
 		if not self.config:
-			self.config = Config()
+			self.config = Config.shared()
 		if self.args.from_profile:
 			try:
 				self._menuid = self.args.items[0]
@@ -295,7 +295,7 @@ class Menu(OSDWindow):
 			pass
 		
 		if not self.config:
-			self.config = Config()
+			self.config = Config.shared()
 		locks = [ self._control_with, self._confirm_with, self._cancel_with ]
 		self.daemon.lock(success, self.on_failed_to_lock, *locks)
 	
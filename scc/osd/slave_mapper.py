@@ -11,6 +11,7 @@ from __future__ import unicode_literals
 
 from collections import deque
 from scc.constants import SCButtons, LEFT, RIGHT, STICK, TRIGGER_MAX
+from scc.protocol import BUTTONS
 from scc.mapper import Mapper
 
 
@@ -31,22 +32,9 @@ class SlaveMapper(Mapper):
 		raise TypeError("SlaveMapper doesn't connect to controller device")
 	
 	
-	def run_scheduled(self):
-		"""
-		Should be called periodically to keep timers going.
-		Since SlaveMapper doesn't communicate with controller device, it is not
-		possible to drive this automatically
-		"""
-		now = time.time()
-		if len(self.scheduled_tasks) > 0 and self.scheduled_tasks[0][0] <= now:
-			cb = self.scheduled_tasks[0][1]
-			self.scheduled_tasks = self.scheduled_tasks[1:]
-			cb(self)
-	
-	
 	def handle_event(self, daemon, what, data):
 		"""
-		Handles event sent by scc-daemon.
+		Handles event sent by scc-daemon, as decoded by DaemonManager.
 		Without calling this, SlaveMapper basically does nothing.
 		"""
 		if what == STICK:
@@ -55,8 +43,8 @@ class SlaveMapper(Mapper):
 			self.profile.triggers[LEFT].trigger(self, *data)
 		elif what == SCButtons.RT.name:
 			self.profile.triggers[RIGHT].trigger(self, *data)
-		elif hasattr(SCButtons, what):
-			x = getattr(SCButtons, what)
+		elif what in BUTTONS:
+			x = BUTTONS[what]
 			self.old_buttons = self.buttons
 			if data[0]:
 				# Pressed
@@ -7,7 +7,8 @@ one or more Action instances.
 """
 from __future__ import unicode_literals
 from tokenize import generate_tokens, TokenError
-from collections import namedtuple
+from tokenize import Number, ContStr, Name
+from collections import namedtuple, OrderedDict
 
 from scc.constants import SCButtons, HapticPos, PARSER_CONSTANTS
 from scc.constants import STICK_PAD_MIN, STICK_PAD_MAX
@@ -21,12 +22,66 @@ from scc.uinput import Keys, Axes, Rels
 from scc.macros import Macro
 
 import token as TokenType
-import sys
+import sys, re, cPickle, threading
 
 
 class ParseError(Exception): pass
 
 
+class ParseCache(object):
+	"""
+	Bounded LRU cache of already parsed actions, shared by all parsers.
+	
+	Actions keep their state, so parsed action is stored pickled and every
+	get() unpickles new copy of it. That is still several times faster than
+	copy.deepcopy or parsing again, see benchmarks/parser.py. For actions that can't be pickled,
+	None is stored so they are simply parsed again next time.
+	"""
+	
+	def __init__(self, size):
+		self.size = size
+		self.hits = 0
+		self.misses = 0
+		self._cache = OrderedDict()		# key -> pickled action or None
+		self._lock = threading.Lock()
+	
+	
+	def get(self, key):
+		""" Returns new copy of cached action or None if there is none """
+		with self._lock:
+			if key not in self._cache:
+				self.misses += 1
+				return None
+			# Re-inserted to mark it as most recently used
+			data = self._cache[key] = self._cache.pop(key)
+			if data is None:
+				return None
+			self.hits += 1
+		return cPickle.loads(data)
+	
+	
+	def put(self, key, action):
+		try:
+			data = cPickle.dumps(action, cPickle.HIGHEST_PROTOCOL)
+		except Exception:
+			# Some action keeps something that cannot be pickled
+			data = None
+		with self._lock:
+			self._cache[key] = data
+			while len(self._cache) > self.size:
+				self._cache.popitem(last=False)
+	
+	
+	def clear(self):
+		""" Removes everything from cache """
+		with self._lock:
+			self._cache.clear()
+	
+	
+	def __len__(self):
+		return len(self._cache)
+
+
 def build_action_constants():
 	""" Generates dicts for ActionParser.CONSTS """
 	rv = {
@@ -62,13 +117,35 @@ class ActionParser(object):
 	"""
 	Token = namedtuple('Token', 'type value')
 	
-	CONSTS = build_action_constants()
+	# Built by get_constants on first use, so importing parser doesn't
+	# require walking every key, axis and button
+	CONSTS = None
+	
+	# Matches one token of single-line action string. Patterns and their
+	# order are taken from tokenize module, so everything this matches is
+	# split to exactly same tokens as generate_tokens would produce.
+	RE_TOKEN = re.compile(r"[ \f\t]*(?:(?P<number>%s)|(?P<op>[(),;.\-])"
+		r"|(?P<string>%s)|(?P<name>%s)|(?P<end>$))" % (Number, ContStr, Name))
+	TOKEN_TYPES = { "number" : TokenType.NUMBER, "op" : TokenType.OP,
+		"string" : TokenType.STRING, "name" : TokenType.NAME }
+	
+	# Same action strings are repeated many times in every profile and
+	# menu, so from_json_data caches what it returns.
+	CACHE = ParseCache(512)
 	
 	
 	def __init__(self, string=""):
 		self.restart(string)
 	
 	
+	@staticmethod
+	def get_constants():
+		""" Returns dict of constants usable as action parameters """
+		if ActionParser.CONSTS is None:
+			ActionParser.CONSTS = build_action_constants()
+		return ActionParser.CONSTS
+	
+	
 	def from_json_data(self, data, key=None):
 		"""
 		Converts dict stored in profile file into action.
@@ -84,6 +161,13 @@ class ActionParser(object):
 			else:
 				return NoAction()
 		
+		cache_key = ActionParser._cache_key(data)
+		if cache_key is not None:
+			cache_key = self.__class__, cache_key
+			a = ActionParser.CACHE.get(cache_key)
+			if a is not None:
+				return a
+		
 		if "action" in data:
 			a = self.restart(data["action"]).parse() or NoAction()
 		else:
@@ -96,26 +180,92 @@ class ActionParser(object):
 		if decoders:
 			for cls in sorted(decoders, key=lambda a : a.PROFILE_KEY_PRIORITY ):
 				a = cls.decode(data, a, self, 0)	# Profile version is not yet used anywhere
+		if cache_key is not None:
+			ActionParser.CACHE.put(cache_key, a)
 		return a
 	
 	
+	@staticmethod
+	def _cache_key(data):
+		"""
+		Returns key used to cache action decoded from 'data' or None if
+		data contains nested actions. Those are not cached as whole,
+		only actions nested in them are.
+		
+		Type of every value is part of key, as 1, 1.0 and True are equal,
+		but don't have to produce same action.
+		"""
+		key = []
+		for k in data:
+			v = data[k]
+			if isinstance(v, list):
+				if any([ isinstance(x, (list, dict)) for x in v ]):
+					return None
+				v = tuple([ (type(x), x) for x in v ])
+			elif isinstance(v, dict):
+				return None
+			key.append(( k, type(v), v ))
+		key.sort()
+		return tuple(key)
+	
+	
 	def restart(self, string):
 		"""
 		Restarts parsing with new string
 		Returns self for chaining.
 		"""
+		self.tokens = ActionParser._fast_tokenize(string)
+		if self.tokens is None:
+			self.tokens = ActionParser._tokenize(string)
+		self.index = 0
+		return self
+	
+	
+	@staticmethod
+	def _fast_tokenize(string):
+		"""
+		Splits action string into tokens without using tokenize module.
 		
+		Handles only single-line strings consisting of names, numbers,
+		strings and few operators, what covers almost every action.
+		Returns None for anything else, so _tokenize can handle it.
+		"""
+		if string[0:1] in (" ", "\t", "\f") or "\n" in string or "\r" in string:
+			# Leading whitespace means INDENT, newlines mean NEWLINE or NL
+			return None
+		if "'''" in string or '"""' in string:
+			return None
+		tokens, pos, depth = [], 0, 0
+		match, Token = ActionParser.RE_TOKEN.match, ActionParser.Token
+		while True:
+			m = match(string, pos)
+			if m is None:
+				return None
+			pos, kind = m.end(), m.lastgroup
+			if kind == "end":
+				# Unclosed parenthesis makes tokenize fail, so None is
+				# returned to let it do so
+				return None if depth > 0 else tokens
+			value = m.group(kind)
+			if value == "(":
+				depth += 1
+			elif value == ")":
+				depth -= 1
+			tokens.append(Token(ActionParser.TOKEN_TYPES[kind], value))
+	
+	
+	@staticmethod
+	def _tokenize(string):
+		""" Splits action string into tokens using tokenize module """
 		try:
-			self.tokens = [
+			return [
 				ActionParser.Token(type, string)
 				for (type, string, trash, trash, trash)
 				in generate_tokens( iter([string]).next )
 				if type != TokenType.ENDMARKER
 			]
 		except TokenError:
-			self.tokens = None
-		self.index = 0
-		return self
+			return None
 	
 	
 	def _next_token(self):
@@ -154,9 +304,10 @@ class ActionParser(object):
 				parameter = self._parse_action()
 			else:
 				# Constant
-				if not t.value in ActionParser.CONSTS:
+				consts = ActionParser.get_constants()
+				if not t.value in consts:
 					raise ParseError("Expected parameter, got '%s' which is not defined" % (t.value,))
-				parameter = ActionParser.CONSTS[t.value]
+				parameter = consts[t.value]
 			
 			# Check for dots
 			while self._tokens_left() and self._peek_token().type == TokenType.OP and self._peek_token().value == '.':
@@ -24,6 +24,17 @@ def get_config_path():
 	return os.path.join(confdir, "scc")
 
 
+def get_cache_path():
+	"""
+	Returns directory where parsed profiles and menus are cached.
+	~/.cache/scc under normal conditions.
+	"""
+	cachedir = os.path.expanduser("~/.cache")
+	if "XDG_CACHE_HOME" in os.environ:
+		cachedir = os.environ['XDG_CACHE_HOME']
+	return os.path.join(cachedir, "scc")
+
+
 def get_profiles_path():
 	"""
 	Returns directory where profiles are stored.
@@ -12,6 +12,7 @@ from scc.lib.jsonencoder import JSONEncoder
 from scc.parser import TalkingActionParser
 from scc.menu_data import MenuData
 from scc.actions import NoAction
+from scc import disk_cache
 
 import json, logging
 log = logging.getLogger("profile")
@@ -40,6 +41,7 @@ class Profile(object):
 		self.triggers = { Profile.LEFT : NoAction(), Profile.RIGHT : NoAction() }
 		self.pads = { Profile.LEFT : NoAction(), Profile.RIGHT : NoAction() }
 		self.gyro = NoAction()
+		self.compile()
 	
 	
 	def save(self, filename):
@@ -67,7 +69,23 @@ class Profile(object):
 	
 	
 	def load(self, filename):
-		""" Loads profile from file. Returns self """
+		"""
+		Loads profile from file. Returns self.
+		Parsed profile is cached on disk, so loading same file next time
+		doesn't require parsing it again.
+		"""
+		state = disk_cache.cached("profile", filename, self.parser,
+			lambda : self._parse(filename))
+		self.__dict__.update(state)
+		self.compile()
+		return self
+	
+	
+	def _parse(self, filename):
+		"""
+		Does actual loading for load(). Returns dict of parsed attributes
+		that can be cached.
+		"""
 		data = json.loads(open(filename, "r").read())
 		# Version
 		try:
@@ -123,7 +141,8 @@ class Profile(object):
 		if version < Profile.VERSION:
 			self._convert(version)
 		
-		return self
+		return { k : getattr(self, k) for k in ("buttons", "menus", "stick",
+			"gyro", "triggers", "pads") }
 	
 	
 	def compress(self):
@@ -136,6 +155,28 @@ class Profile(object):
 				dct[x] = dct[x].compress()
 		self.stick = self.stick.compress()
 		self.gyro = self.gyro.compress()
+		self.compile()
+	
+	
+	def compile(self):
+		"""
+		Prepares lookup tables used by Mapper to quickly find out what
+		should be done with controller input:
+		 - button_actions maps bit of every button that has action set
+		   to that action
+		 - has_stick, has_triggers, has_pads and has_gyro are True if there
+		   is any action set to stick, triggers, pads and gyro, respectively
+		
+		Called automatically by load() and compress(), but has to be called
+		again after any action in profile is changed.
+		"""
+		self.button_actions = {
+			int(x) : self.buttons[x] for x in self.buttons if self.buttons[x]
+		}
+		self.has_stick = bool(self.stick)
+		self.has_triggers = any(self.triggers.values())
+		self.has_pads = any(self.pads.values())
+		self.has_gyro = bool(self.gyro)
 	
 	
 	def _convert(self, from_version):
@@ -0,0 +1,88 @@
+#!/usr/bin/env python2
+"""
+SC-Controller - Profile Cache
+
+Keeps recently used profiles in memory, so switching between few of them
+(usually done by autoswitcher) doesn't require parsing same files over
+and over.
+"""
+from __future__ import unicode_literals
+
+from scc.profile import Profile
+from collections import OrderedDict
+
+import os, cPickle, threading, logging
+log = logging.getLogger("PCache")
+
+
+class ProfileCache(object):
+	"""
+	LRU cache of loaded and compressed profiles, keyed by path and
+	invalidated when file modification time or size changes.
+	
+	Actions keep their state, so same profile instance cannot be used
+	twice. Profiles are stored pickled instead and every get() unpickles
+	new copy, what is still several times faster than parsing.
+	"""
+	
+	def __init__(self, parser, size=8):
+		self.parser = parser
+		self.size = size
+		self.hits = 0
+		self.misses = 0
+		self._cache = OrderedDict()		# path -> (mtime, size, pickled profile)
+		self._lock = threading.Lock()
+	
+	
+	def get(self, filename):
+		"""
+		Returns new, compressed Profile loaded from 'filename'.
+		Raises same exceptions as Profile.load.
+		"""
+		path = os.path.realpath(filename)
+		st = os.stat(path)
+		with self._lock:
+			if path in self._cache:
+				mtime, size, data = self._cache.pop(path)
+				if mtime == st.st_mtime and size == st.st_size:
+					# Re-inserted to mark it as most recently used
+					self._cache[path] = mtime, size, data
+					self.hits += 1
+					p = cPickle.loads(data)
+					p.parser = self.parser
+					return p
+			self.misses += 1
+	
+		p = Profile(self.parser).load(filename)
+		p.compress()
+		if self.size > 0:
+			data = self._dump(p)
+			if data is not None:
+				with self._lock:
+					self._cache[path] = st.st_mtime, st.st_size, data
+					while len(self._cache) > self.size:
+						self._cache.popitem(last=False)
+		return p
+	
+	
+	def _dump(self, p):
+		""" Returns pickled profile or None if it cannot be pickled """
+		parser, p.parser = p.parser, None
+		try:
+			return cPickle.dumps(p, cPickle.HIGHEST_PROTOCOL)
+		except Exception, e:
+			# Some action keeps something that cannot be pickled
+			log.debug("Profile cannot be cached: %s", e)
+			return None
+		finally:
+			p.parser = parser
+	
+	
+	def clear(self):
+		""" Removes everything from cache """
+		with self._lock:
+			self._cache.clear()
+	
+	
+	def __len__(self):
+		return len(self._cache)
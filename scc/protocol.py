@@ -0,0 +1,80 @@
+#!/usr/bin/env python2
+"""
+SC-Controller - Protocol
+
+Encoding and decoding of events sent by daemon to clients that locked or
+observe some inputs.
+
+By default, events are sent as text lines ('Event: LEFT 100 -200').
+Client that processes lot of them (on-screen keyboard) can switch to
+binary mode by sending 'Protocol: binary', after which every event is
+sent as fixed-size EVENT_RECORD. Everything else (responses, profile
+changes, errors) is still sent as text, so client has to handle both.
+
+Binary record always starts with zero byte, that never appears at start
+of text line.
+"""
+from __future__ import unicode_literals
+
+from scc.constants import SCButtons, LEFT, RIGHT, STICK
+
+import struct
+
+# zero byte, source index, number of values, byte of padding, two values.
+# Number of values is sent, as LT and RT send two values when trigger
+# is moved, but only one when it's fully pressed (clicked)
+EVENT_RECORD = struct.Struct(b'<BBBxii')
+EVENT_MARKER = b"\x00"
+
+# Order is part of protocol, new sources have to be added to end.
+# STICKPRESS is name used for SCButtons.STICK, as STICK means stick position
+SOURCES = ( STICK, LEFT, RIGHT, "STICKPRESS", "A", "B", "X", "Y", "LB", "RB",
+	"LT", "RT", "BACK", "C", "START", "LGRIP", "RGRIP", "LPAD", "RPAD",
+	"LPADTOUCH", "RPADTOUCH" )
+SOURCE_IDS = { name : i for (i, name) in enumerate(SOURCES) }
+# Sources reporting position (x, y) or trigger (position, old_position).
+# Everything else is button with only one value (pressed or not), as are
+# LT and RT when trigger is fully pressed.
+TWO_VALUES = set([ STICK, LEFT, RIGHT, SCButtons.LT.name, SCButtons.RT.name ])
+# Maps names of button sources to SCButtons
+BUTTONS = { name : getattr(SCButtons, name) for name in SOURCES
+	if hasattr(SCButtons, name) and name not in TWO_VALUES }
+BUTTONS["STICKPRESS"] = SCButtons.STICK
+
+
+def encode_event(what, values, binary=False):
+	"""
+	Returns event message as (utf-8 encoded) string.
+	'what' is name of source as used in text protocol.
+	"""
+	if binary:
+		return EVENT_RECORD.pack(0, SOURCE_IDS[what], len(values), values[0],
+			values[1] if len(values) > 1 else 0)
+	return ("Event: %s %s\n" % (what, " ".join([ str(x) for x in values ]))
+		).encode("utf-8")
+
+
+def decode_messages(buffer):
+	"""
+	Splits data received from daemon into messages.
+	
+	Returns (messages, rest), where 'messages' is list of decoded text
+	lines (without newline) and (what, values) tuples for binary events.
+	'rest' is incomplete message that should be prepended to next data.
+	"""
+	messages = []
+	pos, size = 0, len(buffer)
+	while pos < size:
+		if buffer[pos] == EVENT_MARKER:
+			if size - pos < EVENT_RECORD.size:
+				break
+			trash, source, count, a, b = EVENT_RECORD.unpack_from(buffer, pos)
+			pos += EVENT_RECORD.size
+			messages.append(( SOURCES[source], [ a, b ][0:count] ))
+		else:
+			end = buffer.find(b"\n", pos)
+			if end < 0:
+				break
+			messages.append(buffer[pos:end].decode("utf-8"))
+			pos = end + 1
+	return messages, buffer[pos:]
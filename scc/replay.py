@@ -0,0 +1,171 @@
+#!/usr/bin/env python2
+"""
+SC-Controller - Replay
+
+Records raw packets received from controller into capture file and
+plays them back, so whole daemon can be tested or benchmarked without
+any hardware connected.
+
+Capture file starts with 8 bytes of MAGIC, followed by records consisting
+of monotonic timestamp (little-endian double, in seconds) and 64 bytes
+of packet exactly as it was received from controller.
+"""
+from __future__ import unicode_literals
+
+from scc.controller import SCController, Poll
+from ctypes.util import find_library
+import os, ctypes, struct, select, thread, time, logging
+log = logging.getLogger("Replay")
+
+MAGIC = b"SCCCAP\x00\x01"
+RECORD = struct.Struct(b'<d64s')
+
+
+class _timespec(ctypes.Structure):
+	_fields_ = [ ("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long) ]
+
+CLOCK_MONOTONIC = 1
+_librt = ctypes.CDLL(find_library("rt") or find_library("c"), use_errno=True)
+_clock_gettime = _librt.clock_gettime
+_clock_gettime.argtypes = [ ctypes.c_int, ctypes.POINTER(_timespec) ]
+_ts = _timespec()
+
+def monotonic():
+	"""
+	Returns value of monotonic clock, in seconds. Unlike time.time(),
+	this is not affected by system clock changes.
+	"""
+	if _clock_gettime(CLOCK_MONOTONIC, ctypes.byref(_ts)) != 0:
+		errno = ctypes.get_errno()
+		raise OSError(errno, os.strerror(errno))
+	return _ts.tv_sec + _ts.tv_nsec * 1e-9
+
+
+class CaptureWriter(object):
+	"""
+	Writes packets into capture file. Usable with SCController.setCapture.
+	"""
+	
+	def __init__(self, filename):
+		self._file = open(filename, "wb")
+		self._file.write(MAGIC)
+		self._buffer = bytearray(RECORD.size)
+		self.count = 0
+	
+	
+	def write(self, data):
+		""" Stores packet with current time """
+		RECORD.pack_into(self._buffer, 0, monotonic(), bytes(data))
+		self._file.write(self._buffer)
+		self.count += 1
+	
+	
+	def close(self):
+		if not self._file.closed:
+			self._file.close()
+			log.debug("Captured %s packets", self.count)
+
+
+def read_capture(filename):
+	"""
+	Generates (timestamp, data) tuple for every packet stored in capture file.
+	Raises ValueError if file is not capture file.
+	"""
+	with open(filename, "rb") as f:
+		if f.read(len(MAGIC)) != MAGIC:
+			raise ValueError("'%s' is not capture file" % (filename,))
+		while True:
+			record = f.read(RECORD.size)
+			if len(record) < RECORD.size:
+				break
+			yield RECORD.unpack(record)
+
+
+class ReplayController(SCController):
+	"""
+	Stands in for SCController, but instead of talking to USB device,
+	plays back packets from capture file.
+	
+	Everything that would be sent to controller (feedback, configuration)
+	is thrown away.
+	"""
+	
+	def __init__(self, callback, filename, speed=1.0):
+		"""
+		callback:
+			same as for SCController
+		filename:
+			capture file created by CaptureWriter
+		speed:
+			replay speed multiplier. 0 plays packets as fast as possible.
+		"""
+		self._init_state(callback)
+		self._filename = filename
+		self._speed = speed
+		self._replayed = 0
+		# Fail early if file doesn't exist or is not capture file
+		with open(filename, "rb") as f:
+			if f.read(len(MAGIC)) != MAGIC:
+				raise ValueError("'%s' is not capture file" % (filename,))
+	
+	
+	def reset(self):
+		pass
+	
+	
+	def unclaim(self):
+		pass
+	
+	
+	def _sendControl(self, data, timeout=0):
+		pass
+	
+	
+	def getReplayedPackets(self):
+		""" Returns number of packets replayed so far """
+		return self._replayed
+	
+	
+	def _wait(self, poll, deadline):
+		"""
+		Keeps timer and scheduled tasks running until monotonic clock
+		reaches 'deadline'.
+		"""
+		wfd = self._waker.fileno()
+		while True:
+			remaining = deadline - monotonic()
+			if remaining <= 0:
+				return
+			timeout = min(remaining, self._get_timeout(time.time()))
+			woken = False
+			for fd, events in poll.poll(timeout):
+				if fd == wfd:
+					self._waker.clear()
+					woken = True
+			self._callbackTimer(time.time(), woken)
+			self._cmsg = []
+	
+	
+	def run(self):
+		""" Plays capture file. Returns when all packets are replayed """
+		poll = Poll()
+		poll.register(self._waker.fileno(), select.POLLIN)
+		self._loop_thread = thread.get_ident()
+		start = None
+		try:
+			for timestamp, data in read_capture(self._filename):
+				if start is None:
+					start = monotonic(), timestamp
+				elif self._speed > 0:
+					self._wait(poll, start[0] + (timestamp - start[1]) / self._speed)
+				stats = self._stats
+				if stats:
+					stats.mark(stats.PACKET)
+				self._processPacket(data)
+				if stats:
+					stats.clear_frame()
+				self._cmsg = []
+				self._replayed += 1
+		finally:
+			self._loop_thread = None
+			log.debug("Replayed %s packets", self._replayed)
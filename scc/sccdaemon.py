@@ -12,8 +12,13 @@ from scc.constants import SCButtons, LEFT, RIGHT, STICK, DAEMON_VERSION
 from scc.paths import get_menus_path, get_default_menus_path
 from scc.tools import find_profile, nameof, shsplit, shjoin
 from scc.tools import set_logging_level, find_binary
-from scc.parser import TalkingActionParser
+from scc.parser import ActionParser, TalkingActionParser
 from scc.controller import SCController
+from scc.replay import ReplayController, CaptureWriter
+from scc.control_socket import ControlServer, ClientQueue
+from scc.protocol import encode_event
+from scc.stats import LatencyStats
+from scc.profile_cache import ProfileCache
 from scc.menu_data import MenuData
 from scc.uinput import Keys, Axes
 from scc.profile import Profile
@@ -21,15 +26,11 @@ from scc.actions import Action
 from scc.config import Config
 from scc.mapper import Mapper
 
-from SocketServer import UnixStreamServer, ThreadingMixIn, StreamRequestHandler
 import os, sys, signal, socket, select, time, json, logging
-import threading, traceback, subprocess
+import threading, traceback, subprocess, Queue
 log = logging.getLogger("SCCDaemon")
 tlog = logging.getLogger("Socket Thread")
 
-class ThreadingUnixStreamServer(ThreadingMixIn, UnixStreamServer): daemon_threads = True
-
-
 class SCCDaemon(Daemon):
 	
 	def __init__(self, piddile, socket_file):
@@ -39,15 +40,28 @@ class SCCDaemon(Daemon):
 		self.exiting = False
 		self.socket_file = socket_file
 		self.xdisplay = None
-		self.sserver = None			# UnixStreamServer instance
+		self.sserver = None			# ControlServer instance
 		self.mapper = None
 		self.error = None
 		self.alone = False			# Set by launching script from --alone flag
+		self.capture = None			# Set by launching script from --capture
+		self.replay = None			# Set by launching script from --replay
+		self.replay_speed = 1.0		# Set by launching script from --replay-speed
+		self.capture_writer = None
+		self.stats = None			# LatencyStats, set while 'Stats: on'
 		self.osd_daemon = None
 		self.autoswitch_daemon = None
 		self.subprocs = []
 		self.lock = threading.Lock()
 		self.profile_file = None
+		# Queue of profiles to load and thread loading them,
+		# see _load_profile_async. Thread is started by on_start
+		self.profile_loader = Queue.Queue()
+		self.profile_loader_thread = threading.Thread(target=self._profile_loader_thread)
+		self.profile_loader_thread.daemon = True
+		# Loaded profiles waiting to be swapped in by input thread
+		self.pending_swaps = []
+		self.profile_cache = None
 		self.clients = set()
 		self.cwd = os.getcwd()
 	
@@ -58,10 +72,103 @@ class SCCDaemon(Daemon):
 			self.mapper.profile.load(filename).compress()
 	
 	
-	def _set_profile(self, filename):
-		# Called from socket server thread
-		p = Profile(TalkingActionParser())
-		p.load(filename).compress()
+	def _load_profile_async(self, filename, client=None):
+		"""
+		Loads profile on worker thread and then swaps it into mapper
+		between two frames, so input processing is not blocked while
+		profile is being parsed.
+		
+		If 'client' is set, 'OK.' or 'Fail: ...' is sent to it when done.
+		Until then, client's queue is held, so responses to its later
+		messages are not sent before this one.
+		Profiles are loaded in order in which they were requested.
+		"""
+		if client:
+			client.wfile.hold()
+		self.profile_loader.put(( filename, client ))
+	
+	
+	def _profile_loader_thread(self):
+		while True:
+			filename, client = self.profile_loader.get()
+			start = time.time()
+			try:
+				p = self.profile_cache.get(filename)
+			except Exception, e:
+				log.error(e)
+				if client:
+					tb = unicode(traceback.format_exc()).encode("utf-8").encode('string_escape')
+					client.wfile.write(b"Fail: " + tb + b"\n")
+					client.wfile.release()
+				continue
+			load_time = time.time() - start
+			
+			with self.lock:
+				if self.mapper.get_controller():
+					# Swapped by input thread, between two frames. If
+					# controller is lost before that, _on_controller_lost
+					# does it instead
+					self.pending_swaps.append(( filename, p, client, load_time ))
+					self.mapper.schedule(0, self._run_swaps)
+				else:
+					# Without controller, there is no input thread to run swap
+					self._swap_profile(filename, p, client, load_time)
+	
+	
+	def _run_swaps(self, mapper):
+		""" Scheduled task executed by input thread, between frames """
+		with self.lock:
+			self._swap_pending()
+	
+	
+	def _swap_pending(self):
+		"""
+		Swaps in every loaded profile that is waiting for it.
+		Should be called while daemon.lock is acquired.
+		"""
+		swaps, self.pending_swaps = self.pending_swaps, []
+		for args in swaps:
+			self._swap_profile(*args)
+	
+	
+	def _on_controller_lost(self):
+		"""
+		Called when input thread stops processing controller input.
+		Should be called while daemon.lock is acquired.
+		"""
+		self.mapper.set_controller(None)
+		self.mapper.release_virtual_buttons()
+		# Nothing would execute scheduled swaps until controller is back
+		self._swap_pending()
+	
+	
+	def _swap_profile(self, filename, p, client, load_time):
+		""" Should be called while daemon.lock is acquired """
+		try:
+			# Virtual buttons pressed by old profile would be stuck otherwise
+			self.mapper.release_virtual_buttons()
+			self._set_profile(filename, p)
+		except Exception, e:
+			log.error(e)
+			if client:
+				tb = unicode(traceback.format_exc()).encode("utf-8").encode('string_escape')
+				client.wfile.write(b"Fail: " + tb + b"\n")
+				client.wfile.release()
+			return
+		log.info("Loaded profile '%s' in %.1fms", filename, load_time * 1000.0)
+		if client:
+			client.wfile.write(("OK. Loaded in %.1fms\n" % (load_time * 1000.0,)).encode("utf-8"))
+			client.wfile.release()
+	
+	
+	def _set_profile(self, filename, p=None):
+		"""
+		Sets profile used by mapper, loading it first if 'p' is None.
+		Should be called while daemon.lock is acquired.
+		"""
+		if p is None:
+			p = Profile(TalkingActionParser())
+			p.load(filename).compress()
 		self.profile_file = filename
 		
 		if self.mapper.profile.gyro and not p.gyro:
@@ -75,7 +182,8 @@ class SCCDaemon(Daemon):
 				log.debug("Turning gyrosensor ON")
 				self.mapper.get_controller().configure_controller(enable_gyros=True)
 		
-		# This last line kinda depends on GIL...
+		# Unless there is no controller, this is executed between two frames,
+		# so no frame is handled partially by old and partially by new profile
 		self.mapper.profile = p
 		# Re-apply all locks
 		for c in self.clients:
@@ -179,12 +287,7 @@ class SCCDaemon(Daemon):
 			return
 		path = find_profile(name)
 		if path:
-			with self.lock:
-				try:
-					self._set_profile(path)
-					log.info("Loaded profile '%s'", name)
-				except Exception, e:
-					log.error(e)
+			self._load_profile_async(path)
 			return
 		log.error("Cannot load profile: Profile '%s' not found", name)
 	
@@ -193,6 +296,9 @@ class SCCDaemon(Daemon):
 		os.chdir(self.cwd)
 		self.mapper = Mapper(Profile(TalkingActionParser()))
 		self.mapper.set_special_actions_handler(self)
+		self.profile_cache = ProfileCache(TalkingActionParser(),
+			Config.shared()["profile_cache_size"])
+		self.profile_loader_thread.start()
 		if self.profile_file is not None:
 			try:
 				self.mapper.profile.load(self.profile_file).compress()
@@ -216,6 +322,8 @@ class SCCDaemon(Daemon):
 		for p in self.subprocs:
 			p.kill()
 		self.subprocs = []
+		if self.capture_writer:
+			self.capture_writer.close()
 		sys.exit(0)
 	
 	
@@ -232,7 +340,7 @@ class SCCDaemon(Daemon):
 			self.mapper.set_xdisplay(self.xdisplay)
 			if not self.alone:
 				self.subprocs.append(Subprocess("scc-osd-daemon", True))
-				if len(Config()["autoswitch"]):
+				if len(Config.shared()["autoswitch"]):
 					# Start scc-autoswitch-daemon only if there are some switch rules defined
 					self.subprocs.append(Subprocess("scc-autoswitch-daemon", True))
 		else:
@@ -243,24 +351,41 @@ class SCCDaemon(Daemon):
 	def run(self):
 		log.debug("Starting SCCDaemon...")
 		signal.signal(signal.SIGTERM, self.sigterm)
-		self.lock.acquire()
-		self.start_listening()
-		self.connect_x()
+		with self.lock:
+			self.start_listening()
+			self.connect_x()
+			if self.capture:
+				self.capture_writer = CaptureWriter(self.capture)
+				log.info("Capturing controller input to '%s'", self.capture)
 		while True:
 			try:
+				# Controller is initialized without daemon.lock acquired,
+				# so clients are not blocked while it's being set up
 				sc = None
-				sc = SCController(callback=self.mapper.callback)
-				sc.configure_controller(enable_gyros=bool(self.mapper.profile.gyro))
-				self.mapper.set_controller(sc)
-				sc.setStatusCallback(self.on_controller_status)
-				if self.error is not None:
-					self.error = None
-					log.debug("Recovered after error")
-					self._send_to_all(b"Ready.\n")
-				self.lock.release()
+				if self.replay:
+					sc = ReplayController(self.mapper.callback,
+						self.replay, self.replay_speed)
+				else:
+					sc = SCController(callback=self.mapper.callback)
+					sc.setCapture(self.capture_writer)
+				with self.lock:
+					sc.configure_controller(enable_gyros=bool(self.mapper.profile.gyro))
+					self.mapper.set_controller(sc)
+					sc.setStatusCallback(self.on_controller_status)
+					sc.setScheduler(self.mapper)
+					sc.setStats(self.stats)
+					if self.error is not None:
+						self.error = None
+						log.debug("Recovered after error")
+						self._send_to_all(b"Ready.\n")
 				sc.run()
+				with self.lock:
+					self._on_controller_lost()
+				if self.replay:
+					# Nothing more to do
+					log.info("Replay finished")
+					return
 				# Reaches here only if USB dongle is disconnected or gets stuck
-				self.mapper.release_virtual_buttons()
 			except (ValueError, USBError), e:
 				# When SCController fails to initialize, daemon should
 				# still stay alive, so it is able to report this failure.
@@ -269,36 +394,28 @@ class SCCDaemon(Daemon):
 				# connected or busy, daemon will also repeadedly try to
 				# reinitialize SCController instance expecting error to be
 				# fixed by higher power (aka. user)
-				was_error = self.error is not None
-				self.error = unicode(e)
+				error = unicode(e)
 				if sc:
 					try:
 						sc.unclaim()
 					except Exception, e:
 						log.warning("Failed to unclaim device. Except bad things to happen.")
 						log.warning(e)
-				try:
-					self.lock.release()
-				except: pass
-				log.error(e)
-				if not was_error:
-					self._send_to_all(("Error: %s\n" % (self.error,)).encode("utf-8"))
-				self.mapper.release_virtual_buttons()
+				log.error(error)
+				with self.lock:
+					was_error = self.error is not None
+					self.error = error
+					if not was_error:
+						self._send_to_all(("Error: %s\n" % (self.error,)).encode("utf-8"))
+					self._on_controller_lost()
 				time.sleep(5)
-			self.lock.acquire()
-			self.mapper.release_virtual_buttons()
 	
 	
 	def start_listening(self):
 		if os.path.exists(self.socket_file):
 			os.unlink(self.socket_file)
-		instance = self
-		
-		class SSHandler(StreamRequestHandler):
-			def handle(self):
-				instance._sshandler(self.connection, self.rfile, self.wfile)
-		
-		self.sserver = ThreadingUnixStreamServer(self.socket_file, SSHandler)
+		self.sserver = ControlServer(self.socket_file, self._on_client_connected,
+			self._handle_message, self._on_client_disconnected)
 		t = threading.Thread(target=self.sserver.serve_forever)
 		t.daemon = True
 		t.start()
@@ -306,29 +423,30 @@ class SCCDaemon(Daemon):
 		log.debug("Created control socket %s", self.socket_file)
 	
 	
-	def _sshandler(self, connection, rfile, wfile):
+	def _on_client_connected(self, connection):
+		"""
+		Called by ControlServer when new client connects. Everything sent to
+		client goes through queue, so client that is not reading fast enough
+		cannot block controller input processing.
+		"""
+		config = Config.shared()
+		queue = ClientQueue(config["client_queue_size"], config["client_event_rate"])
 		with self.lock:
-			client = Client(connection, rfile, wfile)
+			client = Client(connection, queue)
 			self.clients.add(client)
-			wfile.write(b"SCCDaemon\n")
-			wfile.write(("Version: %s\n" % (DAEMON_VERSION,)).encode("utf-8"))
-			wfile.write(("PID: %s\n" % (os.getpid(),)).encode("utf-8"))
-			wfile.write(("Current profile: %s\n" % (self.profile_file,)).encode("utf-8"))
+			queue.write(b"SCCDaemon\n")
+			queue.write(("Version: %s\n" % (DAEMON_VERSION,)).encode("utf-8"))
+			queue.write(("PID: %s\n" % (os.getpid(),)).encode("utf-8"))
+			queue.write(("Current profile: %s\n" % (self.profile_file,)).encode("utf-8"))
 			if self.error is None:
-				wfile.write(b"Ready.\n")
+				queue.write(b"Ready.\n")
 			else:
-				wfile.write(("Error: %s\n" % (self.error,)).encode("utf-8"))
-		
-		while True:
-			try:
-				line = rfile.readline()
-			except Exception:
-				# Connection terminated
-				break
-			if len(line) == 0: break
-			if len(line.strip("\t\n ")) > 0:
-				self._handle_message(client, line.strip("\n"))
-		
+				queue.write(("Error: %s\n" % (self.error,)).encode("utf-8"))
+		return client
+	
+	
+	def _on_client_disconnected(self, client):
+		""" Called by ControlServer when connection is closed """
 		with self.lock:
 			client.unlock_actions(self)
 			if self.osd_daemon == client:
@@ -338,6 +456,9 @@ class SCCDaemon(Daemon):
 				log.info("scc-autoswitch-daemon lost")
 				self.autoswitch_daemon = None
 			self.clients.remove(client)
+		if client.wfile.dropped or client.wfile.coalesced:
+			log.debug("Client disconnected; %s events dropped, %s coalesced",
+				client.wfile.dropped, client.wfile.coalesced)
 	
 	
 	def _listen_on_socket(self):
@@ -395,16 +516,8 @@ class SCCDaemon(Daemon):
 		Handles message recieved from client.
 		"""
 		if message.startswith("Profile:"):
-			with self.lock:
-				try:
-					filename = message[8:].decode("utf-8").strip("\t ")
-					self._set_profile(filename)
-					log.info("Loaded profile '%s'", filename)
-					client.wfile.write(b"OK.\n")
-				except Exception, e:
-					log.error(e)
-					tb = unicode(traceback.format_exc()).encode("utf-8").encode('string_escape')
-					client.wfile.write(b"Fail: " + tb + b"\n")
+			filename = message[8:].decode("utf-8").strip("\t ")
+			self._load_profile_async(filename, client)
 		elif message.startswith("OSD:"):
 			if not self.osd_daemon:
 				client.wfile.write(b"Fail: Cannot show OSD; there is no scc-osd-daemon registered\n")
@@ -417,7 +530,7 @@ class SCCDaemon(Daemon):
 				except Exception:
 					client.wfile.write(b"Fail: cannot display OSD\n")
 		elif message.startswith("Observe:"):
-			if Config()["enable_sniffing"]:
+			if Config.shared()["enable_sniffing"]:
 				to_observe = [ x for x in message.split(":", 1)[1].strip(" \t\r").split(" ") ]
 				with self.lock:
 					for l in to_observe:
@@ -448,7 +561,7 @@ class SCCDaemon(Daemon):
 		elif message.startswith("Reconfigure."):
 			with self.lock:
 				# Start or stop scc-autoswitch-daemon as needed
-				need_autoswitch_daemon = len(Config()["autoswitch"]) > 0
+				need_autoswitch_daemon = len(Config.shared()["autoswitch"]) > 0
 				if need_autoswitch_daemon and self.xdisplay and not self.autoswitch_daemon:
 					self.subprocs.append(Subprocess("scc-autoswitch-daemon", True))
 				elif not need_autoswitch_daemon and self.autoswitch_daemon:
@@ -504,10 +617,73 @@ class SCCDaemon(Daemon):
 					self.autoswitch_daemon = client
 					log.info("Registered scc-autoswitch-daemon")
 				client.wfile.write(b"OK.\n")
+		elif message.startswith("Protocol:"):
+			mode = message[9:].strip(" \t\r")
+			if mode in ("text", "binary"):
+				with self.lock:
+					client.binary = (mode == "binary")
+					client.wfile.write(b"OK.\n")
+			else:
+				client.wfile.write(b"Fail: Unknown protocol\n")
+		elif message.startswith("Stats:"):
+			with self.lock:
+				self._handle_stats(client, message[6:].strip(" \t\r\n"))
 		else:
 			client.wfile.write(b"Fail: Unknown command\n")
 	
 	
+	def _set_stats(self, stats):
+		""" Enables or disables latency measuring (by setting it to None) """
+		self.stats = stats
+		self.mapper.stats = stats
+		if self.mapper.get_controller():
+			self.mapper.get_controller().setStats(stats)
+	
+	
+	def _handle_stats(self, client, arg):
+		"""
+		Handles 'Stats:' message. Should be called with self.lock acquired.
+		"""
+		if arg == "on":
+			if self.stats is None:
+				self._set_stats(LatencyStats())
+			self.stats.reset()
+			log.info("Latency measuring enabled")
+			client.wfile.write(b"OK.\n")
+		elif arg == "off":
+			self._set_stats(None)
+			log.info("Latency measuring disabled")
+			client.wfile.write(b"OK.\n")
+		elif arg == "reset":
+			if self.stats:
+				self.stats.reset()
+			client.wfile.write(b"OK.\n")
+		elif arg in ("", "show"):
+			if self.stats is None:
+				client.wfile.write(b"Fail: Measuring is disabled; send 'Stats: on' first\n")
+				return
+			lines = self.stats.report()
+			for name, dev in (("keyboard", self.mapper.keyboard),
+					("mouse", self.mapper.mouse), ("gamepad", self.mapper.gamepad)):
+				lines.append("%s %s" % (name, " ".join([ "%s=%s" % x
+					for x in sorted(dev.getStats().items()) ])))
+			if self.mapper.get_controller():
+				lines.append("dropped_packets %s" % (
+					self.mapper.get_controller().getDroppedPackets(),))
+			lines.append("profile_cache hits=%s misses=%s" % (
+				self.profile_cache.hits, self.profile_cache.misses))
+			lines.append("parse_cache hits=%s misses=%s" % (
+				ActionParser.CACHE.hits, ActionParser.CACHE.misses))
+			lines.append("client_events dropped=%s coalesced=%s" % (
+				sum([ c.wfile.dropped for c in self.clients ]),
+				sum([ c.wfile.coalesced for c in self.clients ])))
+			for line in lines:
+				client.wfile.write(("Stats: %s\n" % (line,)).encode("utf-8"))
+			client.wfile.write(b"OK.\n")
+		else:
+			client.wfile.write(b"Fail: Unknown argument\n")
+	
+	
 	def _remove_subproccess(self, binary_name):
 		"""
 		Removes subproccess started with specified binary name from list of
@@ -578,6 +754,7 @@ class SCCDaemon(Daemon):
 			self.mapper.profile.pads[what] = a
 		else:
 			raise ValueError("Unknown source: %s" % (what,))
+		self.mapper.profile.compile()
 	
 	
 	@staticmethod
@@ -620,20 +797,27 @@ class SCCDaemon(Daemon):
 
 
 class Client(object):
-	def __init__(self, connection, rfile, wfile):
+	def __init__(self, connection, wfile):
+		""" wfile is ClientQueue, not written to socket directly """
 		self.connection = connection
-		self.rfile = rfile
 		self.wfile = wfile
+		self.binary = False		# Set by 'Protocol: binary' message
 		self.locked_actions = set()
 		self.observed_actions = set()
 	
 	
+	def send_event(self, what, values, key=None):
+		"""
+		Queues event, encoded by protocol client has requested.
+		See ClientQueue.put_event for meaning of 'key'.
+		"""
+		self.wfile.put_event(encode_event(what, values, self.binary), key)
+	
+	
 	def close(self):
 		""" Closes connection to this client """
-		try:
-			self.connection.shutdown(True)
-		except:
-			pass
+		# Connection is closed by ControlServer once queue is closed
+		self.wfile.close()
 	
 	
 	def lock_action(self, daemon, what):
@@ -721,28 +905,27 @@ class ReportingAction(Action):
 	
 	
 	def trigger(self, mapper, position, old_position):
-		self.client.wfile.write(("Event: %s %s %s\n" % (
-			self.what.name, position, old_position)).encode("utf-8"))
+		self.client.send_event(self.what.name, (position, old_position), self.what)
 	
 	
 	def button_press(self, mapper):
 		if self.what == SCButtons.STICK:
-			self.client.wfile.write(b"Event: STICKPRESS 1\n")
+			self.client.send_event("STICKPRESS", (1,))
 		else:
-			self.client.wfile.write(("Event: %s 1\n" % (self.what.name,)).encode("utf-8"))
+			self.client.send_event(self.what.name, (1,))
 	
 	
 	def button_release(self, mapper):
 		if self.what == SCButtons.STICK:
-			self.client.wfile.write(b"Event: STICKPRESS 0\n")
+			self.client.send_event("STICKPRESS", (0,))
 		else:
-			self.client.wfile.write(("Event: %s 0\n" % (self.what.name,)).encode("utf-8"))
+			self.client.send_event(self.what.name, (0,))
 	
 	
 	def whole(self, mapper, x, y, what):
 		if abs(x - self.old_pos[0]) > self.MIN_DIFFERENCE or abs(y - self.old_pos[1] > self.MIN_DIFFERENCE):
 			self.old_pos = x, y
-			self.client.wfile.write(("Event: %s %s %s\n" % (what, x, y)).encode("utf-8"))
+			self.client.send_event(what, (x, y), what)
 
 
 class LockedAction(ReportingAction):
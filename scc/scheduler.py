@@ -0,0 +1,180 @@
+#!/usr/bin/env python2
+"""
+SC-Controller - Scheduler
+
+Keeps tasks that should be executed after some time, ordered in heap.
+Used by Mapper (and so by actions) to implement everything from macros
+to doubleclick timeouts.
+"""
+from __future__ import unicode_literals
+
+from heapq import heappush, heappop, heapify
+import os, fcntl, errno, threading, traceback, logging
+log = logging.getLogger("Scheduler")
+
+
+class Scheduler(object):
+	"""
+	Scheduled task is represented by list of [ when, id, callback ].
+	It should be treated as opaque handle, usable only to cancel the task.
+	
+	'id' is increasing counter used to keep tasks scheduled for same time
+	in order they were scheduled and to recognize tasks scheduled while
+	run() is executing.
+	
+	Tasks may be scheduled and cancelled from any thread, but run() should
+	be called only from one.
+	"""
+	
+	def __init__(self):
+		self._heap = []
+		self._last_id = 0
+		self._cancelled = 0
+		self._lock = threading.Lock()
+	
+	
+	def schedule(self, when, callback):
+		"""
+		Schedules callback to be called no sooner than at 'when'.
+		Returns task handle that can be passed to cancel().
+		"""
+		with self._lock:
+			self._last_id += 1
+			task = [ when, self._last_id, callback ]
+			heappush(self._heap, task)
+		return task
+	
+	
+	def cancel(self, task):
+		"""
+		Cancels scheduled task. Does nothing if task was already executed
+		or cancelled.
+		"""
+		with self._lock:
+			self._cancel(task)
+	
+	
+	def _cancel(self, task):
+		if task[2] is not None:
+			task[2] = None
+			self._cancelled += 1
+			if self._cancelled > 16 and self._cancelled > len(self._heap) / 2:
+				self._compact()
+	
+	
+	def remove(self, callback):
+		""" Cancels all tasks scheduled with specified callback """
+		with self._lock:
+			for task in [ t for t in self._heap if t[2] == callback ]:
+				self._cancel(task)
+	
+	
+	def _compact(self):
+		""" Throws out cancelled tasks from heap """
+		# Done in place, as run() may be holding reference to heap
+		self._heap[:] = [ task for task in self._heap if task[2] is not None ]
+		heapify(self._heap)
+		self._cancelled = 0
+	
+	
+	def next(self):
+		"""
+		Returns time when next scheduled task should be executed or None
+		if there is no task scheduled.
+		"""
+		with self._lock:
+			heap = self._heap
+			while len(heap) and heap[0][2] is None:
+				heappop(heap)
+				self._cancelled -= 1
+			if len(heap):
+				return heap[0][0]
+			return None
+	
+	
+	def run(self, now, *data):
+		"""
+		Executes every task that is due at 'now', calling callback(*data).
+		Tasks scheduled while this is executing are left for next call,
+		so action rescheduling itself with zero delay is called once
+		per run().
+		"""
+		heap = self._heap
+		last_id = self._last_id
+		while True:
+			# Lock is not held while callback is executing, so callback
+			# is free to schedule or cancel other tasks
+			with self._lock:
+				if not len(heap) or heap[0][0] > now or heap[0][1] > last_id:
+					break
+				task = heappop(heap)
+				callback, task[2] = task[2], None
+				if callback is None:
+					self._cancelled -= 1
+					continue
+			try:
+				callback(*data)
+			except Exception:
+				log.error("Error while executing scheduled task")
+				log.error(traceback.format_exc())
+	
+	
+	def __len__(self):
+		return len(self._heap) - self._cancelled
+
+
+class Waker(object):
+	"""
+	Self-pipe that can be polled together with other file descriptors.
+	wake() can be called from any thread to make poll() waiting on fileno()
+	return, clear() should be called by the thread that was woken up.
+	"""
+	
+	def __init__(self):
+		self._read, self._write = os.pipe()
+		for fd in (self._read, self._write):
+			flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+			fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+			flags = fcntl.fcntl(fd, fcntl.F_GETFD)
+			fcntl.fcntl(fd, fcntl.F_SETFD, flags | fcntl.FD_CLOEXEC)
+		self._pending = False
+	
+	
+	def fileno(self):
+		return self._read
+	
+	
+	def wake(self):
+		""" Makes poll on fileno() return. Does nothing if already woken """
+		if not self._pending:
+			self._pending = True
+			try:
+				os.write(self._write, b"\x00")
+			except OSError, e:
+				# EAGAIN means that pipe is full, so it's readable anyway
+				if e.errno != errno.EAGAIN:
+					raise
+	
+	
+	def clear(self):
+		"""
+		Reads everything that was written to pipe. Has to be called before
+		woken up thread checks for work it was woken up for.
+		"""
+		# Flag is reset only after pipe is drained. wake() called before
+		# that doesn't write anything, but it's not lost, as thread calling
+		# clear() didn't check for work yet. Resetting flag first would let
+		# such wake() write byte that is then drained while flag stays set,
+		# blocking every following wake().
+		try:
+			while os.read(self._read, 64):
+				pass
+		except OSError, e:
+			if e.errno != errno.EAGAIN:
+				raise
+		self._pending = False
+	
+	
+	def close(self):
+		os.close(self._read)
+		os.close(self._write)
@@ -0,0 +1,183 @@
+#!/usr/bin/env python2
+"""
+SC-Controller - Stats
+
+Measures how long it takes from receiving packet from controller until
+resulting events are written to uinput devices.
+
+Measuring is disabled by default. When enabled, every frame is timestamped
+in few places and durations are stored in histograms, which can be then
+queried over daemon socket using 'Stats:' message.
+"""
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+import time
+
+
+class Histogram(object):
+	"""
+	Log-linear histogram of integer values, similar to HdrHistogram.
+	
+	Values below 2 * SUB are stored exactly, larger values are stored in
+	buckets that are SUB-times smaller than value itself, so every
+	recorded value is precise to ~3%, while whole histogram fits into
+	fixed list of few hundred counters.
+	"""
+	SUB_BITS = 5
+	SUB = 1 << SUB_BITS
+	MAX_VALUE = (1 << 32) - 1
+	
+	def __init__(self):
+		self._counts = [ 0 ] * (self.index(self.MAX_VALUE) + 1)
+		self.reset()
+	
+	
+	def reset(self):
+		for i in xrange(len(self._counts)):
+			self._counts[i] = 0
+		self._count = 0
+		self._total = 0
+		self._max = 0
+	
+	
+	@staticmethod
+	def index(value):
+		""" Returns index of bucket for given value """
+		if value < 2 * Histogram.SUB:
+			return value
+		shift = value.bit_length() - Histogram.SUB_BITS - 1
+		return ((shift + 1) << Histogram.SUB_BITS) + (value >> shift) - Histogram.SUB
+	
+	
+	@staticmethod
+	def highest(index):
+		""" Returns highest value that is stored in bucket with given index """
+		if index < 2 * Histogram.SUB:
+			return index
+		shift = (index >> Histogram.SUB_BITS) - 1
+		return ((index - (shift << Histogram.SUB_BITS) + 1) << shift) - 1
+	
+	
+	def record(self, value):
+		""" Records one (non-negative, integer) value """
+		value = min(max(0, int(value)), self.MAX_VALUE)
+		self._counts[self.index(value)] += 1
+		self._count += 1
+		self._total += value
+		if value > self._max:
+			self._max = value
+	
+	
+	def count(self):
+		""" Returns number of recorded values """
+		return self._count
+	
+	
+	def max(self):
+		""" Returns largest recorded value, exactly """
+		return self._max
+	
+	
+	def mean(self):
+		""" Returns mean of recorded values, or 0 if there is none """
+		if self._count == 0:
+			return 0
+		return float(self._total) / self._count
+	
+	
+	def percentile(self, p):
+		"""
+		Returns value below which is 'p' percent of recorded values,
+		or 0 if there is none.
+		"""
+		if self._count == 0:
+			return 0
+		target = max(1, int(self._count * p / 100.0 + 0.5))
+		seen = 0
+		for i in xrange(len(self._counts)):
+			seen += self._counts[i]
+			if seen >= target:
+				return min(self.highest(i), self._max)
+		return self._max
+
+
+class LatencyStats(object):
+	"""
+	Collects timestamps of single frame and turns them into durations.
+	
+	Frame starts when packet is received (mark(PACKET), done by
+	SCController) and is finished by end_frame(), called by Mapper after
+	all generated events are synced. Frames generated by timer or by
+	scheduled tasks have no PACKET timestamp and only parts that actually
+	happened are recorded for them.
+	
+	Recorded histograms, all in microseconds:
+	 - dispatch:  packet received -> Mapper.callback called
+	 - callback:  time spent by actions in Mapper.callback
+	 - events:    generate_events called -> everything synced
+	 - flush:     time spent by single device writing its events
+	 - total:     packet received -> everything synced
+	"""
+	PACKET, CALLBACK, CALLBACK_END, EVENTS = xrange(4)
+	NAMES = ( "dispatch", "callback", "events", "flush", "total" )
+	
+	def __init__(self):
+		self._times = [ None ] * 4
+		self.histograms = OrderedDict([ (x, Histogram()) for x in self.NAMES ])
+		self._dispatch, self._callback, self._events, self._flush, self._total = (
+			self.histograms.values())
+	
+	
+	def reset(self):
+		""" Clears all recorded values """
+		for h in self.histograms.values():
+			h.reset()
+		self.clear_frame()
+	
+	
+	def mark(self, what):
+		""" Stores current time as one of PACKET, CALLBACK, ... timestamps """
+		self._times[what] = time.time()
+	
+	
+	def clear_frame(self):
+		"""
+		Throws away timestamps of current frame. Used when packet
+		doesn't generate frame at all.
+		"""
+		self._times[0] = self._times[1] = self._times[2] = self._times[3] = None
+	
+	
+	def sync(self, devices):
+		""" Calls synEvent on every device, measuring time it takes """
+		for dev in devices:
+			start = time.time()
+			dev.synEvent()
+			self._flush.record((time.time() - start) * 1000000)
+	
+	
+	def end_frame(self):
+		""" Records durations of frame that has just finished """
+		now = time.time()
+		packet, callback, callback_end, events = self._times
+		if packet is not None:
+			self._total.record((now - packet) * 1000000)
+			if callback is not None:
+				self._dispatch.record((callback - packet) * 1000000)
+		if callback is not None and callback_end is not None:
+			self._callback.record((callback_end - callback) * 1000000)
+		if events is not None:
+			self._events.record((now - events) * 1000000)
+		self.clear_frame()
+	
+	
+	def report(self):
+		"""
+		Returns list of human-readable lines, one for every histogram.
+		Durations are in microseconds.
+		"""
+		return [ "%s count=%s p50=%sus p95=%sus p99=%sus max=%sus mean=%.1fus" % (
+				name, h.count(), h.percentile(50), h.percentile(95),
+				h.percentile(99), h.max(), h.mean())
+			for name, h in self.histograms.items() ]
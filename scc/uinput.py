@@ -23,20 +23,35 @@
 # THE SOFTWARE.
 
 import os
+import fcntl
 import ctypes
+import struct
 import time
+import logging
 from math import pi, copysign, sqrt
 from scc.lib import IntEnum
-from scc.cheader import defines
+from scc.cheader import defines, MODULE_VERSION
 from scc.tools import find_lib
 
 from collections import deque
 
-# Get All defines from linux headers
-if os.path.exists('/usr/include/linux/input-event-codes.h'):
-	CHEAD = defines('/usr/include', 'linux/input-event-codes.h')
-else:
-	CHEAD = defines('/usr/include', 'linux/input.h')
+log = logging.getLogger("UInput")
+
+# Get All defines from linux headers. Pregenerated module is used when
+# available, parsing headers on every start is slow.
+# Regenerate it using 'python2 -m scc.cheader --module /usr/include
+# linux/input-event-codes.h > scc/input_event_codes.py'
+try:
+	from scc import input_event_codes
+	if input_event_codes.VERSION != MODULE_VERSION:
+		raise ImportError("input_event_codes module is outdated")
+	CHEAD = input_event_codes.CHEAD
+except ImportError, e:
+	log.debug("Parsing linux headers: %s", e)
+	if os.path.exists('/usr/include/linux/input-event-codes.h'):
+		CHEAD = defines('/usr/include', 'linux/input-event-codes.h')
+	else:
+		CHEAD = defines('/usr/include', 'linux/input.h')
 
 # Keys enum contains all keys and button from linux/uinput.h (KEY_* BTN_*)
 Keys = IntEnum('Keys', {i: CHEAD[i] for i in CHEAD.keys() if (i.startswith('KEY_') or
@@ -171,6 +186,177 @@ Scans = {
 	Keys.KEY_FORWARD: 0xc00f3,
 }
 
+EV_SYN = CHEAD['EV_SYN']
+EV_KEY = CHEAD['EV_KEY']
+EV_REL = CHEAD['EV_REL']
+EV_ABS = CHEAD['EV_ABS']
+EV_MSC = CHEAD['EV_MSC']
+EV_REP = CHEAD['EV_REP']
+SYN_REPORT = CHEAD['SYN_REPORT']
+MSC_SCAN = CHEAD['MSC_SCAN']
+REP_DELAY = CHEAD['REP_DELAY']
+REP_PERIOD = CHEAD['REP_PERIOD']
+ABS_CNT = CHEAD['ABS_MAX'] + 1
+BUS_USB = 0x03
+
+# struct input_event from linux/input.h
+INPUT_EVENT = struct.Struct(b'llHHi')
+# struct uinput_user_dev from linux/uinput.h
+UINPUT_USER_DEV = struct.Struct(b'80sHHHHI%si' % (ABS_CNT * 4,))
+
+# ioctl requests from linux/uinput.h
+def _IOC(dir, nr, size):
+	return (dir << 30) | (size << 16) | (ord('U') << 8) | nr
+UI_DEV_CREATE	= _IOC(0, 1, 0)
+UI_DEV_DESTROY	= _IOC(0, 2, 0)
+UI_SET_EVBIT	= _IOC(1, 100, 4)
+UI_SET_KEYBIT	= _IOC(1, 101, 4)
+UI_SET_RELBIT	= _IOC(1, 102, 4)
+UI_SET_ABSBIT	= _IOC(1, 103, 4)
+UI_SET_MSCBIT	= _IOC(1, 104, 4)
+
+
+class LibUInputBackend(object):
+	"""
+	Creates devices using compiled libuinput.
+	"""
+
+	def __init__(self):
+		lib, search_paths = find_lib("libuinput", os.path.dirname(__file__))
+		if not lib:
+			raise OSError('Cant find libuinput. searched at:\n {}'.format(
+				'\n'.join(search_paths)
+			)
+		)
+		self._lib = ctypes.CDLL(lib)
+
+
+	def create(self, vendor, product, name, keys, axes, rels, keyboard):
+		"""
+		Creates device and returns its file descriptor or negative number
+		on failure. 'axes' is tuple of lists (axes, min, max, fuzz, flat).
+		"""
+		a, amin, amax, afuzz, aflat = axes
+		c_k		= (ctypes.c_uint16 * len(keys))(*keys)
+		c_a		= (ctypes.c_uint16 * len(a))(*a)
+		c_amin	 = (ctypes.c_int32  * len(amin ))(*amin )
+		c_amax	 = (ctypes.c_int32  * len(amax ))(*amax )
+		c_afuzz	= (ctypes.c_int32  * len(afuzz))(*afuzz)
+		c_aflat	= (ctypes.c_int32  * len(aflat))(*aflat)
+		c_r		= (ctypes.c_uint16 * len(rels))(*rels)
+		c_vendor   = ctypes.c_uint16(vendor)
+		c_product  = ctypes.c_uint16(product)
+		c_keyboard = ctypes.c_int(keyboard)
+
+		c_name = ctypes.c_char_p(name)
+		return self._lib.uinput_init(ctypes.c_int(len(keys)),
+									 c_k,
+									 ctypes.c_int(len(a)),
+									 c_a,
+									 c_amin,
+									 c_amax,
+									 c_afuzz,
+									 c_aflat,
+									 ctypes.c_int(len(rels)),
+									 c_r,
+									 c_keyboard,
+									 c_vendor,
+									 c_product,
+									 c_name)
+
+
+	def destroy(self, fd):
+		self._lib.uinput_destroy(fd)
+
+
+class PythonUInputBackend(object):
+	"""
+	Creates devices by talking to /dev/uinput directly, so nothing has to be
+	compiled. Does the same thing as uinput_init in uinput.c.
+	"""
+
+	def create(self, vendor, product, name, keys, axes, rels, keyboard):
+		"""
+		Creates device and returns its file descriptor or negative number
+		on failure. 'axes' is tuple of lists (axes, min, max, fuzz, flat).
+		"""
+		try:
+			fd = os.open("/dev/uinput", os.O_WRONLY | os.O_NONBLOCK)
+		except OSError, e:
+			log.error("Failed to open /dev/uinput: %s", e)
+			return -1
+		try:
+			a, amin, amax, afuzz, aflat = axes
+			absmin, absmax = [ 0 ] * ABS_CNT, [ 0 ] * ABS_CNT
+			absfuzz, absflat = [ 0 ] * ABS_CNT, [ 0 ] * ABS_CNT
+			if len(keys):
+				fcntl.ioctl(fd, UI_SET_EVBIT, EV_KEY)
+				for k in keys:
+					fcntl.ioctl(fd, UI_SET_KEYBIT, k)
+			if len(a):
+				fcntl.ioctl(fd, UI_SET_EVBIT, EV_ABS)
+				for i in xrange(len(a)):
+					fcntl.ioctl(fd, UI_SET_ABSBIT, a[i])
+					absmin[a[i]], absmax[a[i]] = amin[i], amax[i]
+					absfuzz[a[i]], absflat[a[i]] = afuzz[i], aflat[i]
+			if len(rels):
+				fcntl.ioctl(fd, UI_SET_EVBIT, EV_REL)
+				for r in rels:
+					fcntl.ioctl(fd, UI_SET_RELBIT, r)
+			if keyboard:
+				fcntl.ioctl(fd, UI_SET_EVBIT, EV_MSC)
+				fcntl.ioctl(fd, UI_SET_MSCBIT, MSC_SCAN)
+				fcntl.ioctl(fd, UI_SET_EVBIT, EV_REP)
+			os.write(fd, UINPUT_USER_DEV.pack(name[0:79], BUS_USB,
+				vendor, product, 1, 0, *(absmax + absmin + absfuzz + absflat)))
+			fcntl.ioctl(fd, UI_DEV_CREATE)
+		except (IOError, OSError), e:
+			log.error("Failed to create uinput device: %s", e)
+			os.close(fd)
+			return -1
+		return fd
+
+
+	def destroy(self, fd):
+		try:
+			fcntl.ioctl(fd, UI_DEV_DESTROY)
+		except IOError:
+			pass
+		os.close(fd)
+
+
+BACKENDS = {
+	"libuinput" : LibUInputBackend,
+	"python" : PythonUInputBackend,
+}
+_backend = None
+
+
+def get_backend():
+	"""
+	Returns backend used to create uinput devices, creating it on first call.
+
+	Backend is selected by SCC_UINPUT_BACKEND environment variable,
+	which can be set to 'libuinput' or 'python'. If not set, libuinput
+	is used when available.
+	"""
+	global _backend
+	if _backend is None:
+		name = os.environ.get("SCC_UINPUT_BACKEND")
+		if name in BACKENDS:
+			_backend = BACKENDS[name]()
+		else:
+			if name:
+				log.warning("Unknown uinput backend '%s'", name)
+			try:
+				_backend = LibUInputBackend()
+			except OSError, e:
+				log.warning(e)
+				log.warning("Falling back to python uinput backend")
+				_backend = PythonUInputBackend()
+		log.debug("Using %s", _backend.__class__.__name__)
+	return _backend
+
 
 
 class UInput(object):
@@ -178,11 +364,33 @@ class UInput(object):
 	UInput class permits to create a uinput device.
 
 	See Gamepad, Mouse, Keyboard for examples
+
+	Events are not written to device right away, but packed into queue
+	and written all at once when synEvent or flush is called.
+
+	Device itself is created by backend returned by get_backend(), but
+	writing events is same for every backend.
+
+	Last value sent for every key and axis is remembered and event that
+	would not change it is not sent at all. Same goes for syn event with
+	no events before it. getStats returns how many events were dropped.
 	"""
 
+	# Maximum number of events queued before they are written out even
+	# without syn event
+	QUEUE_SIZE = 64
 
 	def __init__(self, vendor, product, name, keys, axes, rels, keyboard=False):
-		self._lib = None
+		self._backend = None
+		self._queue = bytearray(INPUT_EVENT.size * UInput.QUEUE_SIZE)
+		self._view = memoryview(self._queue)
+		self._queued = 0
+		self._keys = {}				# last value sent for every key
+		self._axes = {}				# last value sent for every axis
+		self._dirty = False			# True if there is event not followed by syn
+		self._written = 0
+		self._suppressed = 0
+		self._suppressed_syn = 0
 		self._k = keys
 		if not axes or len(axes) == 0:
 			self._a, self._amin, self._amax, self._afuzz, self._aflat = [[]] * 5
@@ -190,40 +398,56 @@ class UInput(object):
 			self._a, self._amin, self._amax, self._afuzz, self._aflat = zip(*axes)
 
 		self._r = rels
-		lib, search_paths = find_lib("libuinput", os.path.dirname(__file__))
-		if not lib:
-			raise OSError('Cant find libuinput. searched at:\n {}'.format(
-				'\n'.join(search_paths)
-			)
-		)
-		self._lib = ctypes.CDLL(lib)
+		backend = get_backend()
+		self._fd = backend.create(vendor, product, name, self._k,
+			(self._a, self._amin, self._amax, self._afuzz, self._aflat),
+			self._r, keyboard)
+		if self._fd >= 0:
+			self._backend = backend
 
-		c_k		= (ctypes.c_uint16 * len(self._k))(*self._k)
-		c_a		= (ctypes.c_uint16 * len(self._a))(*self._a)
-		c_amin	 = (ctypes.c_int32  * len(self._amin ))(*self._amin )
-		c_amax	 = (ctypes.c_int32  * len(self._amax ))(*self._amax )
-		c_afuzz	= (ctypes.c_int32  * len(self._afuzz))(*self._afuzz)
-		c_aflat	= (ctypes.c_int32  * len(self._aflat))(*self._aflat)
-		c_r		= (ctypes.c_uint16 * len(self._r))(*self._r)
-		c_vendor   = ctypes.c_uint16(vendor)
-		c_product  = ctypes.c_uint16(product)
-		c_keyboard = ctypes.c_int(keyboard)
 
-		c_name = ctypes.c_char_p(name)
-		self._fd = self._lib.uinput_init(ctypes.c_int(len(self._k)),
-										 c_k,
-										 ctypes.c_int(len(self._a)),
-										 c_a,
-										 c_amin,
-										 c_amax,
-										 c_afuzz,
-										 c_aflat,
-										 ctypes.c_int(len(self._r)),
-										 c_r,
-										 c_keyboard,
-										 c_vendor,
-										 c_product,
-										 c_name)
+	def _queueEvent(self, type, code, val):
+		"""
+		Stores event in queue, to be written by next flush
+		"""
+		if self._queued >= UInput.QUEUE_SIZE:
+			self.flush()
+		INPUT_EVENT.pack_into(self._queue, self._queued * INPUT_EVENT.size,
+			0, 0, type, code, val)
+		self._queued += 1
+		self._dirty = True
+
+
+	def flush(self):
+		"""
+		Writes all queued events to device using single syscall
+		"""
+		if self._queued:
+			if self._backend:
+				try:
+					os.write(self._fd, self._view[0:self._queued * INPUT_EVENT.size])
+				except OSError:
+					# Device is opened in non-blocking mode and events
+					# are dropped if kernel can't take them right now,
+					# same as they were when written by libuinput.
+					# Last sent values are not known anymore, so nothing
+					# can be suppressed until it's sent again
+					self._keys = {}
+					self._axes = {}
+			self._written += self._queued
+			self._queued = 0
+
+
+	def getStats(self):
+		"""
+		Returns dict with number of events written to device and number
+		of events and syn events that were dropped as redundant.
+		"""
+		return {
+			"written": self._written + self._queued,
+			"suppressed": self._suppressed,
+			"suppressed_syn": self._suppressed_syn,
+		}
 
 
 	def keyEvent(self, key, val):
@@ -233,9 +457,11 @@ class UInput(object):
 		@param int axis		 key or btn event (KEY_* or BTN_*)
 		@param int val		  event value
 		"""
-		self._lib.uinput_key(self._fd,
-							 ctypes.c_uint16(key),
-							 ctypes.c_int32(val))
+		if self._keys.get(key) == val:
+			self._suppressed += 1
+			return
+		self._keys[key] = val
+		self._queueEvent(EV_KEY, key, val)
 
 
 	def axisEvent(self, axis, val):
@@ -245,9 +471,11 @@ class UInput(object):
 		@param int axis		 abs event (ABS_*)
 		@param int val		  event value
 		"""
-		self._lib.uinput_abs(self._fd,
-							 ctypes.c_uint16(axis),
-							 ctypes.c_int32(val))
+		if self._axes.get(axis) == val:
+			self._suppressed += 1
+			return
+		self._axes[axis] = val
+		self._queueEvent(EV_ABS, axis, val)
 
 	def relEvent(self, rel, val):
 		"""
@@ -256,9 +484,7 @@ class UInput(object):
 		@param int rel		  rel event (REL_*)
 		@param int val		  event value
 		"""
-		self._lib.uinput_rel(self._fd,
-							 ctypes.c_uint16(rel),
-							 ctypes.c_int32(val))
+		self._queueEvent(EV_REL, rel, val)
 
 	def scanEvent(self, val):
 		"""
@@ -266,14 +492,20 @@ class UInput(object):
 
 		@param int val		  scan event value (scancode)
 		"""
-		self._lib.uinput_scan(self._fd,
-							  ctypes.c_int32(val))
+		self._queueEvent(EV_MSC, MSC_SCAN, val)
 
 	def synEvent(self):
 		"""
-		Generate a syn event
+		Generate a syn event and write it, together with all queued
+		events, to device. Does nothing if there was no event since
+		last syn.
 		"""
-		self._lib.uinput_syn(self._fd)
+		if not self._dirty:
+			self._suppressed_syn += 1
+			return
+		self._queueEvent(EV_SYN, SYN_REPORT, 0)
+		self.flush()
+		self._dirty = False
 
 
 	def setDelayPeriod(self, delay, period):
@@ -283,10 +515,9 @@ class UInput(object):
 		@param int delay		delay in ms
 		@param int period	   period is ms
 		"""
-
-		self._lib.uinput_set_delay_period(self._fd,
-										  ctypes.c_int32(delay),
-										  ctypes.c_int32(period))
+		self._queueEvent(EV_REP, REP_DELAY, delay)
+		self._queueEvent(EV_REP, REP_PERIOD, period)
+		self.flush()
 
 	def keyManaged(self, ev):
 		return ev in self._k
@@ -299,8 +530,9 @@ class UInput(object):
 
 
 	def __del__(self):
-		if self._lib:
-			self._lib.uinput_destroy(self._fd)
+		if self._backend:
+			self.flush()
+			self._backend.destroy(self._fd)
 
 
 class Gamepad(UInput):
@@ -341,6 +573,9 @@ class Mouse(UInput):
 
 	moveEvent can emulate free ball rotation of a track ball
 	updateParams permit to upgrade ball model and move scale
+
+	moveEvent and scrollEvent only queue events, synEvent has to be
+	called to write them out.
 	"""
 
 	DEFAULT_XSCALE = 0.006
@@ -415,17 +650,12 @@ class Mouse(UInput):
 		"""
 		self._dx += dx * self._xscale
 		self._dy += dy * self._yscale
-		_syn = False
 		if int(self._dx):
 			self.relEvent(rel=Rels.REL_X, val=int(self._dx))
 			self._dx -= int(self._dx)
-			_syn = True
 		if int(self._dy):
 			self.relEvent(rel=Rels.REL_Y, val=int(self._dy))
 			self._dy -= int(self._dy)
-			_syn = True
-		if _syn:
-			self.synEvent()
 
 	def scrollEvent(self, dx=0, dy=0):
 		"""
@@ -441,17 +671,12 @@ class Mouse(UInput):
 		# Compute mouse mouvement from interger part of d * scale
 		self._scr_dx += dx * self._scr_xscale
 		self._scr_dy += dy * self._scr_yscale
-		_syn = False
 		if int(self._scr_dx):
 			self.relEvent(rel=Rels.REL_HWHEEL, val=int(copysign(1, self._scr_dx)))
 			self._scr_dx -= int(self._scr_dx)
-			_syn = True
 		if int(self._scr_dy):
 			self.relEvent(rel=Rels.REL_WHEEL,  val=int(copysign(1, self._scr_dy)))
 			self._scr_dy -= int(self._scr_dy)
-			_syn = True
-		if _syn:
-			self.synEvent()
 
 
 class Keyboard(UInput):
@@ -463,6 +688,9 @@ class Keyboard(UInput):
 
 	autorepead delay and period are preset respectively to 250ms and 33ms
 	setDelayPeriod permits to update these values
+
+	pressEvent and releaseEvent only queue events, synEvent has to be
+	called to write them out.
 	"""
 
 	def __init__(self, name):
@@ -490,7 +718,6 @@ class Keyboard(UInput):
 			self.scanEvent(Scans[i])
 			self.keyEvent(i, 1)
 		if len(new):
-			self.synEvent()
 			self._pressed |= set(new)
 
 	def releaseEvent(self, keys=None):
@@ -510,7 +737,6 @@ class Keyboard(UInput):
 			self.scanEvent(Scans[i])
 			self.keyEvent(i, 0)
 		if len(rem):
-			self.synEvent()
 			self._pressed -= set(rem)
 
 
@@ -526,6 +752,7 @@ class Dummy(object):
 	relEvent = keyEvent
 	scanEvent = keyEvent
 	synEvent = keyEvent
+	flush = keyEvent
 	setDelayPeriod = keyEvent
 	updateParams = keyEvent
 	updateScrollParams = keyEvent
@@ -537,5 +764,8 @@ class Dummy(object):
 	def keyManaged(self, ev):
 		return False
 	
+	def getStats(self):
+		return { "written" : 0, "suppressed" : 0, "suppressed_syn" : 0 }
+	
 	axisManaged = keyManaged
 	relManaged = keyManaged
@@ -11,31 +11,52 @@ from scc.menu_data import MenuGenerator, MenuItem, Separator, MENU_GENERATORS
 from scc.lib import xwrappers as X
 from scc.tools import find_profile
 from scc.paths import get_daemon_socket
+from scc.scheduler import Waker
 from scc.config import Config
+from collections import OrderedDict
+from ctypes import byref
 
-import os, sys, re, time, socket, traceback, threading, logging
+import os, sys, re, time, socket, select, traceback, threading, logging
 log = logging.getLogger("AutoSwitcher")
 
 class AutoSwitcher(object):
+	"""
+	Watches active window and switches profiles.
+	
+	With window manager that sets _NET_ACTIVE_WINDOW property on root
+	window, AutoSwitcher waits for PropertyNotify events and reacts to
+	active window or its title being changed immediately. With anything
+	else, active window is polled every INTERVAL seconds.
+	"""
 	INTERVAL = 1
+	# Properties of active window that are watched for changes
+	TITLE_PROPERTIES = ( "_NET_WM_NAME", "WM_NAME" )
 	
 	def __init__(self):
 		self.dpy = X.open_display(os.environ["DISPLAY"])
 		self.lock = threading.Lock()
 		self.thread = threading.Thread(target=self.connect_daemon)
-		self.config = Config()
+		self.config = Config.shared()
 		self.socket = None
 		self.connected = False
 		self.exit_code = None
 		self.current_profile = None
 		self.current_window = None
+		self.current_pars = None
+		self.watch_windows = False
+		# Woken up when daemon reports profile or configuration change
+		self.waker = Waker()
 		self.conds = AutoSwitcher.parse_conditions(self.config)
+		self.index = ConditionIndex(self.conds)
 	
 	
 	@staticmethod
 	def parse_conditions(config):
-		""" Parses conditions from config """
-		conds = {}
+		"""
+		Parses conditions from config. Returned dict keeps order of
+		conditions, which is also their priority.
+		"""
+		conds = OrderedDict()
 		for c in config['autoswitch']:
 			try:
 				conds[Condition.parse(c['condition'])] = c['profile']
@@ -97,44 +118,61 @@ class AutoSwitcher(object):
 					profile = line.split(":", 1)[-1].strip()
 					log.debug("Daemon reported profile change: %s", profile)
 					self.current_profile = profile
+					self.waker.wake()
 				elif line.startswith("Reconfigured."):
 					log.debug("Reloading config...")
-					self.config = Config()
+					self.config = Config.shared()
 					self.conds = AutoSwitcher.parse_conditions(self.config)
+					self.index = ConditionIndex(self.conds)
+					self.waker.wake()
 			
 			self.lock.release()
 	
 	
 	def check(self, *a):
 		w = X.get_current_window(self.dpy)
-		if w == self.current_window or not self.current_profile:
-			# Window not switched or profile is not known yet
+		if not self.current_profile:
+			# Profile is not known yet
+			return
+		if w != self.current_window:
+			log.debug("Window switched: %s", w)
+			if self.watch_windows:
+				self._watch(w)
+			self.current_window = w
+			self.current_pars = None
+		elif not self.watch_windows:
+			# Window not switched. Title is checked only when title
+			# changes are reported by XServer
 			return
-		self.current_window = w
-		log.debug("Window switched: %s", w)
 		pars = X.get_window_title(self.dpy, w), X.get_window_class(self.dpy, w)
-		for c in self.conds:
-			if c.matches(*pars):
-				profile_name = self.conds[c]
-				path = find_profile(profile_name)
-				if path:
-					self.lock.acquire()
-					if path != self.current_profile and not self.current_profile.endswith(".mod"):
-						# Switch only if target profile is not active
-						# and active profile is not being editted.
-						try:
-							if self.config['autoswitch_osd']:
-								msg = (_("Switched to profile") + " " + profile_name)
-								self.socket.send(b"OSD: " + msg.encode('utf-8') + b"\n")
-							self.socket.send(b"Profile: " + path.encode('utf-8') + b"\n")
-						except:
-							self.lock.release()
-							log.error("Socket write failed")
-							os._exit(2)
-							return
-					self.lock.release()
-				else:
-					log.error("Cannot switch to profile '%s', profile file not found", self.conds[c])
+		if pars == self.current_pars:
+			return
+		self.current_pars = pars
+		# Index is replaced when configuration changes, so reference is
+		# kept until profile is found
+		index = self.index
+		c = index.find(*pars)
+		if c is not None:
+			profile_name = index.conds[c]
+			path = find_profile(profile_name)
+			if path:
+				self.lock.acquire()
+				if path != self.current_profile and not self.current_profile.endswith(".mod"):
+					# Switch only if target profile is not active
+					# and active profile is not being editted.
+					try:
+						if self.config['autoswitch_osd']:
+							msg = (_("Switched to profile") + " " + profile_name)
+							self.socket.send(b"OSD: " + msg.encode('utf-8') + b"\n")
+						self.socket.send(b"Profile: " + path.encode('utf-8') + b"\n")
+					except:
+						self.lock.release()
+						log.error("Socket write failed")
+						os._exit(2)
+						return
+				self.lock.release()
+			else:
+				log.error("Cannot switch to profile '%s', profile file not found", profile_name)
 	
 	
 	def sigint(self, *a):
@@ -142,12 +180,77 @@ class AutoSwitcher(object):
 		os._exit(0)
 	
 	
+	def _watch(self, window):
+		""" Starts receiving property changes of (new) active window """
+		root = X.get_default_root_window(self.dpy)
+		if self.current_window and self.current_window != root:
+			X.select_input(self.dpy, self.current_window, X.NOEVENTMASK)
+		if window and window != root:
+			X.select_input(self.dpy, window, X.PROPERTYCHANGEMASK)
+	
+	
+	def supports_events(self):
+		"""
+		Returns True if window manager sets _NET_ACTIVE_WINDOW property
+		on root window, so active window changes can be watched for.
+		"""
+		trash, prop = X.get_window_prop(self.dpy,
+			X.get_default_root_window(self.dpy), b"_NET_ACTIVE_WINDOW")
+		if prop is None or prop.value is None:
+			return False
+		X.free(prop)
+		return True
+	
+	
 	def run(self):
 		self.thread.start()
 		log.debug("AutoSwitcher started")
+		if self.supports_events():
+			self.run_events()
+		else:
+			log.debug("_NET_ACTIVE_WINDOW not supported, polling active window")
+			while self.exit_code is None:
+				self.check()
+				time.sleep(self.INTERVAL)
+		return 1
+	
+	
+	def run_events(self):
+		"""
+		Waits for XServer to report active window or its title being
+		changed. Doesn't wake up for anything else.
+		"""
+		root = X.get_default_root_window(self.dpy)
+		active = X.intern_atom(self.dpy, b"_NET_ACTIVE_WINDOW", False)
+		titles = set([ X.intern_atom(self.dpy, name.encode("utf-8"), False)
+			for name in self.TITLE_PROPERTIES ])
+		# Active window may be destroyed at any moment, making any request
+		# that uses it fail
+		X.ignore_errors()
+		self.watch_windows = True
+		X.select_input(self.dpy, root, X.PROPERTYCHANGEMASK)
+		fd = X.connection_number(self.dpy)
+		event = X.XEvent()
+		changed = True
 		while self.exit_code is None:
-			self.check()
-			time.sleep(self.INTERVAL)
+			if changed:
+				self.check()
+				changed = False
+			# pending() flushes requests, so it has to be called before
+			# waiting even if nothing was read
+			if not X.pending(self.dpy):
+				readable, trash, trash = select.select([ fd, self.waker ], [], [])
+				if self.waker in readable:
+					self.waker.clear()
+					changed = True
+			while X.pending(self.dpy):
+				X.next_event(self.dpy, byref(event))
+				if event.type == X.PROPERTYNOTIFY:
+					e = event.xproperty
+					if e.window == root and e.atom == active:
+						changed = True
+					elif e.window == self.current_window and e.atom in titles:
+						changed = True
 		return 1
 
 
@@ -253,6 +356,177 @@ class Condition(object):
 		return True
 
 
+class ConditionIndex(object):
+	"""
+	Finds first condition matching window faster than trying them one by
+	one, what matters with hundreds of conditions.
+	
+	Conditions with window class are looked up by class and conditions
+	with exact title by title. Remaining conditions matching part of title
+	or regexp are combined into few large regular expressions, where
+	every condition is one alternative wrapped in group. As alternatives
+	are tried in order, number of first matched group is number of
+	matching condition with highest priority. Groups used by regexps are
+	made non-capturing and regexps using different flags are combined
+	separately. Regexps with backreferences or with inline flags anywhere
+	but at start cannot be combined and are tried one by one.
+	Every found condition is checked using Condition.matches as well.
+	"""
+	# 're' module limits number of groups in one expression to 100
+	CHUNK_SIZE = 99
+	# Inline flags at start of regexp, converted to flags of combined one
+	RE_FLAGS = re.compile(r"^\(\?([iLmsux]+)\)")
+	
+	def __init__(self, conds):
+		"""
+		'conds' is dict of condition -> profile. If it's ordered, earlier
+		conditions have priority over later ones.
+		"""
+		self.conds = conds
+		self.by_class = {}		# wm_class -> [ (priority, condition) ]
+		self.by_title = {}		# exact_title -> [ (priority, condition) ]
+		self.chunks = []		# [ [ (regexp, [ (priority, condition) ]) ] ], one list per flags
+		self.others = []		# [ (priority, condition) ]
+		patterns = OrderedDict()	# flags -> [ (pattern, (priority, condition)) ]
+		for item in enumerate(conds):
+			priority, c = item
+			if c.empty:
+				continue
+			elif c.wm_class:
+				self.by_class.setdefault(c.wm_class, []).append(item)
+			elif c.exact_title:
+				self.by_title.setdefault(c.exact_title, []).append(item)
+			else:
+				pattern, flags = ConditionIndex._pattern(c)
+				if pattern is None:
+					self.others.append(item)
+				else:
+					patterns.setdefault(flags, []).append(( pattern, item ))
+		for flags in patterns:
+			self.chunks.append(self._compile(patterns[flags], flags))
+	
+	
+	def _compile(self, patterns, flags):
+		""" Combines patterns into as few regular expressions as possible """
+		rv = []
+		for i in xrange(0, len(patterns), self.CHUNK_SIZE):
+			chunk = patterns[i:i + self.CHUNK_SIZE]
+			try:
+				regexp = re.compile("|".join([ "(%s)" % (p,) for p, item in chunk ]), flags)
+			except (re.error, OverflowError, RuntimeError), e:
+				log.warning("Failed to combine autoswitcher conditions: %s", e)
+				self.others += [ item for p, item in chunk ]
+				continue
+			rv.append(( regexp, [ item for p, item in chunk ] ))
+		return rv
+	
+	
+	@staticmethod
+	def _pattern(c):
+		"""
+		Returns (pattern, flags), where pattern is regular expression that
+		matches title where condition matches. Returns (None, None) if that
+		cannot be combined with others.
+		"""
+		pattern, flags = "", 0
+		if c.title:
+			pattern = r"(?=[\s\S]*?%s)" % (re.escape(c.title),)
+		if c.regexp:
+			regexp = c.regexp.pattern
+			m = ConditionIndex.RE_FLAGS.match(regexp)
+			if m:
+				regexp = regexp[m.end():]
+			if c.regexp.groups:
+				regexp = ConditionIndex._strip_groups(regexp)
+				if regexp is None:
+					return None, None
+			if re.search(r"\(\?[a-zA-Z]", regexp):
+				# Inline flags elsewhere would apply to whole combined expression
+				return None, None
+			flags = c.regexp.flags
+			if c.title and flags & ~re.U:
+				# Flags would apply to title as well
+				return None, None
+			pattern += "(?:%s)" % (regexp,)
+		return pattern, flags
+	
+	
+	@staticmethod
+	def _strip_groups(pattern):
+		"""
+		Returns regexp with all capturing groups changed to non-capturing
+		or None if regexp uses backreferences.
+		"""
+		rv, i = [], 0
+		while i < len(pattern):
+			ch = pattern[i]
+			if ch == "\\":
+				if pattern[i+1:i+2].isdigit():
+					return None
+				rv.append(pattern[i:i+2])
+				i += 2
+			elif ch == "[":
+				# Character class, copied as it is. ']' right after '[' or
+				# '[^' is part of class
+				end = i + 1
+				if pattern[end:end+1] == "^": end += 1
+				if pattern[end:end+1] == "]": end += 1
+				while end < len(pattern) and pattern[end] != "]":
+					end += 2 if pattern[end] == "\\" else 1
+				rv.append(pattern[i:end+1])
+				i = end + 1
+			elif pattern.startswith("(?P<", i):
+				end = pattern.find(">", i)
+				if end < 0:
+					return None
+				rv.append("(?:")
+				i = end + 1
+			elif pattern.startswith("(?P=", i) or pattern.startswith("(?(", i):
+				# Named backreference or conditional
+				return None
+			elif ch == "(" and not pattern.startswith("(?", i):
+				rv.append("(?:")
+				i += 1
+			else:
+				rv.append(ch)
+				i += 1
+		rv = "".join(rv)
+		try:
+			if re.compile(rv).groups > 0:
+				return None
+		except re.error:
+			return None
+		return rv
+	
+	
+	def find(self, window_title, wm_class):
+		"""
+		Returns first condition that matches provided window properties
+		or None if nothing matches.
+		
+		wm_class is what xwrappers.get_window_class returns, tuple of two strings.
+		"""
+		window_title = window_title or ""
+		candidates = []
+		for key in set(wm_class):
+			candidates += self.by_class.get(key, [])
+		candidates += self.by_title.get(window_title, [])
+		for chunks in self.chunks:
+			for regexp, items in chunks:
+				m = regexp.match(window_title)
+				if m:
+					candidates.append(items[m.lastindex - 1])
+					# Chunks are ordered by priority, anything matched by
+					# later chunk can't win
+					break
+		candidates += self.others
+		candidates.sort()
+		for priority, c in candidates:
+			if c.matches(window_title, wm_class):
+				return c
+		return None
+
+
 class AutoswitchOptsMenuGenerator(MenuGenerator):
 	""" Generates entire Autoswich Options submenu """
 	GENERATOR_NAME = "autoswitch"
@@ -272,7 +546,7 @@ class AutoswitchOptsMenuGenerator(MenuGenerator):
 						profile = profile[0:-11]
 					AutoSwitcher.unassign(self.conds, self.title, self.wm_class, None)
 					AutoSwitcher.assign(self.conds, self.title, self.wm_class, profile)
-			cfg = Config()
+			cfg = Config.shared()
 			cfg["autoswitch"] = [
 				dict(
 					condition = c.encode(),
@@ -301,7 +575,7 @@ class AutoswitchOptsMenuGenerator(MenuGenerator):
 		self.title = X.get_window_title(menuhandler.xdisplay, win)
 		self.wm_class = X.get_window_class(menuhandler.xdisplay, win)
 		self.assigned_prof = None
-		self.conds = AutoSwitcher.parse_conditions(Config())
+		self.conds = AutoSwitcher.parse_conditions(Config.shared())
 		if self.title and "-" in self.title:
 			self.title = self.title.split("-")[-1]
 		for c in self.conds:
@@ -53,7 +53,7 @@ class OSDDaemon(object):
 	
 	def on_daemon_reconfigured(self, *a):
 		log.debug("Reloading config...")
-		self.config.reload()
+		self.config = Config.shared()
 		self._check_colorconfig_change()
 	
 	
@@ -81,7 +81,8 @@ class OSDDaemon(object):
 			if len(recents) > self.config['recent_max']:
 				recents = recents[0:self.config['recent_max']]
 			self.config['recent_profiles'] = recents
-			self.config.save()
+			# Saved with delay, profile may be changed again soon
+			self.config.save_later()
 			log.debug("Updated recent profile list")
 	
 	
@@ -206,7 +207,7 @@ class OSDDaemon(object):
 	
 	def run(self):
 		self.daemon = DaemonManager()
-		self.config = Config()
+		self.config = Config.shared()
 		self._check_colorconfig_change()
 		self.daemon.connect('alive', self.on_daemon_connected)
 		self.daemon.connect('dead', self.on_daemon_died)
@@ -0,0 +1,12 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def cache_home(monkeypatch, tmpdir):
+	"""
+	Points XDG_CACHE_HOME to temporary directory, so profiles and menus
+	loaded by tests are not cached in user's home. Returns its path.
+	"""
+	path = str(tmpdir.mkdir("cache"))
+	monkeypatch.setenv("XDG_CACHE_HOME", path)
+	return path
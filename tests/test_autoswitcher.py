@@ -0,0 +1,173 @@
+from scc.x11 import autoswitcher
+from scc.x11.autoswitcher import AutoSwitcher, Condition, ConditionIndex
+from scc.config import Config
+from collections import OrderedDict
+import tempfile, shutil, os
+
+
+class FakeSocket(object):
+	def __init__(self):
+		self.sent = []
+	
+	def send(self, data):
+		self.sent.append(data)
+
+
+class TestAutoSwitcher(object):
+	
+	def setup_method(self, method):
+		self.path = tempfile.mkdtemp()
+		os.environ["XDG_CONFIG_HOME"] = self.path
+		Config._shared = None
+	
+	
+	def teardown_method(self, method):
+		del os.environ["XDG_CONFIG_HOME"]
+		shutil.rmtree(self.path)
+		Config._shared = None
+	
+	
+	def _make(self, monkeypatch, watch_windows):
+		"""
+		Returns AutoSwitcher using fake X. Active window and its titles
+		are taken from self.window and self.titles.
+		"""
+		X = autoswitcher.X
+		self.window = 10
+		self.titles = { 10 : "Terminal", 11 : "Game" }
+		self.selected = []
+		monkeypatch.setenv("DISPLAY", ":0")
+		monkeypatch.setattr(X, "open_display", lambda *a: None)
+		monkeypatch.setattr(X, "get_default_root_window", lambda *a: 1)
+		monkeypatch.setattr(X, "get_current_window", lambda *a: self.window)
+		monkeypatch.setattr(X, "get_window_title", lambda dpy, w: self.titles[w])
+		monkeypatch.setattr(X, "get_window_class", lambda dpy, w: ("x", "X"))
+		monkeypatch.setattr(X, "select_input",
+			lambda dpy, w, mask: self.selected.append(( w, mask )))
+		monkeypatch.setattr(autoswitcher, "find_profile", lambda name: "/" + name)
+		a = AutoSwitcher()
+		a.config["autoswitch_osd"] = False
+		a.socket = FakeSocket()
+		a.current_profile = "/Desktop"
+		a.watch_windows = watch_windows
+		a.conds = { Condition(title="Game") : "Game" }
+		a.index = ConditionIndex(a.conds)
+		return a
+	
+	
+	def test_window_switch(self, monkeypatch):
+		"""
+		Tests if profile is switched when matching window becomes active.
+		"""
+		a = self._make(monkeypatch, False)
+		a.check()
+		assert a.socket.sent == []
+		self.window = 11
+		a.check()
+		assert a.socket.sent == [ b"Profile: /Game\n" ]
+		assert self.selected == []
+	
+	
+	def test_title_change(self, monkeypatch):
+		"""
+		Tests if title change is checked only when property changes are
+		watched and if watched window follows active window.
+		"""
+		a = self._make(monkeypatch, False)
+		a.check()
+		self.titles[10] = "Game"
+		a.check()
+		assert a.socket.sent == []
+		
+		a = self._make(monkeypatch, True)
+		a.check()
+		assert self.selected == [ (10, autoswitcher.X.PROPERTYCHANGEMASK) ]
+		self.titles[10] = "Game"
+		a.check()
+		assert a.socket.sent == [ b"Profile: /Game\n" ]
+		self.window = 11
+		a.check()
+		assert self.selected[1:] == [ (10, autoswitcher.X.NOEVENTMASK),
+			(11, autoswitcher.X.PROPERTYCHANGEMASK) ]
+	
+	
+	def test_unchanged(self, monkeypatch):
+		"""
+		Tests if profile changed by user is not switched back while
+		active window and its title stay same.
+		"""
+		a = self._make(monkeypatch, True)
+		self.window = 11
+		a.check()
+		a.current_profile = "/Desktop"
+		a.check()
+		assert a.socket.sent == [ b"Profile: /Game\n" ]
+
+
+class TestConditionIndex(object):
+	
+	def _index(self, *conds):
+		return ConditionIndex(OrderedDict([ (c, "p%s" % (i,))
+			for (i, c) in enumerate(conds) ]))
+	
+	
+	def test_priority(self):
+		"""
+		Tests if first matching condition is found, no matter how it
+		is matched.
+		"""
+		conds = [
+			Condition(regexp="Doom.*"),
+			Condition(wm_class="gzdoom"),
+			Condition(title="Doom"),
+		]
+		index = self._index(*conds)
+		assert index.find("Doom II", ("gzdoom", "GZDoom")) is conds[0]
+		assert index.find("Ultimate Doom", ("gzdoom", "GZDoom")) is conds[1]
+		assert index.find("Ultimate Doom", ("x", "X")) is conds[2]
+		assert index.find("Quake", ("quake", "Quake")) is None
+		index = self._index(*reversed(conds))
+		assert index.find("Doom II", ("gzdoom", "GZDoom")) is conds[2]
+	
+	
+	def test_combined(self):
+		"""
+		Tests conditions that combine more ways of matching.
+		"""
+		a = Condition(title="Episode", wm_class="Steam")
+		b = Condition(exact_title="Game", title="Game")
+		c = Condition(title="Game", regexp="Super")
+		index = self._index(a, b, c)
+		assert index.find("Episode 1", ("steam", "Steam")) is a
+		assert index.find("Episode 1", ("x", "X")) is None
+		assert index.find("Game", ("x", "X")) is b
+		assert index.find("Super Game", ("x", "X")) is c
+		assert index.find("Game Super", ("x", "X")) is None
+	
+	
+	def test_regexps(self):
+		"""
+		Tests if regexps with groups, backreferences and flags match same
+		titles as when used alone.
+		"""
+		regexps = [ r"(?i)super (\w+)", r"(a|b)\1", r"(?P<x>c)(?P=x)",
+			r"[(]d(?:e)", r"f[]x(]+(?P<y>g)", r"h\(i\)", r"(?s)j.k" ]
+		conds = [ Condition(regexp=r) for r in regexps ]
+		index = self._index(*conds)
+		titles = [ "SUPER game", "aa", "ab", "cc", "(de", "f](g", "f]", "h(i)",
+			"j\nk", "nothing" ]
+		for t in titles:
+			expected = [ c for c in conds if c.matches(t, ("x", "X")) ]
+			assert index.find(t, ("x", "X")) is (expected[0] if expected else None), t
+	
+	
+	def test_many(self):
+		"""
+		Tests conditions that don't fit into one combined expression.
+		"""
+		conds = [ Condition(title="Game %s " % (i,)) for i in xrange(250) ]
+		index = self._index(*conds)
+		assert len(index.chunks[0]) == 3
+		assert index.find("Game 249 ", ("x", "X")) is conds[249]
+		assert index.find("Game 120 ", ("x", "X")) is conds[120]
+		assert index.find("Game 250 ", ("x", "X")) is None
@@ -0,0 +1,87 @@
+from scc.config import Config
+import tempfile, shutil, json, time, os
+
+
+class TestConfig(object):
+	
+	def setup_method(self, method):
+		self.path = tempfile.mkdtemp()
+		os.environ["XDG_CONFIG_HOME"] = self.path
+		Config._shared = None
+	
+	
+	def teardown_method(self, method):
+		del os.environ["XDG_CONFIG_HOME"]
+		shutil.rmtree(self.path)
+		Config._shared = None
+	
+	
+	def _write(self, values):
+		""" Writes config file as other process would """
+		filename = os.path.join(self.path, "scc", "config.json")
+		with open(filename + ".tmp", "w") as f:
+			f.write(json.dumps(values))
+		os.rename(filename + ".tmp", filename)
+	
+	
+	def test_shared(self):
+		"""
+		Tests if shared instance is reloaded only when file is changed.
+		"""
+		c = Config.shared()
+		assert Config.shared() is c
+		c["recent_max"] = 3
+		# Not saved, so not reloaded
+		assert Config.shared()["recent_max"] == 3
+		values = dict(c.values)
+		values["recent_max"] = 5
+		self._write(values)
+		assert Config.shared() is c
+		assert c["recent_max"] == 5
+	
+	
+	def test_save(self):
+		"""
+		Tests if saving leaves no temporary files behind and doesn't
+		cause shared instance to reload.
+		"""
+		c = Config.shared()
+		c["recent_max"] = 7
+		c.save()
+		assert not c.is_changed()
+		assert os.listdir(os.path.join(self.path, "scc")) == [ "config.json" ]
+		assert Config()["recent_max"] == 7
+	
+	
+	def test_save_later(self):
+		"""
+		Tests if multiple changes saved using save_later are written once.
+		"""
+		c = Config.shared()
+		c.SAVE_DELAY = 0.05
+		saves = []
+		save, c.save = c.save, lambda: saves.append(1) or save()
+		for i in xrange(5):
+			c["recent_max"] = i
+			c.save_later()
+		time.sleep(0.2)
+		assert len(saves) == 1
+		assert Config()["recent_max"] == 4
+	
+	
+	def test_save_later_not_reloaded(self):
+		"""
+		Tests if change waiting to be saved by save_later is not lost
+		when file is changed by another process meanwhile.
+		"""
+		c = Config.shared()
+		c.SAVE_DELAY = 0.05
+		c["recent_profiles"] = [ "A" ]
+		c.save_later()
+		values = dict(c.values)
+		values["recent_max"] = 5
+		self._write(values)
+		assert Config.shared()["recent_profiles"] == [ "A" ]
+		time.sleep(0.2)
+		assert not c.is_save_pending()
+		assert Config()["recent_profiles"] == [ "A" ]
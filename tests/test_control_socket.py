@@ -0,0 +1,215 @@
+from scc.control_socket import ClientQueue, ControlServer
+import tempfile, threading, socket, shutil, time, os
+
+
+class TestClientQueue(object):
+
+	def test_coalescing(self):
+		"""
+		Tests if only latest analog event is kept for every source,
+		while other messages are kept in order.
+		"""
+		q = ClientQueue()
+		q.write(b"OK.\n")
+		q.put_event(b"Event: A 1\n")
+		for x in xrange(10):
+			q.put_event(b"Event: LEFT %s 0\n" % (x,), "LEFT")
+		q.put_event(b"Event: A 0\n")
+		assert q.pop(time.time()) == b"OK.\nEvent: A 1\nEvent: LEFT 9 0\nEvent: A 0\n"
+		assert q.pop(time.time()) == b""
+		assert q.coalesced == 9
+		assert q.dropped == 0
+	
+	
+	def test_bounded(self):
+		"""
+		Tests if events over queue size are dropped, but other messages are not.
+		"""
+		q = ClientQueue(max_size=5)
+		for x in xrange(10):
+			q.put_event(b"Event: A 1\n")
+		q.write(b"OK.\n")
+		assert q.pop(time.time()) == b"Event: A 1\n" * 5 + b"OK.\n"
+		assert q.dropped == 5
+	
+	
+	def test_rate(self):
+		"""
+		Tests if events are not sent faster than allowed and if analog
+		events are coalesced while waiting.
+		"""
+		q = ClientQueue(max_rate=100)
+		q.put_event(b"Event: A 1\n")
+		q.put_event(b"Event: A 0\n")
+		assert q.pop(10.0) == b"Event: A 1\nEvent: A 0\n"
+		q.put_event(b"Event: LT 1 0\n", "LT")
+		q.put_event(b"Event: LT 2 1\n", "LT")
+		# Two events were sent, so next ones have to wait for 1/50s
+		assert q.next_send() == 10.02
+		assert q.pop(10.01) == b""
+		assert q.pop(10.02) == b"Event: LT 2 1\n"
+	
+	
+	def test_rate_responses(self):
+		"""
+		Tests if responses are sent right away even while events
+		are waiting for event rate limit.
+		"""
+		q = ClientQueue(max_rate=100)
+		q.put_event(b"Event: A 1\n")
+		q.put_event(b"Event: A 0\n")
+		assert q.pop(10.0) == b"Event: A 1\nEvent: A 0\n"
+		q.put_event(b"Event: LT 1 0\n", "LT")
+		q.write(b"OK.\n")
+		q.put_event(b"Event: LT 2 1\n", "LT")
+		assert q.next_send() == 0
+		assert q.pop(10.01) == b"OK.\n"
+		assert q.next_send() == 10.02
+		assert q.pop(10.01) == b""
+		assert q.pop(10.02) == b"Event: LT 2 1\n"
+		assert q.coalesced == 1
+
+
+class TestControlServer(object):
+
+	def test_server(self):
+		"""
+		Tests if messages are split into lines and responses and events
+		are delivered, all while server runs in single thread.
+		"""
+		path = tempfile.mkdtemp()
+		clients, messages = [], []
+		def on_connect(sock):
+			client = type(b"Client", (object,), {})()
+			client.wfile = ClientQueue()
+			client.wfile.write(b"Ready.\n")
+			clients.append(client)
+			return client
+		def on_message(client, line):
+			messages.append(line)
+			client.wfile.write(b"OK.\n")
+		def on_disconnect(client):
+			clients.remove(client)
+		server = ControlServer(os.path.join(path, "socket"),
+			on_connect, on_message, on_disconnect)
+		t = threading.Thread(target=server.serve_forever)
+		t.start()
+		try:
+			s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+			s.settimeout(1)
+			s.connect(os.path.join(path, "socket"))
+			f = s.makefile()
+			assert f.readline() == b"Ready.\n"
+			# Two messages in one packet, one split into two
+			s.sendall(b"Profile: a\nLock: A\n\nUnl")
+			assert f.readline() == b"OK.\n"
+			assert f.readline() == b"OK.\n"
+			s.sendall(b"ock.\n")
+			assert f.readline() == b"OK.\n"
+			assert messages == [ b"Profile: a", b"Lock: A", b"Unlock." ]
+			# Event sent from another thread
+			clients[0].wfile.put_event(b"Event: A 1\n")
+			assert f.readline() == b"Event: A 1\n"
+			f.close()
+			s.close()
+			for i in xrange(100):
+				if not clients: break
+				time.sleep(0.01)
+			assert clients == []
+		finally:
+			server.shutdown()
+			t.join(1)
+			shutil.rmtree(path)
+		assert not t.is_alive()
+	
+	
+	def test_failing_handler(self):
+		"""
+		Tests if exception raised while handling message is reported only
+		to client that sent it and server keeps serving everyone.
+		"""
+		path = tempfile.mkdtemp()
+		def on_connect(sock):
+			client = type(b"Client", (object,), {})()
+			client.wfile = ClientQueue()
+			return client
+		def on_message(client, line):
+			if line == b"Bad.":
+				raise ValueError(line)
+			client.wfile.write(b"OK.\n")
+		server = ControlServer(os.path.join(path, "socket"),
+			on_connect, on_message, lambda client: None)
+		t = threading.Thread(target=server.serve_forever)
+		t.start()
+		try:
+			files = []
+			for i in xrange(2):
+				s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+				s.settimeout(1)
+				s.connect(os.path.join(path, "socket"))
+				files.append((s, s.makefile()))
+			(s1, f1), (s2, f2) = files
+			s1.sendall(b"Bad.\nLock: A\n")
+			assert f1.readline().startswith(b"Fail: ")
+			assert f1.readline() == b"OK.\n"
+			s2.sendall(b"Lock: A\n")
+			assert f2.readline() == b"OK.\n"
+			assert t.is_alive()
+			for s, f in files:
+				f.close()
+				s.close()
+		finally:
+			server.shutdown()
+			t.join(1)
+			shutil.rmtree(path)
+		assert not t.is_alive()
+	
+	
+	def test_hold(self):
+		"""
+		Tests if messages received while client's queue is held are
+		handled only after it's released, so responses stay in order.
+		"""
+		path = tempfile.mkdtemp()
+		clients = []
+		def on_connect(sock):
+			client = type(b"Client", (object,), {})()
+			client.wfile = ClientQueue()
+			clients.append(client)
+			return client
+		def on_message(client, line):
+			if line == b"Slow.":
+				client.wfile.hold()
+				return
+			client.wfile.write(b"OK.\n")
+		server = ControlServer(os.path.join(path, "socket"),
+			on_connect, on_message, lambda client: None)
+		t = threading.Thread(target=server.serve_forever)
+		t.start()
+		try:
+			s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+			s.settimeout(1)
+			s.connect(os.path.join(path, "socket"))
+			f = s.makefile()
+			s.sendall(b"Slow.\nLock: A\n")
+			s.sendall(b"Unlock.\n")
+			s.settimeout(0.1)
+			try:
+				f.readline()
+				assert False, "Response sent while held"
+			except socket.timeout:
+				pass
+			s.settimeout(1)
+			# Released from another thread, as daemon does
+			clients[0].wfile.write(b"Done.\n")
+			clients[0].wfile.release()
+			assert f.readline() == b"Done.\n"
+			assert f.readline() == b"OK.\n"
+			assert f.readline() == b"OK.\n"
+			f.close()
+			s.close()
+		finally:
+			server.shutdown()
+			t.join(1)
+			shutil.rmtree(path)
+		assert not t.is_alive()
@@ -0,0 +1,66 @@
+from scc.constants import ControllerInput, ControllerState, CI_STRUCT
+from scc.constants import CI_NAMES, SCI_NULL
+from scc.controller import SCController
+import random, gc
+
+def random_packet(seq):
+	""" Generates 64b packet with random (but valid) values """
+	return CI_STRUCT.pack(1, 1, seq & 0xFFFF, random.randint(0, 0x1FFFFFFF),
+		random.randint(0, 255), random.randint(0, 255),
+		*[ random.randint(-32768, 32767) for x in xrange(11) ]
+	)
+
+
+class TestControllerState(object):
+
+	def test_null(self):
+		"""
+		Tests if freshly created ControllerState equals to SCI_NULL.
+		"""
+		s = ControllerState()
+		for name in CI_NAMES:
+			assert getattr(s, name) == getattr(SCI_NULL, name)
+
+
+	def test_decode(self):
+		"""
+		Tests if ControllerState decodes packet to same values
+		as ControllerInput does.
+		"""
+		s = ControllerState()
+		for i in xrange(100):
+			data = random_packet(i)
+			tup = ControllerInput._make(CI_STRUCT.unpack(data))
+			assert s.decode(data) is s
+			for name in CI_NAMES:
+				assert getattr(s, name) == getattr(tup, name)
+
+
+	def test_no_allocations(self):
+		"""
+		Tests if SCController passes same two ControllerState instances
+		to callback over and over and if decoding packets creates no new
+		objects tracked by gc, even when callback keeps every state it
+		receives.
+		"""
+		received = []
+		c = SCController.__new__(SCController)
+		c._init_state(lambda c, now, state: received.append(state))
+		packets = [ random_packet(i) for i in xrange(1000) ]
+		# Warm-up
+		for data in packets:
+			c._processPacket(data)
+		del received[:]
+		
+		gc.collect()
+		gc.disable()
+		try:
+			before = len(gc.get_objects())
+			for data in packets:
+				c._processPacket(data)
+			after = len(gc.get_objects())
+		finally:
+			gc.enable()
+		assert len(received) == len(packets)
+		assert set(map(id, received)) == set(map(id, c._states))
+		assert after == before
@@ -0,0 +1,73 @@
+from scc.parser import ActionParser
+from scc.menu_data import MenuData
+from scc.profile import Profile
+from scc.constants import SCButtons
+from scc import disk_cache
+import shutil, os
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+DESKTOP = os.path.join(ROOT, "default_profiles", "Desktop.sccprofile")
+GZDOOM = os.path.join(ROOT, "profile_examples", "GZDoom.sccprofile")
+
+
+class TestDiskCache(object):
+
+	def test_cached(self, cache_home):
+		"""
+		Tests if build is called only when there is nothing valid cached.
+		"""
+		calls = []
+		def build():
+			calls.append(1)
+			return { "a" : [ 1, 2 ] }
+		parser = ActionParser()
+		assert disk_cache.cached("test", DESKTOP, parser, build) == { "a" : [ 1, 2 ] }
+		assert disk_cache.cached("test", DESKTOP, parser, build) == { "a" : [ 1, 2 ] }
+		assert len(calls) == 1
+		# Different kind
+		disk_cache.cached("test2", DESKTOP, parser, build)
+		assert len(calls) == 2
+		# Modified file
+		filename = os.path.join(cache_home, "test.sccprofile")
+		shutil.copy(DESKTOP, filename)
+		disk_cache.cached("test", filename, parser, build)
+		os.utime(filename, (1, 1))
+		disk_cache.cached("test", filename, parser, build)
+		assert len(calls) == 4
+	
+	
+	def test_profile(self, cache_home):
+		"""
+		Tests if profile loaded from cache is same as parsed one.
+		"""
+		a = Profile(ActionParser()).load(GZDOOM)
+		assert len(os.listdir(os.path.join(cache_home, "scc"))) == 1
+		b = Profile(ActionParser()).load(GZDOOM)
+		assert a.stick is not b.stick
+		for x in SCButtons:
+			assert a.buttons[x].to_string() == b.buttons[x].to_string()
+		assert sorted(a.menus.keys()) == sorted(b.menus.keys())
+		assert b.button_actions[SCButtons.Y] is b.buttons[SCButtons.Y]
+	
+	
+	def test_menu(self):
+		"""
+		Tests if menu loaded from cache is same as parsed one.
+		"""
+		a = MenuData.from_profile(GZDOOM, "Cheats", ActionParser())
+		b = MenuData.from_profile(GZDOOM, "Cheats", ActionParser())
+		assert a is not b
+		assert len(a) > 0
+		assert [ x.id for x in a ] == [ x.id for x in b ]
+		assert [ x.action.to_string() for x in a ] == [ x.action.to_string() for x in b ]
+	
+	
+	def test_code_mtime(self):
+		"""
+		Tests if modules in subpackages are considered when checking
+		if code was changed.
+		"""
+		lib = os.path.join(ROOT, "scc", "lib")
+		newest = max([ os.path.getmtime(os.path.join(lib, x))
+			for x in os.listdir(lib) if x.endswith(".py") ])
+		assert disk_cache._get_code_mtime() >= newest
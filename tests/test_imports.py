@@ -0,0 +1,55 @@
+from scc.parser import ActionParser
+
+import os, sys, subprocess
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+# Modules that take long to import and are needed only to parse or run
+# actions
+HEAVY = ( "scc.actions", "scc.parser", "scc.profile", "scc.uinput",
+	"scc.controller" )
+
+
+def _import(module):
+	"""
+	Imports module in new python process.
+	Returns time it took, in ms, and list of imported scc modules.
+	"""
+	code = ("import sys, time; t = time.time(); import %s; t = time.time() - t; "
+		"print(t * 1000.0); print(' '.join([ x for x in sys.modules "
+		"if x.startswith('scc') and sys.modules[x] ]))" % (module,))
+	out = subprocess.check_output([ sys.executable, "-c", code ], cwd=ROOT)
+	t, modules = out.strip().split("\n")
+	return float(t), modules.split(" ")
+
+
+class TestImports(object):
+	
+	def test_config(self, record_property):
+		"""
+		Tests if importing scc.config doesn't import parser, actions and
+		everything they need. Measured import time is recorded as
+		'import_ms' property.
+		"""
+		t, modules = _import("scc.config")
+		record_property("import_ms", t)
+		for m in HEAVY:
+			assert m not in modules, "%s imported by scc.config" % (m,)
+	
+	
+	def test_paths(self, record_property):
+		"""
+		Tests if importing scc.paths imports nothing else from scc.
+		"""
+		t, modules = _import("scc.paths")
+		record_property("import_ms", t)
+		assert set(modules) == { "scc", "scc.paths" }
+	
+	
+	def test_lazy_constants(self):
+		"""
+		Tests if constants used by parser are built on first use.
+		"""
+		ActionParser.CONSTS = None
+		assert ActionParser("button(KEY_A)").parse().to_string() == "button(Keys.KEY_A)"
+		assert ActionParser.CONSTS is not None
+		assert ActionParser.get_constants() is ActionParser.CONSTS
@@ -0,0 +1,53 @@
+from scc.parser import ActionParser
+
+STRINGS = [
+	"button(KEY_A)",
+	"axis(ABS_X, -32768, 32767)",
+	"mouse(REL_X, 0.5) and mouse(REL_Y, -.25)",
+	"sens(1.0e-2, 1e3, 0x10, mouse())",
+	"type('hello world')",
+	"osd('It\\'s \"quoted\"')",
+	"osd(u'unicode', r'raw\\n')",
+	"button(KEY_A); button(KEY_B)",
+	"hold(button(KEY_A), button(KEY_B)).repeat()",
+	"mode(A, button(KEY_A), B, button(KEY_B))",
+	"button(KEY_A) -= 5 * 2",
+	"  button(KEY_A)",
+	"button(\n\tKEY_A)",
+	"osd('''triple''')",
+	"button(KEY_A",
+	"osd('unterminated)",
+	"",
+]
+
+class TestLexer(object):
+	
+	def test_same_tokens(self):
+		"""
+		Tests if ActionParser's own lexer splits strings to same tokens
+		as tokenize module does, or refuses to handle them.
+		"""
+		for s in STRINGS:
+			tokens = ActionParser._fast_tokenize(s)
+			if tokens is not None:
+				assert tokens == ActionParser._tokenize(s), s
+	
+	
+	def test_fallback(self):
+		"""
+		Tests if multi-line strings and strings with leading whitespace
+		are left for tokenize module.
+		"""
+		assert ActionParser._fast_tokenize("  button(KEY_A)") is None
+		assert ActionParser._fast_tokenize("button(\n\tKEY_A)") is None
+		p = ActionParser("button(\n\tKEY_A)")
+		assert p.parse().to_string() == "button(Keys.KEY_A)"
+	
+	
+	def test_handled(self):
+		"""
+		Tests if common actions are handled without falling back to
+		tokenize module.
+		"""
+		for s in STRINGS[0:10]:
+			assert ActionParser._fast_tokenize(s) is not None, s
@@ -0,0 +1,78 @@
+from scc.parser import ActionParser, ParseCache
+from scc.actions import ButtonAction
+from . import parser
+
+class TestParseCache(object):
+	
+	def test_copies(self):
+		"""
+		Tests if parsing same data twice returns equal, but not same action.
+		"""
+		ActionParser.CACHE.clear()
+		data = { "action" : "button(KEY_A)", "name" : "A" }
+		a = parser.from_json_data(data)
+		b = parser.from_json_data(dict(data))
+		assert a is not b
+		assert a.to_string() == b.to_string()
+		assert a.name == b.name == "A"
+		assert len(ActionParser.CACHE) == 1
+	
+	
+	def test_decoders_in_key(self):
+		"""
+		Tests if keys handled by decoders are part of cache key.
+		"""
+		ActionParser.CACHE.clear()
+		a = parser.from_json_data({ "action" : "button(KEY_A)", "name" : "A" })
+		b = parser.from_json_data({ "action" : "button(KEY_A)", "name" : "B" })
+		assert a.name == "A" and b.name == "B"
+	
+	
+	def test_types_in_key(self):
+		"""
+		Tests if values that are equal, but of different type, are
+		not cached as same thing.
+		"""
+		key = ActionParser._cache_key
+		assert key({ "sensitivity" : [ 1, 1 ] }) != key({ "sensitivity" : [ 1.0, 1 ] })
+		assert key({ "deadzone" : 1 }) != key({ "deadzone" : True })
+		assert key({ "deadzone" : 1 }) == key({ "deadzone" : 1 })
+	
+	
+	def test_nested(self):
+		"""
+		Tests if data with nested actions is not cached as whole, but
+		actions nested in it are.
+		"""
+		ActionParser.CACHE.clear()
+		data = { "dpad" : [ { "action" : "button(KEY_UP)" },
+			{ "action" : "button(KEY_DOWN)" } ] }
+		a = parser.from_json_data(data)
+		b = parser.from_json_data(data)
+		assert a is not b and a.to_string() == b.to_string()
+		assert len(ActionParser.CACHE) == 2
+	
+	
+	def test_size(self):
+		"""
+		Tests if cache drops least recently used actions.
+		"""
+		cache = ParseCache(2)
+		cache.put("a", ButtonAction(1))
+		cache.put("b", ButtonAction(2))
+		assert cache.get("a") is not None
+		cache.put("c", ButtonAction(3))
+		assert len(cache) == 2
+		assert cache.get("b") is None
+		assert cache.get("a").button == 1
+	
+	
+	def test_unpicklable(self):
+		"""
+		Tests if action that cannot be pickled is not cached.
+		"""
+		cache = ParseCache(2)
+		a = ButtonAction(1)
+		a.callback = lambda *a: None
+		cache.put("a", a)
+		assert cache.get("a") is None
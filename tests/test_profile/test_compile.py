@@ -0,0 +1,56 @@
+from scc.constants import SCButtons, LEFT
+from scc.actions import NoAction, ButtonAction
+from scc.uinput import Keys
+from scc.profile import Profile
+from . import parser
+import os
+
+DESKTOP = os.path.join(os.path.dirname(__file__), "..", "..",
+	"default_profiles", "Desktop.sccprofile")
+
+
+class TestCompile(object):
+
+	def test_empty(self):
+		"""
+		Tests if freshly created profile has nothing in lookup tables.
+		"""
+		p = Profile(parser)
+		assert p.button_actions == {}
+		assert not p.has_stick
+		assert not p.has_triggers
+		assert not p.has_pads
+		assert not p.has_gyro
+
+
+	def test_load(self):
+		"""
+		Tests if loaded profile has lookup tables prepared and
+		if button_actions contains every button that has action set.
+		"""
+		p = Profile(parser).load(DESKTOP)
+		p.compress()
+		for x in SCButtons:
+			if p.buttons[x]:
+				assert p.button_actions[int(x)] is p.buttons[x]
+			else:
+				assert int(x) not in p.button_actions
+		assert p.has_stick
+		assert p.has_triggers
+		assert p.has_pads
+		assert not p.has_gyro
+
+
+	def test_recompile(self):
+		"""
+		Tests if compile() picks up changed actions.
+		"""
+		p = Profile(parser)
+		p.buttons[SCButtons.A] = ButtonAction(Keys.BTN_A)
+		p.triggers[LEFT] = ButtonAction(Keys.BTN_B)
+		p.compile()
+		assert p.button_actions.keys() == [ int(SCButtons.A) ]
+		assert p.has_triggers
+		p.buttons[SCButtons.A] = NoAction()
+		p.compile()
+		assert p.button_actions == {}
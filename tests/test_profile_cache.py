@@ -0,0 +1,58 @@
+from scc.profile_cache import ProfileCache
+from scc.parser import ActionParser
+from scc.constants import SCButtons
+import tempfile, shutil, os
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+DESKTOP = os.path.join(ROOT, "default_profiles", "Desktop.sccprofile")
+XBOX = os.path.join(ROOT, "default_profiles", "XBox Controller.sccprofile")
+
+
+class TestProfileCache(object):
+
+	def test_hit(self):
+		"""
+		Tests if cached profile is returned as new copy, with same actions.
+		"""
+		cache = ProfileCache(ActionParser())
+		a = cache.get(DESKTOP)
+		b = cache.get(DESKTOP)
+		assert (cache.hits, cache.misses) == (1, 1)
+		assert a is not b
+		assert a.stick is not b.stick
+		for x in SCButtons:
+			assert a.buttons[x].to_string() == b.buttons[x].to_string()
+		for x in a.pads:
+			assert a.pads[x].to_string() == b.pads[x].to_string()
+		assert b.button_actions[SCButtons.A] is b.buttons[SCButtons.A]
+	
+	
+	def test_lru(self):
+		"""
+		Tests if least recently used profile is thrown out.
+		"""
+		cache = ProfileCache(ActionParser(), 1)
+		cache.get(DESKTOP)
+		cache.get(XBOX)
+		cache.get(DESKTOP)
+		assert (cache.hits, cache.misses) == (0, 3)
+		assert len(cache) == 1
+	
+	
+	def test_modified(self):
+		"""
+		Tests if profile is reloaded after file is changed.
+		"""
+		path = tempfile.mkdtemp()
+		try:
+			filename = os.path.join(path, "test.sccprofile")
+			shutil.copy(DESKTOP, filename)
+			cache = ProfileCache(ActionParser())
+			cache.get(filename)
+			shutil.copy(XBOX, filename)
+			os.utime(filename, (1, 1))
+			p = cache.get(filename)
+			assert (cache.hits, cache.misses) == (0, 2)
+			assert p.buttons[SCButtons.A].to_string() == cache.get(XBOX).buttons[SCButtons.A].to_string()
+		finally:
+			shutil.rmtree(path)
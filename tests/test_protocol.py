@@ -0,0 +1,63 @@
+from scc.protocol import SOURCES, BUTTONS, EVENT_RECORD
+from scc.protocol import encode_event, decode_messages
+from scc.constants import SCButtons
+
+
+class TestProtocol(object):
+
+	def test_sources(self):
+		"""
+		Tests if every button can be sent in binary mode.
+		"""
+		for b in SCButtons:
+			if b != SCButtons.STICK:
+				assert b.name in SOURCES
+				assert BUTTONS.get(b.name, b) == b
+		assert BUTTONS["STICKPRESS"] == SCButtons.STICK
+		assert len(set(SOURCES)) == len(SOURCES)
+	
+	
+	def test_text(self):
+		"""
+		Tests if text mode produces same messages as before binary mode
+		was added.
+		"""
+		assert encode_event("LEFT", (100, -200)) == b"Event: LEFT 100 -200\n"
+		assert encode_event("A", (1,)) == b"Event: A 1\n"
+	
+	
+	def test_same_values(self):
+		"""
+		Tests if binary mode delivers same values as text mode, including
+		triggers that send two values when moved and one when clicked.
+		"""
+		for what, values in ( ("LT", [ 128, 0 ]), ("LT", [ 1 ]), ("RT", [ 0 ]),
+				("STICK", [ 5, -5 ]), ("A", [ 1 ]) ):
+			text = encode_event(what, values).decode("utf-8").strip().split(" ")
+			assert text[1] == what and map(int, text[2:]) == values
+			assert decode_messages(encode_event(what, values, True)) == (
+				[ ( what, values ) ], b"")
+	
+	
+	def test_mixed(self):
+		"""
+		Tests if binary events and text messages are split correctly,
+		even when data is received in pieces.
+		"""
+		data = (b"Current profile: a.sccprofile\n"
+			+ encode_event("LEFT", (100, -200), True)
+			+ encode_event("STICKPRESS", (1,), True)
+			+ b"OK.\n"
+			+ encode_event("RT", (255, 0), True)
+			+ encode_event("RT", (1,), True))
+		assert len(encode_event("A", (1,), True)) == EVENT_RECORD.size
+		expected = [ "Current profile: a.sccprofile", ("LEFT", [ 100, -200 ]),
+			("STICKPRESS", [ 1 ]), "OK.", ("RT", [ 255, 0 ]), ("RT", [ 1 ]) ]
+		assert decode_messages(data) == (expected, b"")
+		# Byte by byte
+		messages, rest = [], b""
+		for i in xrange(len(data)):
+			m, rest = decode_messages(rest + data[i])
+			messages += m
+		assert messages == expected
+		assert rest == b""
@@ -0,0 +1,69 @@
+from scc.replay import CaptureWriter, ReplayController, read_capture, monotonic
+from scc.constants import CI_STRUCT, SCStatus
+import tempfile, time, os
+
+
+def packet(seq, buttons=0):
+	return CI_STRUCT.pack(1, SCStatus.INPUT, seq, buttons, 0, 0,
+		*[ 0 ] * 11)
+
+
+class TestReplay(object):
+
+	def capture(self, count, delay=0):
+		""" Creates capture file with 'count' packets, returns filename """
+		fd, filename = tempfile.mkstemp(suffix=".sccap")
+		os.close(fd)
+		w = CaptureWriter(filename)
+		for i in xrange(count):
+			w.write(packet(i, i))
+			if delay:
+				time.sleep(delay)
+		w.close()
+		return filename
+	
+	
+	def test_capture(self):
+		"""
+		Tests if captured packets are read back unchanged,
+		with increasing timestamps.
+		"""
+		filename = self.capture(10)
+		try:
+			records = list(read_capture(filename))
+		finally:
+			os.unlink(filename)
+		assert [ data for (ts, data) in records ] == [
+			packet(i, i) for i in xrange(10) ]
+		timestamps = [ ts for (ts, data) in records ]
+		assert timestamps == sorted(timestamps)
+		assert timestamps[-1] <= monotonic()
+	
+	
+	def test_replay(self):
+		"""
+		Tests if ReplayController feeds every packet to callback,
+		at original speed or as fast as possible.
+		"""
+		filename = self.capture(10, 0.01)
+		try:
+			for speed in (1.0, 0):
+				received = []
+				def callback(c, now, state):
+					# Timer repeats last state when packet is late,
+					# only packets themselves are interesting here
+					if not received or received[-1] != state.buttons:
+						received.append(state.buttons)
+				c = ReplayController(callback, filename, speed)
+				start = time.time()
+				c.run()
+				t = time.time() - start
+				assert received == range(10)
+				assert c.getReplayedPackets() == 10
+				assert c.getDroppedPackets() == 0
+				if speed:
+					assert t >= 0.09
+				else:
+					assert t < 0.05
+		finally:
+			os.unlink(filename)
@@ -0,0 +1,101 @@
+from scc.sccdaemon import SCCDaemon
+from scc.control_socket import ClientQueue
+from scc.profile_cache import ProfileCache
+from scc.parser import ActionParser
+from scc.profile import Profile
+from scc.mapper import Mapper
+import tempfile, time, os
+
+DESKTOP = os.path.join(os.path.dirname(__file__), "..",
+	"default_profiles", "Desktop.sccprofile")
+
+
+class FakeController(object):
+	def wakeup(self):
+		pass
+	
+	def configure_controller(self, *a, **b):
+		pass
+
+
+class FakeClient(object):
+	def __init__(self):
+		self.wfile = ClientQueue()
+
+
+class TestSCCDaemon(object):
+
+	def daemon(self):
+		path = tempfile.mkdtemp()
+		daemon = SCCDaemon(os.path.join(path, "pid"), os.path.join(path, "socket"))
+		daemon.mapper = Mapper(Profile(ActionParser()),
+			keyboard=None, mouse=None, gamepad=None)
+		daemon.profile_cache = ProfileCache(ActionParser())
+		daemon.profile_loader_thread.start()
+		return daemon
+	
+	
+	def test_load_profile(self):
+		"""
+		Tests if profile is loaded on worker thread, but swapped into
+		mapper only by scheduled task, as it happens between two frames.
+		"""
+		daemon = self.daemon()
+		daemon.mapper.controller = FakeController()
+		old_profile = daemon.mapper.profile
+		client = FakeClient()
+		daemon._load_profile_async(DESKTOP, client)
+		# Nothing else client sent can be handled until profile is loaded
+		assert client.wfile.held
+		for i in xrange(500):
+			if daemon.mapper.next_scheduled() is not None:
+				break
+			time.sleep(0.01)
+		assert daemon.mapper.profile is old_profile
+		daemon.mapper.run_scheduled()
+		assert daemon.mapper.profile is not old_profile
+		assert daemon.profile_file == DESKTOP
+		assert client.wfile.pop(time.time()).startswith(b"OK. Loaded in ")
+		assert not client.wfile.held
+	
+	
+	def test_load_controller_lost(self):
+		"""
+		Tests if profile waiting to be swapped in by input thread is swapped
+		in and reported to client when controller is lost.
+		"""
+		daemon = self.daemon()
+		daemon.mapper.controller = FakeController()
+		client = FakeClient()
+		daemon._load_profile_async(DESKTOP, client)
+		for i in xrange(500):
+			if daemon.pending_swaps:
+				break
+			time.sleep(0.01)
+		with daemon.lock:
+			daemon._on_controller_lost()
+		assert daemon.mapper.get_controller() is None
+		assert daemon.profile_file == DESKTOP
+		assert client.wfile.pop(time.time()).startswith(b"OK. Loaded in ")
+		assert not client.wfile.held
+		# Task scheduled for input thread has nothing left to do
+		daemon.mapper.run_scheduled()
+		assert daemon.pending_swaps == []
+	
+	
+	def test_load_failed(self):
+		"""
+		Tests if failure is reported and current profile kept.
+		"""
+		daemon = self.daemon()
+		old_profile = daemon.mapper.profile
+		client = FakeClient()
+		daemon._load_profile_async("/nonexisting.sccprofile", client)
+		for i in xrange(500):
+			data = client.wfile.pop(time.time())
+			if data:
+				break
+			time.sleep(0.01)
+		assert data.startswith(b"Fail: ")
+		assert not client.wfile.held
+		assert daemon.mapper.profile is old_profile
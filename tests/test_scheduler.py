@@ -0,0 +1,193 @@
+from scc.scheduler import Scheduler, Waker
+from scc.controller import SCController
+from scc.parser import ActionParser
+from scc.profile import Profile
+from scc.mapper import Mapper
+from scc.lib import usb1
+import threading, select, time, os
+
+
+class IdleController(SCController):
+	"""
+	SCController with no USB device behind it. run() loop is real, but
+	waits for input that never comes, so scheduled tasks are executed only
+	when LPERIOD timer ticks or when loop is woken up.
+	"""
+	def __init__(self, callback):
+		self._init_state(callback)
+		self._handle = self
+		self._ctx = None
+		self._transfer_list = [ self ]
+		self.running = True
+	
+	def isSubmitted(self):
+		return self.running
+	
+	def reset(self):
+		pass
+	
+	def unclaim(self):
+		pass
+	
+	def close(self):
+		pass
+
+
+class TestScheduler(object):
+
+	def test_order(self):
+		"""
+		Tests if tasks are executed in order of their time and, for tasks
+		scheduled for same time, in order they were scheduled.
+		"""
+		s, calls = Scheduler(), []
+		s.schedule(3.0, lambda: calls.append("c"))
+		s.schedule(1.0, lambda: calls.append("a"))
+		s.schedule(2.0, lambda: calls.append("b1"))
+		s.schedule(2.0, lambda: calls.append("b2"))
+		assert s.next() == 1.0
+		s.run(2.5)
+		assert calls == [ "a", "b1", "b2" ]
+		assert s.next() == 3.0
+		s.run(3.0)
+		assert calls == [ "a", "b1", "b2", "c" ]
+		assert s.next() is None
+		assert len(s) == 0
+
+
+	def test_cancel(self):
+		"""
+		Tests if cancelled task is not executed and doesn't count
+		as next scheduled one.
+		"""
+		s, calls = Scheduler(), []
+		t = s.schedule(1.0, lambda: calls.append("a"))
+		s.schedule(2.0, lambda: calls.append("b"))
+		s.cancel(t)
+		s.cancel(t)		# Cancelling twice should be harmless
+		assert len(s) == 1
+		assert s.next() == 2.0
+		s.run(5.0)
+		assert calls == [ "b" ]
+		# Cancelling already executed task should be harmless as well
+		s.cancel(t)
+		assert len(s) == 0
+
+
+	def test_many_cancelled(self):
+		"""
+		Tests if heap stays consistent when cancelled tasks are thrown out.
+		"""
+		s, calls = Scheduler(), []
+		tasks = [ s.schedule(float(i), lambda i=i: calls.append(i))
+			for i in xrange(100) ]
+		for t in tasks[::2] + tasks[1::4]:
+			s.cancel(t)
+		s.run(100.0)
+		assert calls == range(3, 100, 4)
+
+
+	def test_remove(self):
+		""" Tests removing tasks by callback """
+		s, calls = Scheduler(), []
+		a = lambda: calls.append("a")
+		s.schedule(1.0, a)
+		s.schedule(2.0, lambda: calls.append("b"))
+		s.schedule(3.0, a)
+		s.remove(a)
+		s.run(5.0)
+		assert calls == [ "b" ]
+
+
+	def test_reschedule(self):
+		"""
+		Tests if task scheduled while run() is executing is left
+		for next call, even if it is already due.
+		"""
+		s, calls = Scheduler(), []
+		def task(data):
+			calls.append(data)
+			s.schedule(0.0, task)
+		s.schedule(0.0, task)
+		s.run(1.0, "x")
+		assert calls == [ "x" ]
+		s.run(1.0, "y")
+		assert calls == [ "x", "y" ]
+		assert len(s) == 1
+
+
+class TestWaker(object):
+
+	def test_wakeup_latency(self, monkeypatch):
+		"""
+		Tests if task scheduled using Mapper.schedule from other thread
+		is executed by idle SCController.run() loop right away, instead of
+		waiting for timer.
+		"""
+		# Poll wrapper is enough to stand in for USBPoller without USB context
+		monkeypatch.setattr(usb1, "USBPoller", lambda ctx, poll: poll, raising=False)
+		mapper = Mapper(Profile(ActionParser()), keyboard=None, mouse=None, gamepad=None)
+		c = IdleController(mapper.callback)
+		c.setScheduler(mapper)
+		mapper.controller = c
+		t = threading.Thread(target=c.run)
+		t.start()
+		try:
+			latencies = []
+			for i in xrange(50):
+				done = threading.Event()
+				start = time.time()
+				mapper.schedule(0, lambda m: (
+					latencies.append(time.time() - start), done.set()))
+				assert done.wait(1.0)
+				time.sleep(0.002)
+		finally:
+			c.running = False
+			c.wakeup()
+			t.join()
+		# Timer alone would take up to LPERIOD
+		assert max(latencies) < 0.01
+	
+	
+	def test_wake_twice(self):
+		"""
+		Tests if waker woken twice before clear() is still usable afterwards.
+		"""
+		w = Waker()
+		p = select.poll()
+		p.register(w.fileno(), select.POLLIN)
+		w.wake()
+		w.wake()
+		assert len(p.poll(0)) == 1
+		w.clear()
+		assert len(p.poll(0)) == 0
+		w.wake()
+		assert len(p.poll(0)) == 1
+		w.close()
+	
+	
+	def test_wake_during_clear(self, monkeypatch):
+		"""
+		Tests if wake() called while clear() is draining pipe is not lost
+		and doesn't prevent following wake() calls from waking poll up.
+		"""
+		w = Waker()
+		p = select.poll()
+		p.register(w.fileno(), select.POLLIN)
+		real_read, calls = os.read, []
+		def read(fd, n):
+			if not calls:
+				w.wake()
+			calls.append(fd)
+			return real_read(fd, n)
+		w.wake()
+		monkeypatch.setattr(os, "read", read)
+		w.clear()
+		monkeypatch.undo()
+		assert len(calls) > 0
+		# Whatever was drained, next wake() has to reach poll
+		w.wake()
+		assert len(p.poll(0)) == 1
+		w.clear()
+		assert len(p.poll(0)) == 0
+		w.close()
@@ -0,0 +1,64 @@
+from scc.stats import Histogram, LatencyStats
+from scc.constants import SCI_NULL, SCButtons
+from scc.mapper import Mapper
+from scc.profile import Profile
+from scc.parser import ActionParser
+import random
+
+
+class FakeController(object):
+	def getGyroEnabled(self):
+		return False
+	
+	def wakeup(self):
+		pass
+
+
+class TestStats(object):
+
+	def test_buckets(self):
+		"""
+		Tests if every value falls into bucket that contains it
+		and if buckets are never wider than ~3% of value.
+		"""
+		for value in range(0, 5000) + [ 2**20 + 12345, Histogram.MAX_VALUE ]:
+			i = Histogram.index(value)
+			assert Histogram.highest(i) >= value
+			assert i == 0 or Histogram.highest(i - 1) < value
+			assert Histogram.highest(i) - value <= value / Histogram.SUB
+	
+	
+	def test_percentiles(self):
+		"""
+		Tests if reported percentiles are close to real ones.
+		"""
+		h = Histogram()
+		r = random.Random(1)
+		values = sorted([ r.randint(0, 100000) for x in xrange(10000) ])
+		for v in values:
+			h.record(v)
+		assert h.count() == len(values)
+		assert h.max() == values[-1]
+		for p in (50, 95, 99):
+			real = values[int(len(values) * p / 100.0 + 0.5) - 1]
+			assert real <= h.percentile(p) <= real * 1.04
+		h.reset()
+		assert h.count() == 0
+		assert h.percentile(99) == 0
+	
+	
+	def test_frame(self):
+		"""
+		Tests if Mapper records every part of frame when stats are set.
+		"""
+		mapper = Mapper(Profile(ActionParser()), keyboard=None, mouse=None, gamepad=None)
+		mapper.set_controller(FakeController())
+		mapper.stats = stats = LatencyStats()
+		stats.mark(stats.PACKET)
+		mapper.callback(mapper.controller, 0, SCI_NULL._replace(buttons=SCButtons.A))
+		# Frame without packet, generated by timer
+		mapper.callback(mapper.controller, 0, SCI_NULL)
+		counts = dict([ (name, h.count()) for name, h in stats.histograms.items() ])
+		assert counts == { "dispatch": 1, "callback": 2, "events": 2,
+			"flush": 0, "total": 1 }
+		assert len(stats.report()) == len(LatencyStats.NAMES)
@@ -0,0 +1,128 @@
+from scc.uinput import UInput, Gamepad, Mouse, Keyboard, Dummy, Rels, Keys, Axes
+from scc.uinput import INPUT_EVENT, EV_REL, EV_KEY, EV_ABS, EV_SYN
+import scc.uinput, os, fcntl, errno
+
+
+class PipeBackend(object):
+	""" Backend that 'creates' device by opening pipe """
+	def create(self, *a):
+		self.read, write = os.pipe()
+		# Test fails instead of getting stuck when nothing was written
+		fcntl.fcntl(self.read, fcntl.F_SETFL, os.O_NONBLOCK)
+		return write
+
+	def destroy(self, fd):
+		os.close(fd)
+
+	def events(self):
+		try:
+			data = os.read(self.read, 65536)
+		except OSError, e:
+			if e.errno != errno.EAGAIN:
+				raise
+			return []
+		return [ INPUT_EVENT.unpack_from(data, i)[2:]
+			for i in xrange(0, len(data), INPUT_EVENT.size) ]
+
+
+class TestUInput(object):
+
+	def test_dummy_interface(self):
+		"""
+		Tests if Dummy has every method that real devices have.
+		"""
+		d = Dummy()
+		for cls in (UInput, Gamepad, Mouse, Keyboard):
+			for name in dir(cls):
+				if not name.startswith("_") and callable(getattr(cls, name)):
+					assert hasattr(d, name), "Dummy has no '%s'" % (name, )
+
+
+	def test_queue(self, monkeypatch):
+		"""
+		Tests if events are written only by synEvent and all at once.
+		"""
+		backend = PipeBackend()
+		monkeypatch.setattr(scc.uinput, "_backend", backend)
+		m = Mouse(name=b"Test Mouse")
+		m.relEvent(Rels.REL_WHEEL, 1)
+		m.keyEvent(Keys.BTN_LEFT, 1)
+		m.synEvent()
+		assert backend.events() == [
+			(EV_REL, Rels.REL_WHEEL, 1),
+			(EV_KEY, Keys.BTN_LEFT, 1),
+			(EV_SYN, 0, 0),
+		]
+		# More events than fits into queue
+		for i in xrange(UInput.QUEUE_SIZE + 10):
+			m.relEvent(Rels.REL_X, 1)
+		m.synEvent()
+		assert len(backend.events()) == UInput.QUEUE_SIZE + 11
+
+
+	def test_suppression(self, monkeypatch):
+		"""
+		Tests if events that wouldn't change anything are not sent.
+		"""
+		backend = PipeBackend()
+		monkeypatch.setattr(scc.uinput, "_backend", backend)
+		g = Gamepad(name=b"Test Gamepad")
+		g.axisEvent(Axes.ABS_X, 100)
+		g.keyEvent(Keys.BTN_A, 1)
+		g.synEvent()
+		assert len(backend.events()) == 3
+		g.axisEvent(Axes.ABS_X, 100)
+		g.keyEvent(Keys.BTN_A, 1)
+		g.synEvent()
+		g.axisEvent(Axes.ABS_X, 200)
+		g.synEvent()
+		assert backend.events() == [ (EV_ABS, Axes.ABS_X, 200), (EV_SYN, 0, 0) ]
+		assert g.getStats() == {
+			"written": 5, "suppressed": 2, "suppressed_syn": 1 }
+
+	def test_dropped(self, monkeypatch):
+		"""
+		Tests if event is not suppressed after batch that contained
+		same event failed to be written.
+		"""
+		backend = PipeBackend()
+		monkeypatch.setattr(scc.uinput, "_backend", backend)
+		g = Gamepad(name=b"Test Gamepad")
+		def write(fd, data):
+			raise OSError(11, "Resource temporarily unavailable")
+		monkeypatch.setattr(os, "write", write)
+		g.keyEvent(Keys.BTN_A, 0)
+		g.axisEvent(Axes.ABS_X, 100)
+		g.synEvent()
+		monkeypatch.undo()
+		monkeypatch.setattr(scc.uinput, "_backend", backend)
+		g.keyEvent(Keys.BTN_A, 0)
+		g.axisEvent(Axes.ABS_X, 100)
+		g.synEvent()
+		assert backend.events() == [
+			(EV_KEY, Keys.BTN_A, 0),
+			(EV_ABS, Axes.ABS_X, 100),
+			(EV_SYN, 0, 0),
+		]
+	
+	
+	def test_input_event_codes(self):
+		"""
+		Tests if pregenerated module with input event codes is used and if
+		module generated from header matches parsed header.
+		"""
+		from scc import input_event_codes
+		from scc.cheader import defines, generate_module
+		assert scc.uinput.CHEAD is input_event_codes.CHEAD
+		if os.path.exists('/usr/include/linux/input-event-codes.h'):
+			namespace = {}
+			exec generate_module('/usr/include', 'linux/input-event-codes.h') in namespace
+			assert namespace['CHEAD'] == defines('/usr/include', 'linux/input-event-codes.h')
+
+	def test_aliases(self):
+		"""
+		Tests if codes with same value are aliases of same enum member.
+		"""
+		assert Keys.BTN_MISC is Keys.BTN_0
+		assert Keys.BTN_MISC.name == Keys.BTN_0.name
+		assert Keys(0x100) is Keys.BTN_0